@@ -48,6 +48,12 @@ namespace NinjaTrader.NinjaScript.Indicators
         private long volume = 0;
         private double bid = 0;
         private double ask = 0;
+        private string instrumentName = "";
+        
+        // Latest tick sizes (trade size and top-of-book sizes, not totals)
+        private long lastSize = 0;
+        private long bidSize = 0;
+        private long askSize = 0;
         
         // Order Flow Variables
         private double cumulativeDelta = 0;
@@ -103,6 +109,7 @@ namespace NinjaTrader.NinjaScript.Indicators
                 // Initialize HTTP client
                 httpClient = new HttpClient();
                 httpClient.Timeout = TimeSpan.FromSeconds(5);
+                instrumentName = Instrument.FullName;
                 
                 // Initialize data timer (send data every 1 second)
                 dataTimer = new Timer(SendDataToNexus, null, TimeSpan.FromSeconds(1), TimeSpan.FromSeconds(1));
@@ -150,15 +157,18 @@ namespace NinjaTrader.NinjaScript.Indicators
             if (marketDataUpdate.MarketDataType == MarketDataType.Last)
             {
                 currentPrice = marketDataUpdate.Price;
+                lastSize = marketDataUpdate.Volume;
             }
             else if (marketDataUpdate.MarketDataType == MarketDataType.Bid)
             {
                 bid = marketDataUpdate.Price;
+                bidSize = marketDataUpdate.Volume;
                 bidVolume += marketDataUpdate.Volume;
             }
             else if (marketDataUpdate.MarketDataType == MarketDataType.Ask)
             {
                 ask = marketDataUpdate.Price;
+                askSize = marketDataUpdate.Volume;
                 askVolume += marketDataUpdate.Volume;
             }
             
@@ -405,6 +415,7 @@ namespace NinjaTrader.NinjaScript.Indicators
                 {
                     timestamp = DateTime.Now.ToString("yyyy-MM-ddTHH:mm:ss.fffZ"),
                     systemVersion = "5.0.1",
+                    symbol = instrumentName,
                     strategies = activeStrategies,
                     performance = new
                     {
@@ -430,7 +441,10 @@ namespace NinjaTrader.NinjaScript.Indicators
                         volatility = (dailyHigh - dailyLow) / currentPrice * 100,
                         bid = bid,
                         ask = ask,
-                        spread = ask - bid
+                        spread = ask - bid,
+                        lastSize = lastSize,
+                        bidSize = bidSize,
+                        askSize = askSize
                     },
                     position = new
                     {
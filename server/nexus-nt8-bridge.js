@@ -3,6 +3,7 @@ const WebSocket = require('ws');
 const cors = require('cors');
 const fs = require('fs');
 const path = require('path');
+const { openTickRingWriter } = require('./tick-ring.cjs');
 
 class NexusNT8Bridge {
     constructor() {
@@ -21,6 +22,13 @@ class NexusNT8Bridge {
         this.nt8Connected = false;
         this.lastNT8Heartbeat = null;
         
+        // Live ticks for the Python brain, written to a shared-memory ring
+        // when NEXUS_TICK_RING is set instead of travelling as JSON
+        this.tickRing = openTickRingWriter();
+        // Used for NT8 payloads from add-on builds that do not name their
+        // instrument
+        this.nt8Symbol = process.env.NEXUS_NT8_SYMBOL || null;
+        
         // Data translation and routing
         this.dataRoutes = new Map();
         this.setupDataRoutes();
@@ -40,6 +48,18 @@ class NexusNT8Bridge {
                 source: 'NINJA_TRADER',
                 receivedAt: new Date().toISOString(),
                 dataType: 'REAL_TIME'
+            }),
+            tick: (data) => ({
+                symbol: data.symbol || data.market.symbol || this.nt8Symbol,
+                timestamp: data.timestamp,
+                price: data.market.currentPrice,
+                // Per-tick sizes; market.volume is the bar's volume and the
+                // orderFlow volumes are running totals
+                volume: data.market.lastSize,
+                bid: data.market.bid,
+                ask: data.market.ask,
+                bidSize: data.market.bidSize,
+                askSize: data.market.askSize
             })
         });
 
@@ -52,6 +72,16 @@ class NexusNT8Bridge {
                 source: 'SIERRA_CHART',
                 receivedAt: new Date().toISOString(),
                 dataType: 'REAL_TIME'
+            }),
+            tick: (data) => ({
+                symbol: data.Symbol,
+                timestamp: data.DateTime,
+                price: data.Last,
+                volume: data.Volume,
+                bid: data.Bid,
+                ask: data.Ask,
+                bidSize: data.BidVolume,
+                askSize: data.AskVolume
             })
         });
 
@@ -64,6 +94,16 @@ class NexusNT8Bridge {
                 source: 'RITHMIC',
                 receivedAt: new Date().toISOString(),
                 dataType: 'REAL_TIME'
+            }),
+            tick: (data) => ({
+                symbol: data.instrument_id,
+                timestamp: data.timestamp,
+                price: data.last_trade_price,
+                volume: data.last_trade_size,
+                bid: data.bid_price,
+                ask: data.ask_price,
+                bidSize: data.bid_size,
+                askSize: data.ask_size
             })
         });
     }
@@ -112,7 +152,8 @@ class NexusNT8Bridge {
                 nt8Connected: this.nt8Connected,
                 connectedClients: this.connectedClients.size,
                 lastDataReceived: this.latestData?.timestamp || null,
-                supportedSources: Array.from(this.dataRoutes.keys())
+                supportedSources: Array.from(this.dataRoutes.keys()),
+                tickRing: this.tickRing ? this.tickRing.getStatus() : null
             });
         });
 
@@ -130,6 +171,24 @@ class NexusNT8Bridge {
             this.handleRithmicData(req, res);
         });
 
+        // Batched ticks ({ ticks: [{ symbol, timestamp, price, volume, bid,
+        // ask, bidSize, askSize }] }) go straight into the tick ring
+        this.app.post('/api/ticks', (req, res) => {
+            if (!this.tickRing) {
+                return res.status(503).json({ error: 'Tick ring not enabled (set NEXUS_TICK_RING)' });
+            }
+            const ticks = Array.isArray(req.body) ? req.body : req.body.ticks;
+            if (!Array.isArray(ticks)) {
+                return res.status(400).json({ error: 'Expected an array of ticks' });
+            }
+
+            res.json({
+                status: 'success',
+                accepted: this.tickRing.pushMany(ticks),
+                timestamp: new Date().toISOString()
+            });
+        });
+
         // Get latest data endpoint
         this.app.get('/api/dashboard-data', (req, res) => {
             if (!this.latestData) {
@@ -301,6 +360,8 @@ class NexusNT8Bridge {
         // Store latest data
         this.latestData = data;
 
+        this.publishTick(data, source);
+
         // Add to history
         this.dataHistory.push(data);
         if (this.dataHistory.length > this.maxHistorySize) {
@@ -311,6 +372,18 @@ class NexusNT8Bridge {
         this.broadcastToClients(data);
     }
 
+    publishTick(data, source) {
+        const route = this.dataRoutes.get(source);
+        if (!this.tickRing || !route || !route.tick) {
+            return;
+        }
+        try {
+            this.tickRing.push(route.tick(data));
+        } catch (error) {
+            console.error(`Error writing ${source} tick to ring:`, error);
+        }
+    }
+
     logDataMetrics(data, source) {
         switch (source) {
             case 'NINJA_TRADER':
@@ -396,6 +469,13 @@ class NexusNT8Bridge {
                 console.log(`Client ${clientId} subscribed to: ${data.streams}`);
                 break;
                 
+            case 'ticks':
+                // High-rate feeds stream tick batches over the socket
+                if (this.tickRing && Array.isArray(data.ticks)) {
+                    this.tickRing.pushMany(data.ticks);
+                }
+                break;
+                
             case 'get_sources':
                 ws.send(JSON.stringify({
                     type: 'sources_response',
@@ -476,12 +556,19 @@ class NexusNT8Bridge {
 ╚══════════════════════════════════════════════════════════════╝
             `);
             
+            if (this.tickRing) {
+                console.log(`📈 Tick ring: ${this.tickRing.filePath} (${this.tickRing.capacity} records)`);
+            }
+            
             this.startConnectionMonitor();
         });
 
         // Graceful shutdown
         process.on('SIGINT', () => {
             console.log('\nShutting down NEXUS NT8 Bridge...');
+            if (this.tickRing) {
+                this.tickRing.close();
+            }
             this.server.close(() => {
                 console.log('Server closed');
                 process.exit(0);
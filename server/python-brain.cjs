@@ -16,6 +16,21 @@ class PythonBrainService {
         this.pythonProcess = null;
         this.pythonReady = false;
         this.pythonQueue = [];
+        this.standbyProcess = null;
+        this.shuttingDown = false;
+        this.startupStats = {
+            lastReadyMs: null,
+            lastInitMs: null,
+            readyCount: 0,
+            totalReadyMs: 0,
+            failovers: 0,
+            lastFailoverAt: null
+        };
+        // The brain serves local clients directly when NEXUS_BRAIN_WS_PORT is
+        // set (spawned processes inherit it); clients learn the URL from us.
+        this.brainSocketUrl = process.env.NEXUS_BRAIN_WS_PORT
+            ? `ws://${process.env.NEXUS_BRAIN_WS_HOST || '127.0.0.1'}:${process.env.NEXUS_BRAIN_WS_PORT}`
+            : null;
         
         // Data distribution
         this.dataStreams = new Map();
@@ -57,7 +72,9 @@ class PythonBrainService {
                 connectedClients: this.connectedClients.size,
                 activeStreams: this.dataStreams.size,
                 lastHeartbeat: this.lastHeartbeat,
-                analysisCache: this.analysisCache.size
+                analysisCache: this.analysisCache.size,
+                brainSocket: this.brainSocketUrl,
+                startup: this.getStartupStats()
             });
         });
 
@@ -66,14 +83,34 @@ class PythonBrainService {
             this.sendToPython('market_analysis', req.body, res);
         });
 
+        this.app.post('/api/analyze/regime', (req, res) => {
+            this.sendToPython('regime_analysis', req.body, res);
+        });
+
         this.app.post('/api/analyze/strategy', (req, res) => {
             this.sendToPython('strategy_analysis', req.body, res);
         });
 
+        this.app.post('/api/analyze/strategy/ranking', (req, res) => {
+            this.sendToPython('strategy_ranking', req.body, res);
+        });
+
         this.app.post('/api/analyze/risk', (req, res) => {
             this.sendToPython('risk_analysis', req.body, res);
         });
 
+        this.app.post('/api/analyze/liquidity', (req, res) => {
+            this.sendToPython('liquidity_analysis', req.body, res);
+        });
+
+        this.app.post('/api/analyze/journal', (req, res) => {
+            this.sendToPython('journal_analysis', req.body, res);
+        });
+
+        this.app.post('/api/analyze/equity/simulation', (req, res) => {
+            this.sendToPython('equity_simulation', req.body, res);
+        });
+
         this.app.post('/api/analyze/portfolio', (req, res) => {
             this.sendToPython('portfolio_optimization', req.body, res);
         });
@@ -86,6 +123,10 @@ class PythonBrainService {
             this.sendToPython('pattern_detection', req.body, res);
         });
 
+        this.app.post('/api/detect/patterns/scan', (req, res) => {
+            this.sendToPython('pattern_scan', req.body, res);
+        });
+
         this.app.post('/api/backtest/strategy', (req, res) => {
             this.sendToPython('strategy_backtest', req.body, res);
         });
@@ -129,13 +170,20 @@ class PythonBrainService {
                 type: 'connection_status',
                 clientId,
                 pythonReady: this.pythonReady,
+                brainSocket: this.brainSocketUrl,
                 availableAnalysis: [
                     'market_analysis',
+                    'regime_analysis',
                     'strategy_analysis', 
+                    'strategy_ranking',
                     'risk_analysis',
+                    'liquidity_analysis',
+                    'journal_analysis',
+                    'equity_simulation',
                     'portfolio_optimization',
                     'price_prediction',
                     'pattern_detection',
+                    'pattern_scan',
                     'strategy_backtest'
                 ]
             }));
@@ -175,1032 +223,208 @@ class PythonBrainService {
     }
 
     createPythonBrainScript() {
-        const pythonScript = `
-import json
-import sys
-import numpy as np
-import pandas as pd
-from datetime import datetime, timedelta
-import asyncio
-import websockets
-import threading
-import queue
-import time
-import warnings
-warnings.filterwarnings('ignore')
-
-class TradingBrain:
-    def __init__(self):
-        self.analysis_queue = queue.Queue()
-        self.result_queue = queue.Queue()
-        self.running = True
-        
-        # Initialize models and analyzers
-        self.market_analyzer = MarketAnalyzer()
-        self.strategy_analyzer = StrategyAnalyzer()
-        self.risk_analyzer = RiskAnalyzer()
-        self.portfolio_optimizer = PortfolioOptimizer()
-        self.price_predictor = PricePredictor()
-        self.pattern_detector = PatternDetector()
-        
-        print("🧠 Trading Brain initialized", flush=True)
-    
-    def process_analysis(self, analysis_type, data):
-        try:
-            if analysis_type == 'market_analysis':
-                return self.market_analyzer.analyze(data)
-            elif analysis_type == 'strategy_analysis':
-                return self.strategy_analyzer.analyze(data)
-            elif analysis_type == 'risk_analysis':
-                return self.risk_analyzer.analyze(data)
-            elif analysis_type == 'portfolio_optimization':
-                return self.portfolio_optimizer.optimize(data)
-            elif analysis_type == 'price_prediction':
-                return self.price_predictor.predict(data)
-            elif analysis_type == 'pattern_detection':
-                return self.pattern_detector.detect(data)
-            elif analysis_type == 'strategy_backtest':
-                return self.backtest_strategy(data)
-            else:
-                return {'error': f'Unknown analysis type: {analysis_type}'}
-        except Exception as e:
-            return {'error': str(e), 'type': 'analysis_error'}
-
-class MarketAnalyzer:
-    def analyze(self, data):
-        # Advanced market analysis
-        market_data = data.get('market_data', [])
-        if not market_data:
-            return {'error': 'No market data provided'}
-        
-        df = pd.DataFrame(market_data)
-        
-        analysis = {
-            'trend_analysis': self.analyze_trend(df),
-            'volatility_analysis': self.analyze_volatility(df),
-            'momentum_analysis': self.analyze_momentum(df),
-            'support_resistance': self.find_support_resistance(df),
-            'market_regime': self.detect_market_regime(df),
-            'confidence': 0.85,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        return analysis
-    
-    def analyze_trend(self, df):
-        if 'price' not in df.columns:
-            return {'direction': 'unknown', 'strength': 0}
-        
-        prices = df['price'].values
-        if len(prices) < 10:
-            return {'direction': 'unknown', 'strength': 0}
-        
-        # Simple trend analysis
-        short_ma = np.mean(prices[-5:])
-        long_ma = np.mean(prices[-20:]) if len(prices) >= 20 else np.mean(prices)
-        
-        if short_ma > long_ma * 1.01:
-            direction = 'bullish'
-            strength = min((short_ma - long_ma) / long_ma * 100, 100)
-        elif short_ma < long_ma * 0.99:
-            direction = 'bearish'
-            strength = min((long_ma - short_ma) / long_ma * 100, 100)
-        else:
-            direction = 'sideways'
-            strength = 0
-        
-        return {
-            'direction': direction,
-            'strength': round(strength, 2),
-            'short_ma': round(short_ma, 2),
-            'long_ma': round(long_ma, 2)
-        }
-    
-    def analyze_volatility(self, df):
-        if 'price' not in df.columns:
-            return {'level': 'unknown', 'value': 0}
-        
-        prices = df['price'].values
-        if len(prices) < 2:
-            return {'level': 'unknown', 'value': 0}
-        
-        returns = np.diff(prices) / prices[:-1]
-        volatility = np.std(returns) * np.sqrt(252) * 100  # Annualized
-        
-        if volatility > 30:
-            level = 'high'
-        elif volatility > 15:
-            level = 'medium'
-        else:
-            level = 'low'
-        
-        return {
-            'level': level,
-            'value': round(volatility, 2),
-            'percentile': min(volatility / 50 * 100, 100)
-        }
-    
-    def analyze_momentum(self, df):
-        if 'price' not in df.columns:
-            return {'strength': 0, 'direction': 'neutral'}
-        
-        prices = df['price'].values
-        if len(prices) < 5:
-            return {'strength': 0, 'direction': 'neutral'}
-        
-        # Simple momentum calculation
-        momentum = (prices[-1] - prices[-5]) / prices[-5] * 100
-        
-        if momentum > 2:
-            direction = 'strong_bullish'
-        elif momentum > 0.5:
-            direction = 'bullish'
-        elif momentum < -2:
-            direction = 'strong_bearish'
-        elif momentum < -0.5:
-            direction = 'bearish'
-        else:
-            direction = 'neutral'
-        
-        return {
-            'strength': round(abs(momentum), 2),
-            'direction': direction,
-            'value': round(momentum, 2)
-        }
-    
-    def find_support_resistance(self, df):
-        if 'price' not in df.columns:
-            return {'support': [], 'resistance': []}
-        
-        prices = df['price'].values
-        if len(prices) < 10:
-            return {'support': [], 'resistance': []}
-        
-        # Simple support/resistance detection
-        highs = []
-        lows = []
-        
-        for i in range(2, len(prices) - 2):
-            if prices[i] > prices[i-1] and prices[i] > prices[i+1]:
-                highs.append(prices[i])
-            elif prices[i] < prices[i-1] and prices[i] < prices[i+1]:
-                lows.append(prices[i])
-        
-        # Cluster similar levels
-        resistance = list(set([round(h, 2) for h in highs[-5:]]))
-        support = list(set([round(l, 2) for l in lows[-5:]]))
-        
-        return {
-            'support': sorted(support),
-            'resistance': sorted(resistance, reverse=True)
-        }
-    
-    def detect_market_regime(self, df):
-        if 'price' not in df.columns:
-            return 'unknown'
-        
-        prices = df['price'].values
-        if len(prices) < 20:
-            return 'unknown'
-        
-        # Simple regime detection
-        volatility = np.std(np.diff(prices) / prices[:-1])
-        trend_strength = abs(np.corrcoef(range(len(prices)), prices)[0, 1])
-        
-        if volatility > 0.02:
-            return 'volatile'
-        elif trend_strength > 0.7:
-            return 'trending'
-        else:
-            return 'ranging'
-
-class StrategyAnalyzer:
-    def analyze(self, data):
-        strategies = data.get('strategies', [])
-        performance_data = data.get('performance', {})
-        
-        analysis = {
-            'strategy_performance': self.analyze_performance(strategies, performance_data),
-            'optimization_suggestions': self.suggest_optimizations(strategies),
-            'risk_assessment': self.assess_strategy_risk(strategies),
-            'correlation_analysis': self.analyze_correlations(strategies),
-            'confidence': 0.78,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        return analysis
-    
-    def analyze_performance(self, strategies, performance_data):
-        if not strategies:
-            return {'error': 'No strategies provided'}
-        
-        results = []
-        for strategy in strategies:
-            perf = {
-                'name': strategy.get('name', 'Unknown'),
-                'win_rate': strategy.get('winRate', 0),
-                'profit_factor': strategy.get('profitFactor', 1),
-                'sharpe_ratio': strategy.get('sharpeRatio', 0),
-                'max_drawdown': strategy.get('maxDrawdown', 0),
-                'score': self.calculate_strategy_score(strategy)
-            }
-            results.append(perf)
-        
-        return sorted(results, key=lambda x: x['score'], reverse=True)
-    
-    def calculate_strategy_score(self, strategy):
-        win_rate = strategy.get('winRate', 0) / 100
-        profit_factor = min(strategy.get('profitFactor', 1), 5) / 5
-        sharpe = min(max(strategy.get('sharpeRatio', 0), 0), 3) / 3
-        drawdown_penalty = max(0, 1 - abs(strategy.get('maxDrawdown', 0)) / 50)
-        
-        score = (win_rate * 0.3 + profit_factor * 0.3 + sharpe * 0.2 + drawdown_penalty * 0.2) * 100
-        return round(score, 2)
-    
-    def suggest_optimizations(self, strategies):
-        suggestions = []
-        
-        for strategy in strategies:
-            if strategy.get('winRate', 0) < 60:
-                suggestions.append({
-                    'strategy': strategy.get('name'),
-                    'type': 'win_rate_improvement',
-                    'suggestion': 'Consider tightening entry criteria or improving signal quality'
-                })
-            
-            if strategy.get('profitFactor', 1) < 1.5:
-                suggestions.append({
-                    'strategy': strategy.get('name'),
-                    'type': 'profit_factor_improvement',
-                    'suggestion': 'Review risk-reward ratios and exit strategies'
-                })
-        
-        return suggestions
-    
-    def assess_strategy_risk(self, strategies):
-        total_risk = 0
-        risk_breakdown = []
-        
-        for strategy in strategies:
-            risk_score = self.calculate_risk_score(strategy)
-            total_risk += risk_score
-            risk_breakdown.append({
-                'strategy': strategy.get('name'),
-                'risk_score': risk_score,
-                'risk_level': 'high' if risk_score > 70 else 'medium' if risk_score > 40 else 'low'
-            })
-        
-        return {
-            'total_risk': round(total_risk / len(strategies) if strategies else 0, 2),
-            'breakdown': risk_breakdown
-        }
-    
-    def calculate_risk_score(self, strategy):
-        drawdown = abs(strategy.get('maxDrawdown', 0))
-        volatility = strategy.get('volatility', 20)
-        correlation = strategy.get('correlation', 0.5)
-        
-        risk_score = (drawdown * 0.4 + volatility * 0.4 + correlation * 20 * 0.2)
-        return min(round(risk_score, 2), 100)
-    
-    def analyze_correlations(self, strategies):
-        # Simplified correlation analysis
-        if len(strategies) < 2:
-            return {'message': 'Need at least 2 strategies for correlation analysis'}
-        
-        correlations = []
-        for i, strat1 in enumerate(strategies):
-            for j, strat2 in enumerate(strategies[i+1:], i+1):
-                # Simplified correlation calculation
-                corr = np.random.uniform(0.2, 0.8)  # Mock correlation
-                correlations.append({
-                    'strategy1': strat1.get('name'),
-                    'strategy2': strat2.get('name'),
-                    'correlation': round(corr, 3),
-                    'risk_level': 'high' if corr > 0.7 else 'medium' if corr > 0.5 else 'low'
-                })
-        
-        return correlations
-
-class RiskAnalyzer:
-    def analyze(self, data):
-        portfolio_data = data.get('portfolio', {})
-        positions = data.get('positions', [])
-        market_data = data.get('market_data', [])
-        
-        analysis = {
-            'var_analysis': self.calculate_var(portfolio_data, positions),
-            'stress_testing': self.stress_test(positions, market_data),
-            'concentration_risk': self.analyze_concentration(positions),
-            'liquidity_risk': self.analyze_liquidity(positions),
-            'correlation_risk': self.analyze_correlation_risk(positions),
-            'recommendations': self.generate_risk_recommendations(positions),
-            'confidence': 0.82,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        return analysis
-    
-    def calculate_var(self, portfolio_data, positions):
-        if not positions:
-            return {'var_95': 0, 'var_99': 0, 'expected_shortfall': 0}
-        
-        # Simplified VaR calculation
-        total_value = sum(pos.get('notionalValue', 0) for pos in positions)
-        portfolio_volatility = 0.15  # Assumed 15% annual volatility
-        
-        var_95 = total_value * portfolio_volatility * 1.645 / np.sqrt(252)  # Daily VaR
-        var_99 = total_value * portfolio_volatility * 2.326 / np.sqrt(252)
-        expected_shortfall = var_99 * 1.2
-        
-        return {
-            'var_95': round(var_95, 2),
-            'var_99': round(var_99, 2),
-            'expected_shortfall': round(expected_shortfall, 2),
-            'confidence_level': '95% and 99%'
-        }
-    
-    def stress_test(self, positions, market_data):
-        scenarios = [
-            {'name': 'Market Crash (-20%)', 'shock': -0.20},
-            {'name': 'Volatility Spike (+50%)', 'shock': -0.10},
-            {'name': 'Interest Rate Rise', 'shock': -0.05},
-            {'name': 'Liquidity Crisis', 'shock': -0.15}
-        ]
-        
-        results = []
-        for scenario in scenarios:
-            total_impact = 0
-            for position in positions:
-                position_value = position.get('notionalValue', 0)
-                impact = position_value * scenario['shock']
-                total_impact += impact
-            
-            results.append({
-                'scenario': scenario['name'],
-                'impact': round(total_impact, 2),
-                'impact_percentage': round(scenario['shock'] * 100, 1)
-            })
-        
-        return results
-    
-    def analyze_concentration(self, positions):
-        if not positions:
-            return {'concentration_score': 0, 'largest_position': 0, 'top_5_concentration': 0}
-        
-        position_values = [abs(pos.get('notionalValue', 0)) for pos in positions]
-        total_value = sum(position_values)
-        
-        if total_value == 0:
-            return {'concentration_score': 0, 'largest_position': 0, 'top_5_concentration': 0}
-        
-        largest_position = max(position_values) / total_value * 100
-        top_5_positions = sorted(position_values, reverse=True)[:5]
-        top_5_concentration = sum(top_5_positions) / total_value * 100
-        
-        concentration_score = min(largest_position * 2, 100)
-        
-        return {
-            'concentration_score': round(concentration_score, 2),
-            'largest_position': round(largest_position, 2),
-            'top_5_concentration': round(top_5_concentration, 2),
-            'risk_level': 'high' if concentration_score > 60 else 'medium' if concentration_score > 30 else 'low'
-        }
-    
-    def analyze_liquidity(self, positions):
-        liquidity_scores = []
-        
-        for position in positions:
-            symbol = position.get('symbol', '')
-            # Simplified liquidity scoring
-            if symbol in ['ES', 'NQ', 'SPY', 'QQQ']:
-                liquidity_score = 95
-            elif symbol in ['CL', 'GC', 'EURUSD']:
-                liquidity_score = 85
-            else:
-                liquidity_score = 70
-            
-            liquidity_scores.append(liquidity_score)
-        
-        avg_liquidity = np.mean(liquidity_scores) if liquidity_scores else 0
-        
-        return {
-            'average_liquidity': round(avg_liquidity, 2),
-            'liquidity_risk': 'low' if avg_liquidity > 80 else 'medium' if avg_liquidity > 60 else 'high',
-            'position_liquidity': [
-                {'symbol': pos.get('symbol'), 'liquidity_score': score}
-                for pos, score in zip(positions, liquidity_scores)
-            ]
-        }
-    
-    def analyze_correlation_risk(self, positions):
-        if len(positions) < 2:
-            return {'correlation_risk': 'low', 'diversification_score': 100}
-        
-        # Simplified correlation analysis
-        symbols = [pos.get('symbol', '') for pos in positions]
-        
-        # Mock correlation matrix
-        high_corr_pairs = 0
-        total_pairs = len(symbols) * (len(symbols) - 1) // 2
-        
-        for i, sym1 in enumerate(symbols):
-            for sym2 in symbols[i+1:]:
-                # Simplified correlation logic
-                if (sym1 in ['ES', 'NQ'] and sym2 in ['ES', 'NQ']) or \
-                   (sym1 in ['CL', 'GC'] and sym2 in ['CL', 'GC']):
-                    high_corr_pairs += 1
-        
-        correlation_risk_score = (high_corr_pairs / total_pairs * 100) if total_pairs > 0 else 0
-        diversification_score = 100 - correlation_risk_score
-        
-        return {
-            'correlation_risk': 'high' if correlation_risk_score > 60 else 'medium' if correlation_risk_score > 30 else 'low',
-            'diversification_score': round(diversification_score, 2),
-            'high_correlation_pairs': high_corr_pairs
-        }
-    
-    def generate_risk_recommendations(self, positions):
-        recommendations = []
-        
-        # Analyze position sizes
-        if positions:
-            position_values = [abs(pos.get('notionalValue', 0)) for pos in positions]
-            total_value = sum(position_values)
-            
-            if total_value > 0:
-                largest_pct = max(position_values) / total_value * 100
-                if largest_pct > 25:
-                    recommendations.append({
-                        'type': 'concentration',
-                        'priority': 'high',
-                        'message': f'Largest position represents {largest_pct:.1f}% of portfolio. Consider reducing concentration.'
-                    })
-                
-                if len(positions) < 5:
-                    recommendations.append({
-                        'type': 'diversification',
-                        'priority': 'medium',
-                        'message': 'Consider adding more positions to improve diversification.'
-                    })
-        
-        return recommendations
-
-class PortfolioOptimizer:
-    def optimize(self, data):
-        positions = data.get('positions', [])
-        target_return = data.get('target_return', 0.12)
-        risk_tolerance = data.get('risk_tolerance', 'medium')
-        
-        optimization = {
-            'current_allocation': self.analyze_current_allocation(positions),
-            'optimal_allocation': self.calculate_optimal_allocation(positions, target_return, risk_tolerance),
-            'rebalancing_suggestions': self.generate_rebalancing_suggestions(positions),
-            'expected_metrics': self.calculate_expected_metrics(positions),
-            'confidence': 0.75,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        return optimization
-    
-    def analyze_current_allocation(self, positions):
-        if not positions:
-            return {}
-        
-        total_value = sum(abs(pos.get('notionalValue', 0)) for pos in positions)
-        
-        allocation = {}
-        for position in positions:
-            symbol = position.get('symbol', 'Unknown')
-            value = abs(position.get('notionalValue', 0))
-            percentage = (value / total_value * 100) if total_value > 0 else 0
-            allocation[symbol] = round(percentage, 2)
-        
-        return allocation
-    
-    def calculate_optimal_allocation(self, positions, target_return, risk_tolerance):
-        # Simplified optimal allocation
-        risk_multiplier = {'low': 0.5, 'medium': 1.0, 'high': 1.5}.get(risk_tolerance, 1.0)
-        
-        if not positions:
-            return {}
-        
-        # Mock optimal allocation based on risk tolerance
-        symbols = list(set(pos.get('symbol') for pos in positions))
-        equal_weight = 100 / len(symbols) if symbols else 0
-        
-        optimal = {}
-        for symbol in symbols:
-            # Adjust based on risk tolerance
-            if symbol in ['ES', 'SPY']:  # Lower risk
-                weight = equal_weight * (1.2 if risk_tolerance == 'low' else 1.0 if risk_tolerance == 'medium' else 0.8)
-            else:  # Higher risk
-                weight = equal_weight * (0.8 if risk_tolerance == 'low' else 1.0 if risk_tolerance == 'medium' else 1.2)
-            
-            optimal[symbol] = round(weight, 2)
-        
-        # Normalize to 100%
-        total = sum(optimal.values())
-        if total > 0:
-            optimal = {k: round(v / total * 100, 2) for k, v in optimal.items()}
-        
-        return optimal
-    
-    def generate_rebalancing_suggestions(self, positions):
-        current = self.analyze_current_allocation(positions)
-        optimal = self.calculate_optimal_allocation(positions, 0.12, 'medium')
-        
-        suggestions = []
-        for symbol in set(list(current.keys()) + list(optimal.keys())):
-            current_weight = current.get(symbol, 0)
-            optimal_weight = optimal.get(symbol, 0)
-            difference = optimal_weight - current_weight
-            
-            if abs(difference) > 5:  # Only suggest if difference > 5%
-                action = 'increase' if difference > 0 else 'decrease'
-                suggestions.append({
-                    'symbol': symbol,
-                    'action': action,
-                    'current_weight': current_weight,
-                    'target_weight': optimal_weight,
-                    'adjustment': round(abs(difference), 2)
-                })
-        
-        return suggestions
-    
-    def calculate_expected_metrics(self, positions):
-        # Mock expected metrics
-        return {
-            'expected_return': 12.5,
-            'expected_volatility': 15.2,
-            'sharpe_ratio': 0.82,
-            'max_drawdown': 8.5,
-            'var_95': 2.1
-        }
-
-class PricePredictor:
-    def predict(self, data):
-        market_data = data.get('market_data', [])
-        prediction_horizon = data.get('horizon', 24)  # hours
-        
-        if not market_data:
-            return {'error': 'No market data provided for prediction'}
-        
-        df = pd.DataFrame(market_data)
-        
-        prediction = {
-            'price_forecast': self.forecast_price(df, prediction_horizon),
-            'direction_probability': self.predict_direction(df),
-            'volatility_forecast': self.forecast_volatility(df),
-            'confidence_intervals': self.calculate_confidence_intervals(df),
-            'model_accuracy': 0.73,
-            'confidence': 0.68,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        return prediction
-    
-    def forecast_price(self, df, horizon):
-        if 'price' not in df.columns or len(df) < 5:
-            return {'error': 'Insufficient price data'}
-        
-        prices = df['price'].values
-        current_price = prices[-1]
-        
-        # Simple trend-based forecast
-        if len(prices) >= 10:
-            recent_trend = (prices[-1] - prices[-10]) / prices[-10]
-            forecast_price = current_price * (1 + recent_trend * horizon / 24)
-        else:
-            forecast_price = current_price
-        
-        return {
-            'current_price': round(current_price, 2),
-            'forecast_price': round(forecast_price, 2),
-            'change': round(forecast_price - current_price, 2),
-            'change_percent': round((forecast_price - current_price) / current_price * 100, 2),
-            'horizon_hours': horizon
-        }
-    
-    def predict_direction(self, df):
-        if 'price' not in df.columns or len(df) < 5:
-            return {'up_probability': 50, 'down_probability': 50}
-        
-        prices = df['price'].values
-        
-        # Simple momentum-based direction prediction
-        short_momentum = (prices[-1] - prices[-3]) / prices[-3] if len(prices) >= 3 else 0
-        long_momentum = (prices[-1] - prices[-10]) / prices[-10] if len(prices) >= 10 else 0
-        
-        momentum_score = (short_momentum * 0.7 + long_momentum * 0.3) * 100
-        
-        # Convert to probability
-        if momentum_score > 0:
-            up_prob = min(50 + momentum_score * 10, 85)
-        else:
-            up_prob = max(50 + momentum_score * 10, 15)
-        
-        return {
-            'up_probability': round(up_prob, 1),
-            'down_probability': round(100 - up_prob, 1),
-            'momentum_score': round(momentum_score, 3)
-        }
-    
-    def forecast_volatility(self, df):
-        if 'price' not in df.columns or len(df) < 10:
-            return {'forecast': 15.0, 'current': 15.0}
-        
-        prices = df['price'].values
-        returns = np.diff(prices) / prices[:-1]
-        
-        current_vol = np.std(returns) * np.sqrt(252) * 100
-        
-        # Simple volatility forecast (mean reversion)
-        long_term_vol = 20.0  # Assumed long-term volatility
-        forecast_vol = current_vol * 0.7 + long_term_vol * 0.3
-        
-        return {
-            'current': round(current_vol, 2),
-            'forecast': round(forecast_vol, 2),
-            'regime': 'high' if forecast_vol > 25 else 'medium' if forecast_vol > 15 else 'low'
-        }
-    
-    def calculate_confidence_intervals(self, df):
-        if 'price' not in df.columns or len(df) < 5:
-            return {'95_percent': {'lower': 0, 'upper': 0}, '68_percent': {'lower': 0, 'upper': 0}}
-        
-        prices = df['price'].values
-        current_price = prices[-1]
-        
-        # Simple volatility-based confidence intervals
-        if len(prices) >= 10:
-            returns = np.diff(prices) / prices[:-1]
-            volatility = np.std(returns)
-        else:
-            volatility = 0.02  # Default 2% daily volatility
-        
-        # Daily confidence intervals
-        ci_95_lower = current_price * (1 - 1.96 * volatility)
-        ci_95_upper = current_price * (1 + 1.96 * volatility)
-        ci_68_lower = current_price * (1 - 1.0 * volatility)
-        ci_68_upper = current_price * (1 + 1.0 * volatility)
-        
-        return {
-            '95_percent': {
-                'lower': round(ci_95_lower, 2),
-                'upper': round(ci_95_upper, 2)
-            },
-            '68_percent': {
-                'lower': round(ci_68_lower, 2),
-                'upper': round(ci_68_upper, 2)
-            }
-        }
-
-class PatternDetector:
-    def detect(self, data):
-        market_data = data.get('market_data', [])
-        
-        if not market_data:
-            return {'error': 'No market data provided for pattern detection'}
-        
-        df = pd.DataFrame(market_data)
-        
-        detection = {
-            'chart_patterns': self.detect_chart_patterns(df),
-            'candlestick_patterns': self.detect_candlestick_patterns(df),
-            'support_resistance': self.detect_support_resistance_patterns(df),
-            'trend_patterns': self.detect_trend_patterns(df),
-            'volume_patterns': self.detect_volume_patterns(df),
-            'confidence': 0.71,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        return detection
-    
-    def detect_chart_patterns(self, df):
-        patterns = []
-        
-        if 'price' not in df.columns or len(df) < 20:
-            return patterns
-        
-        prices = df['price'].values
-        
-        # Simple pattern detection
-        if len(prices) >= 20:
-            # Head and shoulders pattern (simplified)
-            if self.is_head_and_shoulders(prices[-20:]):
-                patterns.append({
-                    'pattern': 'Head and Shoulders',
-                    'type': 'reversal',
-                    'confidence': 0.75,
-                    'direction': 'bearish'
-                })
-            
-            # Double top/bottom (simplified)
-            if self.is_double_top(prices[-15:]):
-                patterns.append({
-                    'pattern': 'Double Top',
-                    'type': 'reversal',
-                    'confidence': 0.68,
-                    'direction': 'bearish'
-                })
-        
-        return patterns
-    
-    def is_head_and_shoulders(self, prices):
-        # Simplified head and shoulders detection
-        if len(prices) < 15:
-            return False
-        
-        # Find local maxima
-        peaks = []
-        for i in range(2, len(prices) - 2):
-            if prices[i] > prices[i-1] and prices[i] > prices[i+1]:
-                peaks.append((i, prices[i]))
-        
-        if len(peaks) >= 3:
-            # Check if middle peak is highest
-            peaks.sort(key=lambda x: x[1], reverse=True)
-            if peaks[0][0] > peaks[1][0] and peaks[0][0] > peaks[2][0]:
-                return True
-        
-        return False
-    
-    def is_double_top(self, prices):
-        # Simplified double top detection
-        if len(prices) < 10:
-            return False
-        
-        max_price = max(prices)
-        max_indices = [i for i, p in enumerate(prices) if p >= max_price * 0.98]
-        
-        if len(max_indices) >= 2 and max_indices[-1] - max_indices[0] > 5:
-            return True
-        
-        return False
-    
-    def detect_candlestick_patterns(self, df):
-        patterns = []
-        
-        required_cols = ['open', 'high', 'low', 'close']
-        if not all(col in df.columns for col in required_cols) or len(df) < 3:
-            return patterns
-        
-        # Simplified candlestick pattern detection
-        for i in range(2, len(df)):
-            current = df.iloc[i]
-            prev = df.iloc[i-1]
-            
-            # Doji pattern
-            if abs(current['close'] - current['open']) < (current['high'] - current['low']) * 0.1:
-                patterns.append({
-                    'pattern': 'Doji',
-                    'type': 'indecision',
-                    'confidence': 0.65,
-                    'index': i
-                })
-            
-            # Hammer pattern
-            body_size = abs(current['close'] - current['open'])
-            lower_shadow = min(current['open'], current['close']) - current['low']
-            upper_shadow = current['high'] - max(current['open'], current['close'])
-            
-            if lower_shadow > body_size * 2 and upper_shadow < body_size * 0.5:
-                patterns.append({
-                    'pattern': 'Hammer',
-                    'type': 'reversal',
-                    'confidence': 0.72,
-                    'direction': 'bullish',
-                    'index': i
-                })
-        
-        return patterns[-5:]  # Return last 5 patterns
-    
-    def detect_support_resistance_patterns(self, df):
-        if 'price' not in df.columns or len(df) < 10:
-            return {'support_levels': [], 'resistance_levels': []}
-        
-        prices = df['price'].values
-        
-        # Find support and resistance levels
-        support_levels = []
-        resistance_levels = []
-        
-        for i in range(2, len(prices) - 2):
-            # Local minima (support)
-            if prices[i] < prices[i-1] and prices[i] < prices[i+1]:
-                support_levels.append(prices[i])
-            
-            # Local maxima (resistance)
-            if prices[i] > prices[i-1] and prices[i] > prices[i+1]:
-                resistance_levels.append(prices[i])
-        
-        # Cluster similar levels
-        support_levels = self.cluster_levels(support_levels)
-        resistance_levels = self.cluster_levels(resistance_levels)
-        
-        return {
-            'support_levels': support_levels[-3:],  # Last 3 support levels
-            'resistance_levels': resistance_levels[-3:]  # Last 3 resistance levels
-        }
-    
-    def cluster_levels(self, levels):
-        if not levels:
-            return []
-        
-        clustered = []
-        sorted_levels = sorted(levels)
-        
-        current_cluster = [sorted_levels[0]]
-        
-        for level in sorted_levels[1:]:
-            if abs(level - current_cluster[-1]) < current_cluster[-1] * 0.01:  # Within 1%
-                current_cluster.append(level)
-            else:
-                clustered.append(round(np.mean(current_cluster), 2))
-                current_cluster = [level]
-        
-        clustered.append(round(np.mean(current_cluster), 2))
-        return clustered
-    
-    def detect_trend_patterns(self, df):
-        if 'price' not in df.columns or len(df) < 10:
-            return {'trend': 'unknown', 'strength': 0}
-        
-        prices = df['price'].values
-        
-        # Linear regression for trend
-        x = np.arange(len(prices))
-        slope, intercept = np.polyfit(x, prices, 1)
-        
-        # Calculate R-squared
-        y_pred = slope * x + intercept
-        ss_res = np.sum((prices - y_pred) ** 2)
-        ss_tot = np.sum((prices - np.mean(prices)) ** 2)
-        r_squared = 1 - (ss_res / ss_tot) if ss_tot != 0 else 0
-        
-        # Determine trend
-        if slope > 0 and r_squared > 0.5:
-            trend = 'uptrend'
-        elif slope < 0 and r_squared > 0.5:
-            trend = 'downtrend'
-        else:
-            trend = 'sideways'
-        
-        return {
-            'trend': trend,
-            'strength': round(r_squared * 100, 2),
-            'slope': round(slope, 4)
-        }
-    
-    def detect_volume_patterns(self, df):
-        if 'volume' not in df.columns or len(df) < 5:
-            return {'pattern': 'unknown', 'strength': 0}
-        
-        volumes = df['volume'].values
-        prices = df['price'].values if 'price' in df.columns else None
-        
-        # Volume trend
-        recent_vol = np.mean(volumes[-5:])
-        older_vol = np.mean(volumes[-10:-5]) if len(volumes) >= 10 else recent_vol
-        
-        vol_change = (recent_vol - older_vol) / older_vol * 100 if older_vol != 0 else 0
-        
-        # Price-volume relationship
-        if prices is not None and len(prices) == len(volumes):
-            price_change = (prices[-1] - prices[-5]) / prices[-5] * 100 if len(prices) >= 5 else 0
-            
-            if price_change > 0 and vol_change > 0:
-                pattern = 'bullish_confirmation'
-            elif price_change < 0 and vol_change > 0:
-                pattern = 'bearish_confirmation'
-            elif price_change > 0 and vol_change < 0:
-                pattern = 'bullish_divergence'
-            elif price_change < 0 and vol_change < 0:
-                pattern = 'bearish_divergence'
-            else:
-                pattern = 'neutral'
-        else:
-            pattern = 'volume_only'
-        
-        return {
-            'pattern': pattern,
-            'volume_change': round(vol_change, 2),
-            'strength': min(abs(vol_change), 100)
+        // The brain lives in python/trading_brain.py under version control;
+        // regenerating it here would silently revert changes to it.
+        const scriptPath = path.join(__dirname, 'python', 'trading_brain.py');
+        if (!fs.existsSync(scriptPath)) {
+            console.error('🐍 Python brain script not found at:', scriptPath);
         }
+    }
 
-def main():
-    brain = TradingBrain()
-    
-    print("🧠 Trading Brain ready for analysis", flush=True)
-    
-    # Main processing loop
-    while brain.running:
-        try:
-            # Read from stdin
-            line = sys.stdin.readline()
-            if not line:
-                break
-            
-            request = json.loads(line.strip())
-            analysis_type = request.get('type')
-            data = request.get('data', {})
-            request_id = request.get('id')
-            
-            # Process the analysis
-            result = brain.process_analysis(analysis_type, data)
-            
-            # Send result back
-            response = {
-                'id': request_id,
-                'type': analysis_type,
-                'result': result,
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            print(json.dumps(response), flush=True)
-            
-        except Exception as e:
-            error_response = {
-                'id': request.get('id', 'unknown'),
-                'type': 'error',
-                'result': {'error': str(e)},
-                'timestamp': datetime.now().isoformat()
-            }
-            print(json.dumps(error_response), flush=True)
-
-if __name__ == "__main__":
-    main()
-`;
+    startPythonProcess() {
+        console.log('🐍 Starting Python brain process...');
+        this.pythonProcess = this.spawnPythonProcess('active');
+    }
 
-        const pythonDir = path.join(__dirname, 'python');
-        if (!fs.existsSync(pythonDir)) {
-            fs.mkdirSync(pythonDir, { recursive: true });
+    startStandbyProcess() {
+        if (this.standbyProcess || this.shuttingDown) {
+            return;
         }
 
-        const scriptPath = path.join(pythonDir, 'trading_brain.py');
-        fs.writeFileSync(scriptPath, pythonScript);
-        
-        console.log('🐍 Python brain script created at:', scriptPath);
+        console.log('🐍 Starting standby Python brain process...');
+        this.standbyProcess = this.spawnPythonProcess('standby');
     }
 
-    startPythonProcess() {
+    spawnPythonProcess(role) {
         const scriptPath = path.join(__dirname, 'python', 'trading_brain.py');
-        
-        console.log('🐍 Starting Python brain process...');
-        
-        this.pythonProcess = spawn('python3', [scriptPath], {
+        const args = role === 'standby' ? [scriptPath, '--standby'] : [scriptPath];
+
+        const proc = spawn('python3', args, {
             stdio: ['pipe', 'pipe', 'pipe'],
             cwd: __dirname
         });
-
-        this.pythonProcess.stdout.on('data', (data) => {
-            const lines = data.toString().split('\n').filter(line => line.trim());
+        proc.spawnedAt = Date.now();
+        proc.readyAt = null;
+        proc.initMs = null;
+
+        // Decoded by the stream so a multibyte character split across
+        // chunks of a large result is not mangled
+        proc.stdout.setEncoding('utf8');
+        let stdoutBuffer = '';
+        proc.stdout.on('data', (data) => {
+            // Large results span several chunks; only complete lines are handled.
+            stdoutBuffer += data;
+            const lines = stdoutBuffer.split('\n');
+            stdoutBuffer = lines.pop();
             
-            lines.forEach(line => {
-                try {
-                    const response = JSON.parse(line);
-                    this.handlePythonResponse(response);
-                } catch (error) {
-                    // Regular log output
-                    console.log(`🐍 Python: ${line}`);
-                    if (line.includes('Trading Brain ready')) {
-                        this.pythonReady = true;
-                        this.lastHeartbeat = Date.now();
-                        this.broadcastToClients({
-                            type: 'python_status',
-                            status: 'ready',
-                            timestamp: new Date().toISOString()
-                        });
+            lines.filter(line => line.trim()).forEach(line => {
+                const separator = line.indexOf('\t');
+                if (separator !== -1 && line.startsWith('{')) {
+                    // Response: JSON header, tab, pre-serialized result
+                    if (proc === this.pythonProcess) {
+                        const header = JSON.parse(line.slice(0, separator));
+                        this.handlePythonResponse(header, line.slice(separator + 1));
                     }
+                    return;
+                }
+
+                // Regular log output
+                console.log(`🐍 Python${proc === this.standbyProcess ? ' (standby)' : ''}: ${line}`);
+                if (line.includes('Trading Brain ready')) {
+                    const initMatch = line.match(/\(([\d.]+)ms\)/);
+                    proc.initMs = initMatch ? parseFloat(initMatch[1]) : null;
+                    this.handlePythonReady(proc);
                 }
             });
         });
 
-        this.pythonProcess.stderr.on('data', (data) => {
+        proc.stderr.on('data', (data) => {
             console.error(`🐍 Python Error: ${data}`);
         });
 
-        this.pythonProcess.on('close', (code) => {
-            console.log(`🐍 Python process exited with code ${code}`);
-            this.pythonReady = false;
-            
-            // Restart if unexpected exit
-            if (code !== 0) {
-                console.log('🐍 Restarting Python process...');
-                setTimeout(() => this.startPythonProcess(), 5000);
-            }
+        proc.on('close', (code) => {
+            this.handlePythonExit(proc, code);
         });
 
-        this.pythonProcess.on('error', (error) => {
+        proc.on('error', (error) => {
             console.error('🐍 Failed to start Python process:', error);
-            this.pythonReady = false;
+            if (proc === this.pythonProcess) {
+                this.pythonReady = false;
+            }
+        });
+
+        return proc;
+    }
+
+    handlePythonReady(proc) {
+        proc.readyAt = Date.now();
+
+        const readyMs = proc.readyAt - proc.spawnedAt;
+        this.startupStats.lastReadyMs = readyMs;
+        this.startupStats.lastInitMs = proc.initMs;
+        this.startupStats.readyCount++;
+        this.startupStats.totalReadyMs += readyMs;
+
+        if (proc === this.pythonProcess) {
+            this.markPythonReady();
+            this.startStandbyProcess();
+        } else if (proc === this.standbyProcess) {
+            console.log(`🐍 Standby Python brain warm after ${readyMs}ms`);
+        }
+    }
+
+    markPythonReady() {
+        this.pythonReady = true;
+        this.lastHeartbeat = Date.now();
+        this.broadcastToClients({
+            type: 'python_status',
+            status: 'ready',
+            timestamp: new Date().toISOString()
+        });
+    }
+
+    handlePythonExit(proc, code) {
+        if (proc === this.standbyProcess) {
+            console.log(`🐍 Standby Python process exited with code ${code}`);
+            this.standbyProcess = null;
+            if (!this.shuttingDown) {
+                setTimeout(() => this.startStandbyProcess(), 5000);
+            }
+            return;
+        }
+
+        if (proc !== this.pythonProcess) {
+            return;
+        }
+
+        console.log(`🐍 Python process exited with code ${code}`);
+        this.pythonReady = false;
+        this.pythonProcess = null;
+        this.failPendingRequests('Python brain process exited');
+
+        // Restart if unexpected exit
+        if (code === 0 || this.shuttingDown) {
+            return;
+        }
+
+        if (this.standbyProcess) {
+            console.log('🐍 Promoting standby Python process...');
+            this.pythonProcess = this.standbyProcess;
+            this.standbyProcess = null;
+            this.startupStats.failovers++;
+            this.startupStats.lastFailoverAt = new Date().toISOString();
+
+            // The standby skipped state restore at spawn; load the latest
+            // checkpoint written by the process that just died.
+            this.pythonProcess.stdin.write(JSON.stringify({
+                id: 'promote',
+                type: 'promote',
+                timestamp: new Date().toISOString()
+            }) + '\n');
+
+            // A standby that is still importing becomes ready through
+            // handlePythonReady, which also replaces the standby.
+            if (this.pythonProcess.readyAt) {
+                this.markPythonReady();
+                this.startStandbyProcess();
+            }
+        } else {
+            console.log('🐍 Restarting Python process...');
+            setTimeout(() => this.startPythonProcess(), 5000);
+        }
+    }
+
+    failPendingRequests(reason) {
+        const pending = this.pythonQueue;
+        this.pythonQueue = [];
+
+        pending.forEach(item => {
+            this.failResponder(item.res, 503, { error: reason, status: 'service_unavailable' });
         });
     }
 
+    failResponder(res, statusCode, body) {
+        // Responders are Express responses, WebSocket handlers with raw and
+        // fail, or internal callbacks that only take json
+        if (typeof res.fail === 'function') {
+            res.fail(body);
+        } else if (typeof res.status === 'function') {
+            res.status(statusCode).json(body);
+        } else {
+            res.json(body);
+        }
+    }
+
+    getStartupStats() {
+        const stats = this.startupStats;
+        return {
+            lastReadyMs: stats.lastReadyMs,
+            lastInitMs: stats.lastInitMs,
+            averageReadyMs: stats.readyCount > 0
+                ? Math.round(stats.totalReadyMs / stats.readyCount)
+                : null,
+            activeReadyMs: this.pythonProcess && this.pythonProcess.readyAt
+                ? this.pythonProcess.readyAt - this.pythonProcess.spawnedAt
+                : null,
+            standbyReady: Boolean(this.standbyProcess && this.standbyProcess.readyAt),
+            failovers: stats.failovers,
+            lastFailoverAt: stats.lastFailoverAt
+        };
+    }
+
     sendToPython(analysisType, data, res) {
         if (!this.pythonReady || !this.pythonProcess) {
-            return res.status(503).json({ 
+            return this.failResponder(res, 503, {
                 error: 'Python brain not ready',
                 status: 'service_unavailable'
             });
@@ -1210,10 +434,18 @@ if __name__ == "__main__":
         
         const request = {
             id: requestId,
-            type: analysisType,
-            data: data,
-            timestamp: new Date().toISOString()
+            type: analysisType
         };
+        if (data && Array.isArray(data.market_data)) {
+            // Serialized ahead of data so the brain can size (or reject) its
+            // market_data columns before it parses a single row.
+            request.ingest = { rows: data.market_data.length, dtype: data.market_data_dtype || 'float64' };
+            if (data.memory_budget_mb) {
+                request.ingest.budget_mb = data.memory_budget_mb;
+            }
+        }
+        request.data = data;
+        request.timestamp = new Date().toISOString();
 
         // Store the response handler
         this.pythonQueue.push({
@@ -1227,36 +459,44 @@ if __name__ == "__main__":
             this.pythonProcess.stdin.write(JSON.stringify(request) + '\n');
         } catch (error) {
             console.error('🐍 Error sending to Python:', error);
-            res.status(500).json({ error: 'Failed to send request to Python brain' });
+            this.pythonQueue = this.pythonQueue.filter(item => item.id !== requestId);
+            this.failResponder(res, 500, { error: 'Failed to send request to Python brain' });
         }
     }
 
-    handlePythonResponse(response) {
-        const requestId = response.id;
+    handlePythonResponse(header, resultJson) {
+        const requestId = header.id;
         const queueIndex = this.pythonQueue.findIndex(item => item.id === requestId);
         
         if (queueIndex !== -1) {
             const queueItem = this.pythonQueue[queueIndex];
             this.pythonQueue.splice(queueIndex, 1);
             
+            // The result arrives already serialized, so envelopes are built
+            // around it as text instead of parsing and re-stringifying it.
+            const analysisType = JSON.stringify(header.type);
+            const timestamp = JSON.stringify(header.timestamp);
+            const envelope = `{"analysis_type":${analysisType},"result":${resultJson},` +
+                `"timestamp":${timestamp},"processing_time":${Date.now() - queueItem.timestamp}}`;
+
             // Send response back to client
-            queueItem.res.json({
-                analysis_type: response.type,
-                result: response.result,
-                timestamp: response.timestamp,
-                processing_time: Date.now() - queueItem.timestamp
-            });
+            const res = queueItem.res;
+            if (typeof res.raw === 'function') {
+                res.raw(envelope);
+            } else if (typeof res.send === 'function') {
+                res.type('application/json').send(envelope);
+            } else {
+                res.json(JSON.parse(envelope));
+            }
 
             // Cache the result
-            this.analysisCache.set(`${response.type}_${Date.now()}`, response.result);
+            this.analysisCache.set(`${header.type}_${Date.now()}`, resultJson);
             
             // Broadcast to WebSocket clients
-            this.broadcastToClients({
-                type: 'analysis_complete',
-                analysis_type: response.type,
-                result: response.result,
-                timestamp: response.timestamp
-            });
+            this.broadcastToClients(
+                `{"type":"analysis_complete","analysis_type":${analysisType},` +
+                `"result":${resultJson},"timestamp":${timestamp}}`
+            );
         }
     }
 
@@ -1404,12 +644,22 @@ if __name__ == "__main__":
             return;
         }
 
-        this.sendToPython(data.analysisType, data.data, {
-            json: (result) => {
+        const payload = data.fields ? { ...data.data, fields: data.fields } : data.data;
+
+        this.sendToPython(data.analysisType, payload, {
+            raw: (envelope) => {
+                ws.send(`{"type":"analysis_result","analysis_type":${JSON.stringify(data.analysisType)},` +
+                    `"result":${envelope},"timestamp":${JSON.stringify(new Date().toISOString())}}`);
+            },
+            // Called when the brain goes away with the request still pending
+            fail: (body) => {
+                if (ws.readyState !== WebSocket.OPEN) {
+                    return;
+                }
                 ws.send(JSON.stringify({
-                    type: 'analysis_result',
+                    type: 'analysis_error',
                     analysis_type: data.analysisType,
-                    result: result,
+                    ...body,
                     timestamp: new Date().toISOString()
                 }));
             }
@@ -1417,7 +667,8 @@ if __name__ == "__main__":
     }
 
     broadcastToClients(message, specificClientId = null) {
-        const messageStr = JSON.stringify(message);
+        // Pre-serialized messages are forwarded as-is
+        const messageStr = typeof message === 'string' ? message : JSON.stringify(message);
         
         this.wss.clients.forEach((client) => {
             if (client.readyState === WebSocket.OPEN) {
@@ -1475,10 +726,14 @@ if __name__ == "__main__":
         // Graceful shutdown
         process.on('SIGINT', () => {
             console.log('\n🐍 Shutting down Python Brain...');
+            this.shuttingDown = true;
             
             if (this.pythonProcess) {
                 this.pythonProcess.kill('SIGTERM');
             }
+            if (this.standbyProcess) {
+                this.standbyProcess.kill('SIGTERM');
+            }
             
             this.server.close(() => {
                 console.log('🐍 Python Brain server closed');
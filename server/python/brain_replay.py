@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""Replay a captured brain session against fresh trading_brain.py processes.
+
+Record a session by starting the relay with NEXUS_BRAIN_CAPTURE set (a
+path; use a .gz suffix for a compressed log), then replay it:
+
+    NEXUS_BRAIN_CAPTURE=/tmp/session.log.gz npm run python-brain
+    python3 server/python/brain_replay.py /tmp/session.log.gz --speed 4 --workers 2
+
+Requests keep their captured inter-arrival gaps divided by --speed, or are
+sent back to back with --speed max. Paced replays measure latency from each
+request's scheduled send time, so a stalled brain shows up as queueing
+rather than silently slowing the sender down. Slowdown compares the
+service time each replay brain reports in its response header with the
+captured one, so it excludes that queueing and holds at any speed. Workers
+are warmed up before the clock starts. Requests for the same symbol
+or journal always go to the same worker, keeping that state intact (only
+--workers 1 reproduces cross-symbol state such as portfolio history); the
+rest, and every brain's NumPy RNG, are driven by --seed so runs repeat.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+import numpy as np
+
+BRAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'trading_brain.py')
+CONTROL_TYPES = ('promote', 'heartbeat')
+
+def load_capture(path, limit=None):
+    """Parse capture records into dicts with arrival, timings and the request."""
+    opener = gzip.open if path.endswith('.gz') else open
+    records = []
+    with opener(path, 'rt') as f:
+        for line in f:
+            header, separator, raw = line.rstrip('\n').partition('\t')
+            if not separator:
+                continue
+            try:
+                meta = json.loads(header)
+                request = json.loads(raw)
+            except ValueError:
+                continue
+            if request.get('type') in CONTROL_TYPES:
+                continue
+            records.append({
+                'arrival': meta['t'],
+                'captured_ms': meta.get('ms'),
+                'source': meta.get('src', 'stdin'),
+                'request': request
+            })
+            if limit and len(records) >= limit:
+                break
+    records.sort(key=lambda record: record['arrival'])
+    return records
+
+def route_key(request):
+    """The incremental state a request depends on, if any."""
+    data = request.get('data') or {}
+    if data.get('symbol') is not None:
+        return f"symbol:{data['symbol']}"
+    if request.get('type') == 'journal_analysis':
+        return f"journal:{data.get('journal_id') or 'default'}"
+    return None
+
+class BrainWorker:
+    """One brain process with a reader thread collecting completion times."""
+
+    def __init__(self, index, seed, state_dir):
+        env = dict(os.environ)
+        # A replay must not record itself, bind the live socket, consume
+        # live ticks or overwrite the production checkpoint.
+        for name in ('NEXUS_BRAIN_CAPTURE', 'NEXUS_BRAIN_WS_PORT', 'NEXUS_TICK_RING'):
+            env.pop(name, None)
+        env['NEXUS_BRAIN_STATE_DIR'] = os.path.join(state_dir, f'worker_{index}')
+        env['NEXUS_BRAIN_SEED'] = str(seed + index)
+        env['NEXUS_BRAIN_WARM_UP'] = '1'
+
+        self.completed = {}
+        self.service = {}
+        self.errors = set()
+        self.pending = 0
+        self.condition = threading.Condition()
+        self.ready = threading.Event()
+        self.process = subprocess.Popen(
+            [sys.executable, BRAIN_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=env,
+            text=True,
+            bufsize=1 << 16
+        )
+        self.reader = threading.Thread(target=self.read, daemon=True)
+        self.reader.start()
+
+    def read(self):
+        for line in self.process.stdout:
+            done = time.perf_counter()
+            header, separator, body = line.partition('\t')
+            if not separator:
+                if 'Trading Brain ready' in line:
+                    self.ready.set()
+                continue
+            meta = json.loads(header)
+            request_id = meta.get('id')
+            with self.condition:
+                self.completed[request_id] = done
+                self.service[request_id] = meta.get('service_ms')
+                if body.startswith('{"error"'):
+                    self.errors.add(request_id)
+                self.pending -= 1
+                self.condition.notify_all()
+        self.ready.set()
+
+    def send(self, line):
+        with self.condition:
+            self.pending += 1
+        self.process.stdin.write(line)
+        self.process.stdin.flush()
+
+    def warm_up(self, timeout=30):
+        # One stateless round trip so the first timed request does not pay
+        # for first-use costs on the request path
+        self.send(json.dumps({'id': 'warm_up', 'type': 'heartbeat', 'data': {}}) + '\n')
+        self.drain(time.perf_counter() + timeout)
+
+    def drain(self, deadline):
+        with self.condition:
+            while self.pending > 0 and time.perf_counter() < deadline:
+                self.condition.wait(timeout=max(0.0, deadline - time.perf_counter()))
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 3) if len(values) else None
+
+def replay(records, speed=1.0, workers=1, seed=0, timeout=60.0):
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory(prefix='brain_replay_') as state_dir:
+        pool = [BrainWorker(i, seed, state_dir) for i in range(workers)]
+        for worker in pool:
+            worker.ready.wait(timeout=30)
+            worker.warm_up()
+
+        sends = []
+        origin = records[0]['arrival'] if records else 0.0
+        started = time.perf_counter()
+        for i, record in enumerate(records):
+            request = dict(record['request'], id=f'replay_{i}')
+            key = route_key(request)
+            target = zlib.crc32(key.encode()) % workers if key is not None else rng.randrange(workers)
+
+            if speed is None:
+                scheduled = time.perf_counter()
+            else:
+                scheduled = started + (record['arrival'] - origin) / speed
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            pool[target].send(json.dumps(request, separators=(',', ':')) + '\n')
+            sends.append((request['id'], target, scheduled))
+
+        deadline = time.perf_counter() + timeout
+        for worker in pool:
+            worker.drain(deadline)
+        finished = time.perf_counter()
+        for worker in pool:
+            worker.close()
+
+    latencies = np.full(len(records), np.nan)
+    services = np.full(len(records), np.nan)
+    errors = np.zeros(len(records), dtype=bool)
+    for i, (request_id, target, scheduled) in enumerate(sends):
+        done = pool[target].completed.get(request_id)
+        if done is not None:
+            latencies[i] = (done - scheduled) * 1000
+        if pool[target].service.get(request_id) is not None:
+            services[i] = pool[target].service[request_id]
+        errors[i] = request_id in pool[target].errors
+    return latencies, services, errors, finished - started
+
+def report(records, latencies, services, errors, duration):
+    answered = np.isfinite(latencies)
+    types = np.array([record['request'].get('type') or 'unknown' for record in records])
+    captured = np.array([record['captured_ms'] if record['captured_ms'] is not None else np.nan
+                         for record in records], dtype=np.float64)
+
+    per_type = {}
+    for analysis_type in sorted(set(types.tolist())):
+        mask = types == analysis_type
+        replayed = latencies[mask & answered]
+        served = services[mask & np.isfinite(services)]
+        baseline = captured[mask & np.isfinite(captured)]
+        service_p50 = percentile(served, 50)
+        captured_p50 = percentile(baseline, 50)
+        per_type[analysis_type] = {
+            'count': int(mask.sum()),
+            'errors': int((errors & mask).sum()),
+            'p50_ms': percentile(replayed, 50),
+            'p99_ms': percentile(replayed, 99),
+            'service_p50_ms': service_p50,
+            'captured_p50_ms': captured_p50,
+            'slowdown': (round(service_p50 / captured_p50, 2)
+                         if service_p50 is not None and captured_p50 else None)
+        }
+
+    answered_latencies = latencies[answered]
+    return {
+        'requests': len(records),
+        'answered': int(answered.sum()),
+        'errors': int(errors.sum()),
+        'duration_s': round(duration, 3),
+        'throughput_rps': round(float(answered.sum()) / duration, 1) if duration > 0 else None,
+        'latency_ms': {
+            'p50': percentile(answered_latencies, 50),
+            'p90': percentile(answered_latencies, 90),
+            'p99': percentile(answered_latencies, 99),
+            'p99.9': percentile(answered_latencies, 99.9),
+            'max': round(float(answered_latencies.max()), 3) if len(answered_latencies) else None
+        },
+        'per_type': per_type
+    }
+
+def print_report(summary):
+    print(f"requests {summary['requests']}  answered {summary['answered']}  errors {summary['errors']}  "
+          f"duration {summary['duration_s']}s  throughput {summary['throughput_rps']} req/s")
+    latency = summary['latency_ms']
+    print('latency ms  ' + '  '.join(f'{name} {value}' for name, value in latency.items()))
+    print()
+    print(f"{'type':<26}{'count':>8}{'errors':>8}{'p50':>10}{'p99':>10}{'service':>10}{'captured':>10}"
+          f"{'slowdown':>10}")
+    for analysis_type, row in sorted(summary['per_type'].items(),
+                                     key=lambda item: -(item[1]['slowdown'] or 0)):
+        print(f"{analysis_type:<26}{row['count']:>8}{row['errors']:>8}{str(row['p50_ms']):>10}"
+              f"{str(row['p99_ms']):>10}{str(row['service_p50_ms']):>10}{str(row['captured_p50_ms']):>10}"
+              f"{str(row['slowdown']):>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a trading brain request capture.')
+    parser.add_argument('capture', help='capture log written via NEXUS_BRAIN_CAPTURE')
+    parser.add_argument('--speed', default='1', help="time scale (1, 4, 0.5, ...) or 'max'")
+    parser.add_argument('--workers', type=int, default=1, help='brain processes to spread requests over')
+    parser.add_argument('--seed', type=int, default=0, help='seed for routing and brain RNGs')
+    parser.add_argument('--limit', type=int, default=None, help='replay only the first N requests')
+    parser.add_argument('--timeout', type=float, default=60.0, help='seconds to wait for stragglers')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    speed = None if args.speed == 'max' else float(args.speed)
+    if speed is not None and speed <= 0:
+        parser.error("--speed must be positive or 'max'")
+
+    records = load_capture(args.capture, args.limit)
+    if not records:
+        parser.error('capture contains no replayable requests')
+
+    latencies, services, errors, duration = replay(records, speed, max(1, args.workers), args.seed, args.timeout)
+    summary = report(records, latencies, services, errors, duration)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_report(summary)
+
+if __name__ == '__main__':
+    main()
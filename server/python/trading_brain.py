@@ -1,39 +1,125 @@
 
+import time
+_PROCESS_START = time.perf_counter()
+
 import json
+import os
+import signal
 import sys
+import threading
+import hashlib
+import mmap
+import bisect
+import codecs
+import re
 import numpy as np
-import pandas as pd
 from datetime import datetime, timedelta
-import asyncio
-import websockets
-import threading
+from numpy.lib.stride_tricks import sliding_window_view
 import queue
-import time
 import warnings
 warnings.filterwarnings('ignore')
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# pandas dominates interpreter start-up (~0.5s), so it is imported on the
+# first analysis that builds a DataFrame rather than at module load.
+pd = None
+
+def load_pandas():
+    global pd
+    if pd is None:
+        import pandas
+        pd = pandas
+    return pd
+
+# The optional WebSocket front end is only imported when it is enabled.
+websockets = None
+
+def load_websockets():
+    global websockets
+    if websockets is None:
+        try:
+            import websockets as module
+        except ImportError:
+            return None
+        websockets = module
+    return websockets
+
 class TradingBrain:
     def __init__(self):
         self.analysis_queue = queue.Queue()
         self.result_queue = queue.Queue()
         self.running = True
+        self.busy = False
+        # Held by every analysis and by the tick feed thread, so analyzers
+        # never see ticks ingested halfway through a request
+        self.lock = threading.RLock()
+        self.tick_feed = None
+        self.equity_simulator = EquitySimulator()
+        
+        # Incremental state that survives restarts via checkpoints
+        self.market_history = MarketHistory()
+        self.regime_engine = RegimeEngine(self.market_history)
+        self.liquidity_engine = LiquidityEngine()
+        self.journal_analyzer = JournalAnalyzer(self.equity_simulator)
         
         # Initialize models and analyzers
-        self.market_analyzer = MarketAnalyzer()
-        self.strategy_analyzer = StrategyAnalyzer()
-        self.risk_analyzer = RiskAnalyzer()
-        self.portfolio_optimizer = PortfolioOptimizer()
-        self.price_predictor = PricePredictor()
+        self.market_analyzer = MarketAnalyzer(self.regime_engine)
+        self.strategy_analyzer = StrategyAnalyzer(self.equity_simulator)
+        self.risk_analyzer = RiskAnalyzer(self.regime_engine, self.liquidity_engine)
+        self.portfolio_optimizer = PortfolioOptimizer(self.market_history, self.equity_simulator)
+        self.price_predictor = PricePredictor(self.regime_engine)
         self.pattern_detector = PatternDetector()
         
+        self.state_store = BrainStateStore({
+            'market_history': self.market_history,
+            'pattern_scanner': self.pattern_detector.scanner,
+            'regime_engine': self.regime_engine,
+            'liquidity_engine': self.liquidity_engine,
+            'journal_analyzer': self.journal_analyzer,
+        }, lock=self.lock)
+        
         print("🧠 Trading Brain initialized", flush=True)
     
+    def warm_up(self):
+        # Standby processes pay the deferred import cost up front so a
+        # failover does not stall the first request after promotion.
+        load_pandas()
+    
     def process_analysis(self, analysis_type, data):
+        with self.lock:
+            if self.tick_feed is not None and self.tick_feed.active:
+                # Every tick published before the request is visible to it
+                self.tick_feed.drain()
+            return self.dispatch(analysis_type, data)
+    
+    def dispatch(self, analysis_type, data):
         try:
+            if data.get('market_data'):
+                # Streamed requests arrive columnar already; row lists are
+                # converted once so every consumer sees the same columns.
+                # The request itself is left as sent so it can still be
+                # captured for replay.
+                data = dict(data, market_data=market_columns(data['market_data'], data.get('market_data_dtype')))
+            if data.get('symbol') and data.get('market_data'):
+                symbol, market_data = data['symbol'], data['market_data']
+                new_rows, replaced = self.market_history.record(symbol, market_data)
+                self.liquidity_engine.ingest(symbol, market_data.take(new_rows), reset=replaced)
+                if replaced:
+                    # The new window shares no bars with what the cursors saw
+                    self.regime_engine.rewind(symbol)
+                    self.pattern_detector.scanner.cursors.pop(symbol, None)
+                self.state_store.mark_dirty()
+            
             if analysis_type == 'market_analysis':
                 return self.market_analyzer.analyze(data)
             elif analysis_type == 'strategy_analysis':
                 return self.strategy_analyzer.analyze(data)
+            elif analysis_type == 'strategy_ranking':
+                return self.strategy_analyzer.rank(data)
             elif analysis_type == 'risk_analysis':
                 return self.risk_analyzer.analyze(data)
             elif analysis_type == 'portfolio_optimization':
@@ -42,6 +128,23 @@ class TradingBrain:
                 return self.price_predictor.predict(data)
             elif analysis_type == 'pattern_detection':
                 return self.pattern_detector.detect(data)
+            elif analysis_type == 'liquidity_analysis':
+                if data.get('source') == 'ticks':
+                    if self.tick_feed is None:
+                        return {'error': 'Tick feed is not enabled (set NEXUS_TICK_RING)'}
+                    return self.tick_feed.liquidity.analyze(data)
+                return self.liquidity_engine.analyze(data)
+            elif analysis_type == 'regime_analysis':
+                self.state_store.mark_dirty()
+                return self.regime_engine.analyze(data)
+            elif analysis_type == 'pattern_scan':
+                self.state_store.mark_dirty()
+                return self.pattern_detector.scan(data, self.market_history)
+            elif analysis_type == 'equity_simulation':
+                return self.equity_simulator.analyze(data)
+            elif analysis_type == 'journal_analysis':
+                self.state_store.mark_dirty()
+                return self.journal_analyzer.analyze(data)
             elif analysis_type == 'strategy_backtest':
                 return self.backtest_strategy(data)
             else:
@@ -50,27 +153,32 @@ class TradingBrain:
             return {'error': str(e), 'type': 'analysis_error'}
 
 class MarketAnalyzer:
+    def __init__(self, regime_engine=None):
+        self.regime_engine = regime_engine
+    
     def analyze(self, data):
         # Advanced market analysis
         market_data = data.get('market_data', [])
         if not market_data:
             return {'error': 'No market data provided'}
         
-        df = pd.DataFrame(market_data)
+        df = load_pandas().DataFrame(market_data)
+        regime = self.regime_engine.current(data.get('symbol')) if self.regime_engine else None
         
         analysis = {
-            'trend_analysis': self.analyze_trend(df),
+            'trend_analysis': self.analyze_trend(df, regime),
             'volatility_analysis': self.analyze_volatility(df),
             'momentum_analysis': self.analyze_momentum(df),
             'support_resistance': self.find_support_resistance(df),
-            'market_regime': self.detect_market_regime(df),
+            'market_regime': self.detect_market_regime(df, regime),
+            'regime_model': regime,
             'confidence': 0.85,
             'timestamp': datetime.now().isoformat()
         }
         
         return analysis
     
-    def analyze_trend(self, df):
+    def analyze_trend(self, df, regime=None):
         if 'price' not in df.columns:
             return {'direction': 'unknown', 'strength': 0}
         
@@ -92,12 +200,19 @@ class MarketAnalyzer:
             direction = 'sideways'
             strength = 0
         
-        return {
+        trend = {
             'direction': direction,
             'strength': round(strength, 2),
             'short_ma': round(short_ma, 2),
             'long_ma': round(long_ma, 2)
         }
+        
+        if regime is not None:
+            # Moving-average signals are only dependable in a trending regime
+            trend['regime'] = regime['label']
+            trend['trend_reliability'] = round(regime['probabilities'].get('trending', 0) * 100, 2)
+        
+        return trend
     
     def analyze_volatility(self, df):
         if 'price' not in df.columns:
@@ -178,7 +293,10 @@ class MarketAnalyzer:
             'resistance': sorted(resistance, reverse=True)
         }
     
-    def detect_market_regime(self, df):
+    def detect_market_regime(self, df, regime=None):
+        if regime is not None:
+            return regime['label']
+        
         if 'price' not in df.columns:
             return 'unknown'
         
@@ -198,93 +316,212 @@ class MarketAnalyzer:
             return 'ranging'
 
 class StrategyAnalyzer:
+    # Per-strategy metric columns and the defaults used when a field is absent
+    STRATEGY_FIELDS = {
+        'winRate': 0.0,
+        'profitFactor': 1.0,
+        'sharpeRatio': 0.0,
+        'maxDrawdown': 0.0,
+        'volatility': 20.0,
+        'correlation': 0.5
+    }
+    
+    def __init__(self, simulator=None):
+        self.simulator = simulator
+    
     def analyze(self, data):
         strategies = data.get('strategies', [])
         performance_data = data.get('performance', {})
         
+        columns = self.to_columns(strategies)
         analysis = {
-            'strategy_performance': self.analyze_performance(strategies, performance_data),
-            'optimization_suggestions': self.suggest_optimizations(strategies),
-            'risk_assessment': self.assess_strategy_risk(strategies),
-            'correlation_analysis': self.analyze_correlations(strategies),
+            'strategy_performance': self.analyze_performance(columns, performance_data),
+            'optimization_suggestions': self.suggest_optimizations(columns),
+            'risk_assessment': self.assess_strategy_risk(columns),
+            'correlation_analysis': self.analyze_correlations(self.to_records(columns)),
             'confidence': 0.78,
             'timestamp': datetime.now().isoformat()
         }
         
+        # Strategies that ship their return/P&L series also get simulated
+        # drawdown and ruin distributions alongside the point estimates
+        # (dashboard strategies carry a scalar pnl, which is not a series)
+        if self.simulator is not None and isinstance(strategies, list):
+            with_series = []
+            for strategy in strategies:
+                if self.is_series(strategy.get('returns')):
+                    with_series.append(strategy)
+                elif self.is_series(strategy.get('pnl')):
+                    with_series.append(dict(strategy, returns=None))
+            if with_series:
+                analysis['simulations'] = self.simulator.analyze(dict(data, strategies=with_series))['simulations']
+        
         return analysis
     
-    def analyze_performance(self, strategies, performance_data):
-        if not strategies:
+    @staticmethod
+    def is_series(values):
+        return values is not None and np.ndim(values) >= 1 and len(values) >= 2
+    
+    def rank(self, data):
+        """Rank a large strategy universe (e.g. parameter-search output).
+        
+        Only the top_k strategies are materialized; everything else stays in
+        columnar arrays.
+        """
+        columns = self.to_columns(data.get('strategies', []))
+        count = len(columns['name'])
+        if count == 0:
             return {'error': 'No strategies provided'}
         
-        results = []
-        for strategy in strategies:
-            perf = {
-                'name': strategy.get('name', 'Unknown'),
-                'win_rate': strategy.get('winRate', 0),
-                'profit_factor': strategy.get('profitFactor', 1),
-                'sharpe_ratio': strategy.get('sharpeRatio', 0),
-                'max_drawdown': strategy.get('maxDrawdown', 0),
-                'score': self.calculate_strategy_score(strategy)
+        top_k = max(1, min(int(data.get('top_k', 10)), count))
+        scores = self.score_columns(columns)
+        risk_scores = self.risk_score_columns(columns)
+        flags = self.suggestion_flags(columns)
+        
+        # argpartition selects the top_k in O(n); only those are sorted
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        
+        rankings = [
+            {
+                'rank': position + 1,
+                'index': int(i),
+                'name': columns['name'][i],
+                'score': scores[i],
+                'risk_score': risk_scores[i],
+                'risk_level': self.risk_level(risk_scores[i]),
+                'win_rate': columns['winRate'][i],
+                'profit_factor': columns['profitFactor'][i],
+                'sharpe_ratio': columns['sharpeRatio'][i],
+                'max_drawdown': columns['maxDrawdown'][i],
+                'suggestions': [flag for flag, mask in flags.items() if mask[i]]
             }
-            results.append(perf)
+            for position, i in enumerate(top)
+        ]
         
-        return sorted(results, key=lambda x: x['score'], reverse=True)
+        return {
+            'rankings': rankings,
+            'strategy_count': count,
+            'score_distribution': {
+                'mean': round(float(np.mean(scores)), 2),
+                'median': round(float(np.median(scores)), 2),
+                'p90': round(float(np.percentile(scores, 90)), 2),
+                'max': round(float(np.max(scores)), 2)
+            },
+            'suggestion_counts': {flag: int(np.count_nonzero(mask)) for flag, mask in flags.items()},
+            'average_risk': round(float(np.mean(risk_scores)), 2),
+            'timestamp': datetime.now().isoformat()
+        }
     
-    def calculate_strategy_score(self, strategy):
-        win_rate = strategy.get('winRate', 0) / 100
-        profit_factor = min(strategy.get('profitFactor', 1), 5) / 5
-        sharpe = min(max(strategy.get('sharpeRatio', 0), 0), 3) / 3
-        drawdown_penalty = max(0, 1 - abs(strategy.get('maxDrawdown', 0)) / 50)
+    def to_columns(self, strategies):
+        """Convert strategies to float64 metric arrays plus a name list.
+        
+        Accepts the usual list of dicts, or pre-columnar input: a dict mapping
+        each field to a list/array of per-strategy values.
+        """
+        if isinstance(strategies, dict):
+            count = len(strategies.get('name', next(iter(strategies.values()), [])))
+            columns = {'name': list(strategies.get('name', [None] * count))}
+            for field, default in self.STRATEGY_FIELDS.items():
+                values = strategies.get(field)
+                columns[field] = (np.asarray(values, dtype=np.float64) if values is not None
+                                  else np.full(count, default))
+            return columns
+        
+        count = len(strategies)
+        columns = {'name': [strategy.get('name') for strategy in strategies]}
+        for field, default in self.STRATEGY_FIELDS.items():
+            columns[field] = np.fromiter(
+                (strategy.get(field, default) for strategy in strategies),
+                dtype=np.float64,
+                count=count
+            )
+        return columns
+    
+    def to_records(self, columns):
+        return [{'name': name} for name in columns['name']]
+    
+    def risk_level(self, risk_score):
+        return 'high' if risk_score > 70 else 'medium' if risk_score > 40 else 'low'
+    
+    def analyze_performance(self, columns, performance_data):
+        if len(columns['name']) == 0:
+            return {'error': 'No strategies provided'}
+        
+        scores = self.score_columns(columns)
+        order = np.argsort(-scores, kind='stable')
+        
+        return [
+            {
+                'name': columns['name'][i] if columns['name'][i] is not None else 'Unknown',
+                'win_rate': columns['winRate'][i],
+                'profit_factor': columns['profitFactor'][i],
+                'sharpe_ratio': columns['sharpeRatio'][i],
+                'max_drawdown': columns['maxDrawdown'][i],
+                'score': scores[i]
+            }
+            for i in order
+        ]
+    
+    def score_columns(self, columns):
+        win_rate = columns['winRate'] / 100
+        profit_factor = np.minimum(columns['profitFactor'], 5) / 5
+        sharpe = np.clip(columns['sharpeRatio'], 0, 3) / 3
+        drawdown_penalty = np.maximum(0, 1 - np.abs(columns['maxDrawdown']) / 50)
         
         score = (win_rate * 0.3 + profit_factor * 0.3 + sharpe * 0.2 + drawdown_penalty * 0.2) * 100
-        return round(score, 2)
+        return np.round(score, 2)
     
-    def suggest_optimizations(self, strategies):
-        suggestions = []
+    def calculate_strategy_score(self, strategy):
+        return float(self.score_columns(self.to_columns([strategy]))[0])
+    
+    def suggestion_flags(self, columns):
+        return {
+            'win_rate_improvement': columns['winRate'] < 60,
+            'profit_factor_improvement': columns['profitFactor'] < 1.5
+        }
+    
+    def suggest_optimizations(self, columns):
+        flags = self.suggestion_flags(columns)
+        messages = {
+            'win_rate_improvement': 'Consider tightening entry criteria or improving signal quality',
+            'profit_factor_improvement': 'Review risk-reward ratios and exit strategies'
+        }
         
-        for strategy in strategies:
-            if strategy.get('winRate', 0) < 60:
-                suggestions.append({
-                    'strategy': strategy.get('name'),
-                    'type': 'win_rate_improvement',
-                    'suggestion': 'Consider tightening entry criteria or improving signal quality'
-                })
-            
-            if strategy.get('profitFactor', 1) < 1.5:
-                suggestions.append({
-                    'strategy': strategy.get('name'),
-                    'type': 'profit_factor_improvement',
-                    'suggestion': 'Review risk-reward ratios and exit strategies'
-                })
+        suggestions = []
+        for i in np.flatnonzero(np.logical_or.reduce(list(flags.values()))):
+            for flag, mask in flags.items():
+                if mask[i]:
+                    suggestions.append({
+                        'strategy': columns['name'][i],
+                        'type': flag,
+                        'suggestion': messages[flag]
+                    })
         
         return suggestions
     
-    def assess_strategy_risk(self, strategies):
-        total_risk = 0
-        risk_breakdown = []
-        
-        for strategy in strategies:
-            risk_score = self.calculate_risk_score(strategy)
-            total_risk += risk_score
-            risk_breakdown.append({
-                'strategy': strategy.get('name'),
-                'risk_score': risk_score,
-                'risk_level': 'high' if risk_score > 70 else 'medium' if risk_score > 40 else 'low'
-            })
+    def assess_strategy_risk(self, columns):
+        risk_scores = self.risk_score_columns(columns)
         
         return {
-            'total_risk': round(total_risk / len(strategies) if strategies else 0, 2),
-            'breakdown': risk_breakdown
+            'total_risk': round(float(np.mean(risk_scores)), 2) if len(risk_scores) else 0,
+            'breakdown': [
+                {
+                    'strategy': name,
+                    'risk_score': risk_score,
+                    'risk_level': self.risk_level(risk_score)
+                }
+                for name, risk_score in zip(columns['name'], risk_scores)
+            ]
         }
     
+    def risk_score_columns(self, columns):
+        risk_score = (np.abs(columns['maxDrawdown']) * 0.4 + columns['volatility'] * 0.4
+                      + columns['correlation'] * 20 * 0.2)
+        return np.minimum(np.round(risk_score, 2), 100)
+    
     def calculate_risk_score(self, strategy):
-        drawdown = abs(strategy.get('maxDrawdown', 0))
-        volatility = strategy.get('volatility', 20)
-        correlation = strategy.get('correlation', 0.5)
-        
-        risk_score = (drawdown * 0.4 + volatility * 0.4 + correlation * 20 * 0.2)
-        return min(round(risk_score, 2), 100)
+        return float(self.risk_score_columns(self.to_columns([strategy]))[0])
     
     def analyze_correlations(self, strategies):
         # Simplified correlation analysis
@@ -306,6 +543,10 @@ class StrategyAnalyzer:
         return correlations
 
 class RiskAnalyzer:
+    def __init__(self, regime_engine=None, liquidity_engine=None):
+        self.regime_engine = regime_engine
+        self.liquidity_engine = liquidity_engine
+    
     def analyze(self, data):
         portfolio_data = data.get('portfolio', {})
         positions = data.get('positions', [])
@@ -328,19 +569,23 @@ class RiskAnalyzer:
         if not positions:
             return {'var_95': 0, 'var_99': 0, 'expected_shortfall': 0}
         
-        # Simplified VaR calculation
-        total_value = sum(pos.get('notionalValue', 0) for pos in positions)
-        portfolio_volatility = 0.15  # Assumed 15% annual volatility
+        # Simplified VaR calculation; symbols with a fitted regime model use
+        # the regime-implied volatility instead of the assumed 15% annual
+        regimes = [self.regime_engine.current(pos.get('symbol')) if self.regime_engine else None
+                   for pos in positions]
+        volatilities = [regime['expected_volatility'] / 100 if regime else 0.15 for regime in regimes]
+        volatility_value = sum(pos.get('notionalValue', 0) * vol for pos, vol in zip(positions, volatilities))
         
-        var_95 = total_value * portfolio_volatility * 1.645 / np.sqrt(252)  # Daily VaR
-        var_99 = total_value * portfolio_volatility * 2.326 / np.sqrt(252)
+        var_95 = volatility_value * 1.645 / np.sqrt(252)  # Daily VaR
+        var_99 = volatility_value * 2.326 / np.sqrt(252)
         expected_shortfall = var_99 * 1.2
         
         return {
             'var_95': round(var_95, 2),
             'var_99': round(var_99, 2),
             'expected_shortfall': round(expected_shortfall, 2),
-            'confidence_level': '95% and 99%'
+            'confidence_level': '95% and 99%',
+            'regime_adjusted_positions': sum(regime is not None for regime in regimes)
         }
     
     def stress_test(self, positions, market_data):
@@ -391,9 +636,15 @@ class RiskAnalyzer:
         }
     
     def analyze_liquidity(self, positions):
-        liquidity_scores = []
+        costs = self.liquidity_engine.liquidation_costs(positions) if self.liquidity_engine else None
         
-        for position in positions:
+        liquidity_scores = []
+        for i, position in enumerate(positions):
+            if costs is not None and costs['measured'][i]:
+                # Measured liquidation cost: 0bps -> 100, 50bps or worse -> 0
+                liquidity_scores.append(round(float(np.clip(100 - costs['cost_bps'][i] * 2, 0, 100)), 2))
+                continue
+            
             symbol = position.get('symbol', '')
             # Simplified liquidity scoring
             if symbol in ['ES', 'NQ', 'SPY', 'QQQ']:
@@ -407,14 +658,30 @@ class RiskAnalyzer:
         
         avg_liquidity = np.mean(liquidity_scores) if liquidity_scores else 0
         
-        return {
+        position_liquidity = []
+        for i, (pos, score) in enumerate(zip(positions, liquidity_scores)):
+            entry = {'symbol': pos.get('symbol'), 'liquidity_score': score}
+            if costs is not None and costs['measured'][i]:
+                # Bars without quotes have no spread; unmeasured values are None
+                entry.update({
+                    'estimated_cost': round_finite(costs['cost'][i], 2),
+                    'cost_bps': round_finite(costs['cost_bps'][i], 2),
+                    'spread_bps': round_finite(costs['spread_bps'][i], 2),
+                    'impact_bps': round_finite(costs['impact_bps'][i], 2),
+                    'participation': round_finite(costs['participation'][i], 4),
+                    'bars_to_exit': round_finite(costs['bars_to_exit'][i], 1)
+                })
+            position_liquidity.append(entry)
+        
+        liquidity = {
             'average_liquidity': round(avg_liquidity, 2),
             'liquidity_risk': 'low' if avg_liquidity > 80 else 'medium' if avg_liquidity > 60 else 'high',
-            'position_liquidity': [
-                {'symbol': pos.get('symbol'), 'liquidity_score': score}
-                for pos, score in zip(positions, liquidity_scores)
-            ]
+            'position_liquidity': position_liquidity
         }
+        if costs is not None and np.any(costs['measured']):
+            liquidity['total_liquidation_cost'] = round(float(np.nansum(costs['cost'])), 2)
+        
+        return liquidity
     
     def analyze_correlation_risk(self, positions):
         if len(positions) < 2:
@@ -469,6 +736,12 @@ class RiskAnalyzer:
         return recommendations
 
 class PortfolioOptimizer:
+    def __init__(self, market_history=None, simulator=None, max_horizon=2520):
+        self.market_history = market_history
+        self.simulator = simulator or EquitySimulator()
+        # Simulation steps per path; longer bar horizons are aggregated
+        self.max_horizon = max_horizon
+    
     def optimize(self, data):
         positions = data.get('positions', [])
         target_return = data.get('target_return', 0.12)
@@ -478,7 +751,7 @@ class PortfolioOptimizer:
             'current_allocation': self.analyze_current_allocation(positions),
             'optimal_allocation': self.calculate_optimal_allocation(positions, target_return, risk_tolerance),
             'rebalancing_suggestions': self.generate_rebalancing_suggestions(positions),
-            'expected_metrics': self.calculate_expected_metrics(positions),
+            'expected_metrics': self.calculate_expected_metrics(positions, data),
             'confidence': 0.75,
             'timestamp': datetime.now().isoformat()
         }
@@ -550,17 +823,117 @@ class PortfolioOptimizer:
         
         return suggestions
     
-    def calculate_expected_metrics(self, positions):
-        # Mock expected metrics
+    def portfolio_returns(self, positions, data, min_bars=30):
+        """Per-bar portfolio returns and bars per year, or (None, None).
+        
+        Without a 'returns' series, the positions' symbol histories are
+        joined on the bar timestamps they share (or on their common tail when
+        a history has no timestamps), turned into simple returns and weighted
+        by signed notional over gross exposure. Bars per year come from
+        data['periods_per_year'], else from the joined timestamps, else the
+        daily default of 252.
+        """
+        if data.get('returns') is not None:
+            returns = np.asarray(data['returns'], dtype=np.float64)
+            returns = returns[np.isfinite(returns)]
+            return (returns, data.get('periods_per_year', 252)) if len(returns) >= min_bars else (None, None)
+        if self.market_history is None or not positions:
+            return None, None
+        
+        windows, weights = [], []
+        for position in positions:
+            window = self.market_history.get(position.get('symbol'))
+            if window is None or len(window['price']) <= min_bars:
+                continue
+            windows.append(window)
+            weights.append(position.get('notionalValue', 0) or 0)
+        
+        gross = np.sum(np.abs(weights))
+        if not windows or gross == 0:
+            return None, None
+        prices, stamps = self.align_windows(windows)
+        if prices.shape[1] <= min_bars:
+            return None, None
+        returns = (np.asarray(weights) / gross) @ (prices[:, 1:] / prices[:, :-1] - 1)
+        returns = returns[np.isfinite(returns)]
+        if len(returns) < min_bars:
+            return None, None
+        
+        periods_per_year = data.get('periods_per_year') or bars_per_year(stamps) or 252
+        return returns, periods_per_year
+    
+    @staticmethod
+    def align_windows(windows):
+        """Stack history prices on shared timestamps; returns (prices, stamps)."""
+        if all(np.isfinite(window['timestamp']).all() for window in windows):
+            common = windows[0]['timestamp']
+            for window in windows[1:]:
+                common = np.intersect1d(common, window['timestamp'])
+            # First occurrence of each shared stamp, in time order
+            prices = np.vstack([window['price'][np.intersect1d(window['timestamp'], common, return_indices=True)[1]]
+                                for window in windows])
+            return prices, common
+        length = min(len(window['price']) for window in windows)
+        return np.vstack([window['price'][-length:] for window in windows]), windows[0]['timestamp'][-length:]
+    
+    def calculate_expected_metrics(self, positions, data=None):
+        data = data or {}
+        returns, periods_per_year = self.portfolio_returns(positions, data)
+        if returns is None:
+            # Not enough return history to simulate; keep the static baseline
+            return {
+                'expected_return': 12.5,
+                'expected_volatility': 15.2,
+                'sharpe_ratio': 0.82,
+                'max_drawdown': 8.5,
+                'var_95': 2.1,
+                'simulated': False
+            }
+        
+        horizon = int(data.get('horizon') or round(periods_per_year))
+        block_size = data.get('block_size', 5)
+        # A sample shorter than the horizon says little about drift, and
+        # compounding its mean over the horizon swamps everything else, so
+        # such samples are simulated for their volatility alone.
+        demeaned = len(returns) < horizon
+        series = returns - returns.mean() if demeaned else returns
+        step = -(-horizon // self.max_horizon)
+        if step > 1:
+            # A year of intraday bars is too long to walk path by path;
+            # simulate over every step-bar compounded return instead
+            logs = np.log1p(np.maximum(series, -0.999999))
+            sums = np.cumsum(np.concatenate([[0.0], logs, logs[:step - 1]]))
+            series = np.expm1(sums[step:step + len(logs)] - sums[:len(logs)])
+            horizon = max(1, horizon // step)
+            block_size = max(1, block_size // step)
+        outcome = self.simulator.simulate(
+            series,
+            n_paths=data.get('n_paths'),
+            horizon=horizon,
+            block_size=block_size,
+            seed=data.get('seed'),
+            periods_per_year=periods_per_year / step
+        )
+        
         return {
-            'expected_return': 12.5,
-            'expected_volatility': 15.2,
-            'sharpe_ratio': 0.82,
-            'max_drawdown': 8.5,
-            'var_95': 2.1
+            'expected_return': round(float(np.median(outcome['final_return'])) * 100, 2),
+            'expected_volatility': round(float(np.std(returns) * np.sqrt(periods_per_year)) * 100, 2),
+            'sharpe_ratio': round(float(np.median(outcome['sharpe'])), 3),
+            'max_drawdown': round(float(np.median(outcome['max_drawdown'])) * 100, 2),
+            'max_drawdown_p95': round(float(np.percentile(outcome['max_drawdown'], 95)) * 100, 2),
+            'var_95': round(float(-np.percentile(returns, 5)) * 100, 2),
+            'risk_of_ruin': round(float(np.mean(outcome['ruined'])), 4),
+            'simulated': True,
+            'drift_removed': demeaned,
+            'periods_per_year': round(float(periods_per_year), 1),
+            'paths': outcome['paths'],
+            'horizon': outcome['horizon']
         }
 
 class PricePredictor:
+    def __init__(self, regime_engine=None):
+        self.regime_engine = regime_engine
+    
     def predict(self, data):
         market_data = data.get('market_data', [])
         prediction_horizon = data.get('horizon', 24)  # hours
@@ -568,12 +941,13 @@ class PricePredictor:
         if not market_data:
             return {'error': 'No market data provided for prediction'}
         
-        df = pd.DataFrame(market_data)
+        df = load_pandas().DataFrame(market_data)
+        regime = self.regime_engine.current(data.get('symbol')) if self.regime_engine else None
         
         prediction = {
             'price_forecast': self.forecast_price(df, prediction_horizon),
             'direction_probability': self.predict_direction(df),
-            'volatility_forecast': self.forecast_volatility(df),
+            'volatility_forecast': self.forecast_volatility(df, regime),
             'confidence_intervals': self.calculate_confidence_intervals(df),
             'model_accuracy': 0.73,
             'confidence': 0.68,
@@ -628,24 +1002,33 @@ class PricePredictor:
             'momentum_score': round(momentum_score, 3)
         }
     
-    def forecast_volatility(self, df):
+    def forecast_volatility(self, df, regime=None):
         if 'price' not in df.columns or len(df) < 10:
             return {'forecast': 15.0, 'current': 15.0}
         
         prices = df['price'].values
         returns = np.diff(prices) / prices[:-1]
         
-        current_vol = np.std(returns) * np.sqrt(252) * 100
+        # Annualised by the bars' own spacing, like the regime's level
+        stamps = MarketHistory.parse_timestamps(df['timestamp'].tolist()) if 'timestamp' in df.columns else None
+        periods_per_year = bars_per_year(stamps) if stamps is not None else None
+        periods_per_year = periods_per_year or (regime['periods_per_year'] if regime else 252)
+        current_vol = np.std(returns) * np.sqrt(periods_per_year) * 100
         
-        # Simple volatility forecast (mean reversion)
-        long_term_vol = 20.0  # Assumed long-term volatility
+        # Simple volatility forecast (mean reversion), towards the level
+        # implied by the current regime when one is known
+        long_term_vol = regime['expected_volatility'] if regime else 20.0
         forecast_vol = current_vol * 0.7 + long_term_vol * 0.3
         
-        return {
+        forecast = {
             'current': round(current_vol, 2),
             'forecast': round(forecast_vol, 2),
             'regime': 'high' if forecast_vol > 25 else 'medium' if forecast_vol > 15 else 'low'
         }
+        if regime is not None:
+            forecast['market_regime'] = regime['label']
+        
+        return forecast
     
     def calculate_confidence_intervals(self, df):
         if 'price' not in df.columns or len(df) < 5:
@@ -679,13 +1062,16 @@ class PricePredictor:
         }
 
 class PatternDetector:
+    def __init__(self):
+        self.scanner = ChartPatternScanner()
+    
     def detect(self, data):
         market_data = data.get('market_data', [])
         
         if not market_data:
             return {'error': 'No market data provided for pattern detection'}
         
-        df = pd.DataFrame(market_data)
+        df = load_pandas().DataFrame(market_data)
         
         detection = {
             'chart_patterns': self.detect_chart_patterns(df),
@@ -700,66 +1086,55 @@ class PatternDetector:
         return detection
     
     def detect_chart_patterns(self, df):
-        patterns = []
-        
         if 'price' not in df.columns or len(df) < 20:
-            return patterns
+            return []
         
+        # Only windows ending at the latest bar; pattern_scan covers history
         prices = df['price'].values
-        
-        # Simple pattern detection
-        if len(prices) >= 20:
-            # Head and shoulders pattern (simplified)
-            if self.is_head_and_shoulders(prices[-20:]):
-                patterns.append({
-                    'pattern': 'Head and Shoulders',
-                    'type': 'reversal',
-                    'confidence': 0.75,
-                    'direction': 'bearish'
-                })
-            
-            # Double top/bottom (simplified)
-            if self.is_double_top(prices[-15:]):
-                patterns.append({
-                    'pattern': 'Double Top',
-                    'type': 'reversal',
-                    'confidence': 0.68,
-                    'direction': 'bearish'
-                })
-        
-        return patterns
-    
-    def is_head_and_shoulders(self, prices):
-        # Simplified head and shoulders detection
-        if len(prices) < 15:
-            return False
-        
-        # Find local maxima
-        peaks = []
-        for i in range(2, len(prices) - 2):
-            if prices[i] > prices[i-1] and prices[i] > prices[i+1]:
-                peaks.append((i, prices[i]))
-        
-        if len(peaks) >= 3:
-            # Check if middle peak is highest
-            peaks.sort(key=lambda x: x[1], reverse=True)
-            if peaks[0][0] > peaks[1][0] and peaks[0][0] > peaks[2][0]:
-                return True
-        
-        return False
+        matches, _ = self.scanner.scan(prices, min_end=len(prices) - 1)
+        return matches
     
-    def is_double_top(self, prices):
-        # Simplified double top detection
-        if len(prices) < 10:
-            return False
+    def scan(self, data, history):
+        """Scan a full history for chart patterns at several window scales.
+        
+        With a symbol the bars come from MarketHistory and match indices are
+        absolute bar numbers; incremental scans only evaluate windows ending
+        at bars recorded since the previous scan of that symbol.
+        """
+        symbol = data.get('symbol')
+        window_sizes = data.get('window_sizes') or self.scanner.DEFAULT_WINDOWS
+        patterns = data.get('patterns')
+        window = history.get(symbol) if symbol else None
+        
+        if window is not None:
+            prices = window['price']
+            total = history.totals.get(symbol, len(prices))
+            offset = total - len(prices)
+            min_end = 0
+            cursor = self.scanner.cursors.get(symbol)
+            if data.get('incremental') and cursor is not None and cursor <= total:
+                # Extrema within EXTREMA_ORDER bars of the old tail were not
+                # decidable then, so windows ending there are re-evaluated.
+                min_end = max(0, cursor - offset - self.scanner.EXTREMA_ORDER)
+            self.scanner.cursors[symbol] = total
+        else:
+            market_data = data.get('market_data', [])
+            if not market_data:
+                return {'error': 'No market data provided for pattern scan'}
+            prices = np.asarray(market_data.get('price', np.full(market_data.rows, np.nan)), dtype=np.float64)
+            offset = 0
+            min_end = int(data.get('from_index', 0))
         
-        max_price = max(prices)
-        max_indices = [i for i, p in enumerate(prices) if p >= max_price * 0.98]
+        matches, windows_evaluated = self.scanner.scan(prices, window_sizes, min_end, patterns, offset)
         
-        if len(max_indices) >= 2 and max_indices[-1] - max_indices[0] > 5:
-            return True
-        
-        return False
+        return {
+            'matches': matches,
+            'bars': len(prices),
+            'windows_evaluated': windows_evaluated,
+            'window_sizes': list(window_sizes),
+            'scan_from_index': offset + min_end,
+            'timestamp': datetime.now().isoformat()
+        }
     
     def detect_candlestick_patterns(self, df):
         patterns = []
@@ -911,45 +1286,2669 @@ class PatternDetector:
             'strength': min(abs(vol_change), 100)
         }
 
+class ChartPatternScanner:
+    """Vectorized multi-scale chart pattern scan over a price history.
+    
+    Local extrema are computed once for the whole series and shared by every
+    window; windows of each size are evaluated as 2-D sliding_window_view
+    batches. Thresholds are relative to each window's price range so the
+    same rules apply to tick, minute and daily bars.
+    """
+    
+    STATE_VERSION = 1
+    DEFAULT_WINDOWS = (20, 40, 80)
+    EXTREMA_ORDER = 2
+    
+    # id -> (label, type, direction, base confidence)
+    PATTERNS = {
+        'head_and_shoulders': ('Head and Shoulders', 'reversal', 'bearish', 0.75),
+        'inverse_head_and_shoulders': ('Inverse Head and Shoulders', 'reversal', 'bullish', 0.75),
+        'double_top': ('Double Top', 'reversal', 'bearish', 0.68),
+        'double_bottom': ('Double Bottom', 'reversal', 'bullish', 0.68),
+        'ascending_triangle': ('Ascending Triangle', 'continuation', 'bullish', 0.64),
+        'descending_triangle': ('Descending Triangle', 'continuation', 'bearish', 0.64),
+        'symmetrical_triangle': ('Symmetrical Triangle', 'continuation', 'neutral', 0.6),
+        'bull_flag': ('Bull Flag', 'continuation', 'bullish', 0.66),
+        'bear_flag': ('Bear Flag', 'continuation', 'bearish', 0.66)
+    }
+    
+    def __init__(self, batch_size=4096):
+        self.batch_size = batch_size
+        self.cursors = {}
+    
+    def get_state(self):
+        return {}, {'cursors': self.cursors}
+    
+    def set_state(self, arrays, meta):
+        self.cursors = {symbol: int(cursor) for symbol, cursor in meta.get('cursors', {}).items()}
+    
+    def find_extrema(self, prices):
+        order = self.EXTREMA_ORDER
+        peaks = np.zeros(len(prices), dtype=bool)
+        troughs = np.zeros(len(prices), dtype=bool)
+        if len(prices) < 2 * order + 1:
+            return peaks, troughs
+        
+        neighbourhoods = sliding_window_view(prices, 2 * order + 1)
+        centre = neighbourhoods[:, order]
+        others = np.delete(neighbourhoods, order, axis=1)
+        peaks[order:len(prices) - order] = centre > others.max(axis=1)
+        troughs[order:len(prices) - order] = centre < others.min(axis=1)
+        return peaks, troughs
+    
+    def scan(self, prices, window_sizes=None, min_end=0, patterns=None, offset=0):
+        """Return (matches, windows_evaluated) for windows ending at or after min_end."""
+        prices = np.asarray(prices, dtype=np.float64)
+        window_sizes = window_sizes or self.DEFAULT_WINDOWS
+        wanted = set(patterns or self.PATTERNS)
+        peaks, troughs = self.find_extrema(prices)
+        
+        returns = np.diff(prices) / prices[:-1] if len(prices) > 1 else np.zeros(1)
+        sigma = float(np.nanstd(returns)) if len(returns) else 0.0
+        
+        detectors = [
+            (('head_and_shoulders', 'inverse_head_and_shoulders'), self.head_and_shoulders),
+            (('double_top', 'double_bottom'), self.double_top),
+            (('ascending_triangle', 'descending_triangle', 'symmetrical_triangle'), self.triangles),
+            (('bull_flag', 'bear_flag'), lambda W, P, T: self.flags(W, sigma))
+        ]
+        
+        # Raw hits stay as arrays per pattern until overlaps are suppressed
+        candidates = {}
+        windows_evaluated = 0
+        for size in window_sizes:
+            size = int(size)
+            if size < 10 or len(prices) < size:
+                continue
+            
+            price_windows = sliding_window_view(prices, size)
+            peak_windows = sliding_window_view(peaks, size)
+            trough_windows = sliding_window_view(troughs, size)
+            
+            first = max(0, int(min_end) - size + 1)
+            for lo in range(first, len(price_windows), self.batch_size):
+                hi = min(lo + self.batch_size, len(price_windows))
+                W, P, T = price_windows[lo:hi], peak_windows[lo:hi], trough_windows[lo:hi]
+                windows_evaluated += hi - lo
+                
+                for names, detector in detectors:
+                    if wanted.isdisjoint(names):
+                        continue
+                    for name, (hits, key_points, confirmed) in detector(W, P, T).items():
+                        rows = np.flatnonzero(hits)
+                        if name not in wanted or len(rows) == 0:
+                            continue
+                        starts = lo + rows
+                        candidates.setdefault(name, []).append((
+                            starts,
+                            np.full(len(rows), size),
+                            starts[:, None] + key_points[rows],
+                            confirmed[rows]
+                        ))
+        
+        matches = []
+        for name, parts in candidates.items():
+            starts, sizes, key_points, confirmed = (np.concatenate(column) for column in zip(*parts))
+            for i in self.suppress_overlaps(starts, sizes, key_points, confirmed):
+                matches.append(self.make_match(
+                    name, starts[i], sizes[i], key_points[i], prices, bool(confirmed[i]), offset
+                ))
+        
+        matches.sort(key=lambda m: (m['end_index'], m['pattern_id']))
+        return matches, windows_evaluated
+    
+    def make_match(self, name, start, size, key_points, prices, confirmed, offset):
+        label, pattern_type, direction, confidence = self.PATTERNS[name]
+        return {
+            'pattern': label,
+            'pattern_id': name,
+            'type': pattern_type,
+            'direction': direction,
+            'confidence': round(min(confidence + (0.1 if confirmed else 0), 0.95), 2),
+            'confirmed': confirmed,
+            'window': int(size),
+            'start_index': int(offset + start),
+            'end_index': int(offset + start + size - 1),
+            'key_points': [int(offset + i) for i in key_points],
+            'key_prices': [round(float(prices[i]), 4) for i in key_points]
+        }
+    
+    def suppress_overlaps(self, starts, sizes, key_points, confirmed):
+        """Indices of the hits to keep for one pattern.
+        
+        The same formation is seen by many overlapping windows and scales.
+        Hits sharing key points collapse to one; then confirmed, smaller
+        windows win and any hit overlapping a kept one by more than half the
+        shorter window is dropped.
+        """
+        _, unique = np.unique(key_points, axis=0, return_index=True)
+        order = unique[np.lexsort((starts[unique], sizes[unique], ~confirmed[unique]))]
+        
+        longest = int(sizes.max())
+        kept_starts = []
+        kept = []
+        for i in order:
+            start, end = starts[i], starts[i] + sizes[i] - 1
+            # Only kept hits starting within one window length can overlap
+            lo = bisect.bisect_left(kept_starts, (start - longest, -1))
+            hi = bisect.bisect_right(kept_starts, (end, len(starts)))
+            overlaps = False
+            for other_start, j in kept_starts[lo:hi]:
+                shared = min(end, other_start + sizes[j] - 1) - max(start, other_start) + 1
+                if shared > 0.5 * min(sizes[i], sizes[j]):
+                    overlaps = True
+                    break
+            if not overlaps:
+                bisect.insort(kept_starts, (start, i))
+                kept.append(i)
+        
+        return kept
+    
+    def masked_extreme(self, W, lo, hi, take_min=True):
+        # Min (or max) of each row strictly between columns lo and hi
+        cols = np.arange(W.shape[1])
+        inside = (cols > lo[:, None]) & (cols < hi[:, None])
+        fill = np.inf if take_min else -np.inf
+        masked = np.where(inside, W, fill)
+        idx = masked.argmin(axis=1) if take_min else masked.argmax(axis=1)
+        values = masked[np.arange(len(W)), idx]
+        return values, idx
+    
+    def double_top(self, W, P, T):
+        top = self.double_top_rows(W, P)
+        bottom = self.double_top_rows(-W, T)
+        return {'double_top': top, 'double_bottom': bottom}
+    
+    def double_top_rows(self, W, P):
+        rows = np.arange(len(W))
+        size = W.shape[1]
+        price_range = W.max(axis=1) - W.min(axis=1)
+        
+        peak_values = np.where(P, W, -np.inf)
+        top_two = np.argpartition(peak_values, size - 2, axis=1)[:, -2:]
+        first, second = top_two.min(axis=1), top_two.max(axis=1)
+        h1, h2 = peak_values[rows, first], peak_values[rows, second]
+        neckline, neck_idx = self.masked_extreme(W, first, second)
+        
+        with np.errstate(invalid='ignore'):
+            hits = (
+                np.isfinite(h1) & np.isfinite(h2) & (price_range > 0)
+                & (second - first >= size // 4)
+                & (np.abs(h1 - h2) <= 0.1 * price_range)
+                & (np.minimum(h1, h2) - neckline >= 0.3 * price_range)
+                & (np.maximum(h1, h2) >= W.max(axis=1) - 0.05 * price_range)
+                & (W[:, 0] < neckline)
+            )
+        confirmed = W[:, -1] < neckline
+        return hits, np.stack([first, neck_idx, second], axis=1), confirmed
+    
+    def head_and_shoulders(self, W, P, T):
+        regular = self.head_and_shoulders_rows(W, P)
+        inverse = self.head_and_shoulders_rows(-W, T)
+        return {'head_and_shoulders': regular, 'inverse_head_and_shoulders': inverse}
+    
+    def head_and_shoulders_rows(self, W, P):
+        rows = np.arange(len(W))
+        cols = np.arange(W.shape[1])
+        size = W.shape[1]
+        price_range = W.max(axis=1) - W.min(axis=1)
+        
+        peak_values = np.where(P, W, -np.inf)
+        head = peak_values.argmax(axis=1)
+        left = np.where(cols < head[:, None], peak_values, -np.inf).argmax(axis=1)
+        right = np.where(cols > head[:, None], peak_values, -np.inf).argmax(axis=1)
+        h_head, h_left, h_right = (peak_values[rows, i] for i in (head, left, right))
+        left_neck, left_neck_idx = self.masked_extreme(W, left, head)
+        right_neck, right_neck_idx = self.masked_extreme(W, head, right)
+        neckline = np.maximum(left_neck, right_neck)
+        
+        with np.errstate(invalid='ignore'):
+            hits = (
+                np.isfinite(h_head) & np.isfinite(h_left) & np.isfinite(h_right)
+                & (left < head) & (right > head) & (price_range > 0)
+                & (head - left >= max(size // 8, 2)) & (right - head >= max(size // 8, 2))
+                & (h_head - np.maximum(h_left, h_right) >= 0.15 * price_range)
+                & (np.abs(h_left - h_right) <= 0.15 * price_range)
+                & (np.minimum(h_left, h_right) - neckline >= 0.15 * price_range)
+                & (W[:, 0] < neckline)
+            )
+        confirmed = W[:, -1] < np.minimum(left_neck, right_neck)
+        key_points = np.stack([left, left_neck_idx, head, right_neck_idx, right], axis=1)
+        return hits, key_points, confirmed
+    
+    def fit_lines(self, W, mask):
+        # Least-squares line through the masked points of every row at once
+        x = np.arange(W.shape[1], dtype=np.float64)
+        n = mask.sum(axis=1).astype(np.float64)
+        sx = (mask * x).sum(axis=1)
+        sxx = (mask * x * x).sum(axis=1)
+        sy = np.where(mask, W, 0).sum(axis=1)
+        sxy = np.where(mask, W * x, 0).sum(axis=1)
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            denominator = n * sxx - sx * sx
+            slope = np.where(denominator > 0, (n * sxy - sx * sy) / denominator, np.nan)
+            intercept = (sy - slope * sx) / n
+        return slope, intercept, n
+    
+    def triangles(self, W, P, T):
+        size = W.shape[1]
+        price_range = W.max(axis=1) - W.min(axis=1)
+        upper_slope, upper_icpt, upper_n = self.fit_lines(W, P)
+        lower_slope, lower_icpt, lower_n = self.fit_lines(W, T)
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # Line moves over the whole window, in units of the window's range
+            upper_move = upper_slope * (size - 1) / price_range
+            lower_move = lower_slope * (size - 1) / price_range
+            gap_start = upper_icpt - lower_icpt
+            gap_end = gap_start + (upper_slope - lower_slope) * (size - 1)
+            
+            shaped = ((upper_n >= 2) & (lower_n >= 2) & (upper_n + lower_n >= 5)
+                      & (price_range > 0) & (gap_end > 0) & (gap_end < 0.6 * gap_start))
+            upper_flat, lower_flat = np.abs(upper_move) < 0.1, np.abs(lower_move) < 0.1
+            rising, falling = lower_move >= 0.1, upper_move <= -0.1
+        
+        touches = P | T
+        first_touch = touches.argmax(axis=1)
+        last_touch = size - 1 - touches[:, ::-1].argmax(axis=1)
+        key_points = np.stack([first_touch, last_touch], axis=1)
+        
+        # A close outside the converging lines confirms the breakout
+        upper_end = upper_icpt + upper_slope * (size - 1)
+        lower_end = lower_icpt + lower_slope * (size - 1)
+        with np.errstate(invalid='ignore'):
+            broke_up, broke_down = W[:, -1] > upper_end, W[:, -1] < lower_end
+        
+        return {
+            'ascending_triangle': (shaped & upper_flat & rising, key_points, broke_up),
+            'descending_triangle': (shaped & falling & lower_flat, key_points, broke_down),
+            'symmetrical_triangle': (shaped & falling & rising, key_points, broke_up | broke_down)
+        }
+    
+    def flags(self, W, sigma):
+        size = W.shape[1]
+        pole_end = size // 3
+        threshold = 3 * sigma * np.sqrt(pole_end)
+        consolidation = W[:, pole_end:]
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            pole_move = W[:, pole_end] - W[:, 0]
+            pole_return = pole_move / W[:, 0]
+            cons_range = consolidation.max(axis=1) - consolidation.min(axis=1)
+            tight = cons_range < 0.5 * np.abs(pole_move)
+            
+            bull = ((pole_return > threshold) & tight
+                    & (consolidation.max(axis=1) <= W[:, pole_end] + 0.1 * pole_move)
+                    & (consolidation[:, -1] <= consolidation[:, 0]))
+            bear = ((pole_return < -threshold) & tight
+                    & (consolidation.min(axis=1) >= W[:, pole_end] + 0.1 * pole_move)
+                    & (consolidation[:, -1] >= consolidation[:, 0]))
+        
+        key_points = np.tile([0, pole_end, size - 1], (len(W), 1))
+        unconfirmed = np.zeros(len(W), dtype=bool)
+        return {
+            'bull_flag': (bull, key_points, unconfirmed),
+            'bear_flag': (bear, key_points, unconfirmed)
+        }
+
+class LiquidityEngine:
+    """Rolling per-symbol liquidity statistics from tick/bar rows.
+    
+    Each symbol keeps a fixed-size ring of per-row metrics with running sums,
+    so appending rows costs O(rows) regardless of the window length. Rows
+    (MarketColumns) may carry price, volume, bid/ask (or spread) and
+    bidSize/askSize (or bidVolume/askVolume) for depth; absent fields are
+    skipped.
+    """
+    
+    STATE_VERSION = 1
+    METRICS = ('spread_bps', 'depth', 'abs_return', 'dollar_volume', 'volume', 'return', 'return_sq')
+    
+    def __init__(self, window=500, participation_rate=0.1, impact_coefficient=1.0):
+        self.window = window
+        self.participation_rate = participation_rate
+        self.impact_coefficient = impact_coefficient
+        self.symbols = {}
+    
+    def get_state(self):
+        names = sorted(self.symbols)
+        arrays = {f'{i}__buffer': self.symbols[name]['buffer'] for i, name in enumerate(names)}
+        meta = {
+            name: {key: self.symbols[name][key] for key in ('head', 'inserted', 'last_price')}
+            for name in names
+        }
+        return arrays, {'symbols': names, 'rings': meta}
+    
+    def set_state(self, arrays, meta):
+        symbols = {}
+        for i, name in enumerate(meta['symbols']):
+            buffer = arrays[f'{i}__buffer']
+            if buffer.shape != (self.window, len(self.METRICS)):
+                raise ValueError(f'Liquidity window for {name} does not match configuration')
+            ring = dict(meta['rings'][name], buffer=buffer)
+            self.resum(ring)
+            symbols[name] = ring
+        self.symbols = symbols
+    
+    def new_ring(self):
+        return {
+            'buffer': np.full((self.window, len(self.METRICS)), np.nan),
+            'sums': np.zeros(len(self.METRICS)),
+            'counts': np.zeros(len(self.METRICS)),
+            'head': 0,
+            'inserted': 0,
+            'last_price': None
+        }
+    
+    def resum(self, ring):
+        ring['sums'] = np.nansum(ring['buffer'], axis=0)
+        ring['counts'] = np.count_nonzero(~np.isnan(ring['buffer']), axis=0).astype(np.float64)
+    
+    def column(self, columns, *names):
+        """First non-NaN value per row across the named fields."""
+        values = np.full(columns.rows, np.nan)
+        for name in names:
+            if name in columns:
+                values = np.where(np.isnan(values), columns[name], values)
+        return values
+    
+    def row_metrics(self, columns, last_price):
+        def column(*names):
+            return self.column(columns, *names)
+        
+        price = column('price', 'close')
+        bid, ask = column('bid'), column('ask')
+        quoted = np.isfinite(bid) & np.isfinite(ask)
+        mid = np.where(quoted, (bid + ask) / 2, price)
+        spread = np.where(quoted, ask - bid, column('spread'))
+        depth = column('bidSize', 'bidVolume') + column('askSize', 'askVolume')
+        volume = column('volume')
+        
+        previous = np.concatenate([[last_price if last_price else np.nan], price[:-1]])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns = np.log(price / previous)
+        
+        return np.column_stack([
+            spread / mid * 1e4,
+            depth,
+            np.abs(returns),
+            price * volume,
+            volume,
+            returns,
+            returns ** 2
+        ])
+    
+    def ingest(self, symbol, columns, reset=False):
+        ring = self.symbols.get(symbol)
+        if ring is None or reset:
+            ring = self.symbols[symbol] = self.new_ring()
+        if not columns.rows:
+            return ring
+        
+        metrics = self.row_metrics(columns, ring['last_price'])[-self.window:]
+        slots = (ring['head'] + np.arange(len(metrics))) % self.window
+        evicted = ring['buffer'][slots]
+        
+        ring['sums'] += np.nansum(metrics, axis=0) - np.nansum(evicted, axis=0)
+        ring['counts'] += (np.count_nonzero(~np.isnan(metrics), axis=0)
+                           - np.count_nonzero(~np.isnan(evicted), axis=0))
+        ring['buffer'][slots] = metrics
+        ring['head'] = int((ring['head'] + len(metrics)) % self.window)
+        ring['inserted'] += len(metrics)
+        
+        prices = self.column(columns, 'price', 'close')
+        quoted_prices = prices[np.isfinite(prices) & (prices != 0)]
+        if len(quoted_prices):
+            ring['last_price'] = float(quoted_prices[-1])
+        
+        # Running sums drift with floating-point error; rebuild once per lap
+        if ring['inserted'] >= self.window:
+            ring['inserted'] = 0
+            self.resum(ring)
+        return ring
+    
+    def stats(self, symbol):
+        ring = self.symbols.get(symbol)
+        if ring is None or not ring['counts'][self.METRICS.index('return')]:
+            return None
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = ring['sums'] / ring['counts']
+        index = {name: i for i, name in enumerate(self.METRICS)}
+        variance = max(means[index['return_sq']] - means[index['return']] ** 2, 0.0)
+        dollar_volume = ring['sums'][index['dollar_volume']]
+        
+        return {
+            'bars': int(ring['counts'][index['return']]),
+            'spread_bps': means[index['spread_bps']],
+            'depth': means[index['depth']],
+            'average_volume': means[index['volume']],
+            'window_volume': ring['sums'][index['volume']],
+            # Amihud illiquidity: |return| per $1M traded
+            'amihud': ring['sums'][index['abs_return']] / dollar_volume * 1e6 if dollar_volume > 0 else np.nan,
+            'bar_volatility': np.sqrt(variance),
+            'last_price': ring['last_price']
+        }
+    
+    def liquidation_costs(self, positions):
+        """Estimated cost of exiting every position, computed in one pass.
+        
+        Cost is half the average spread plus square-root impact,
+        Y * sigma * sqrt(Q / V), with sigma and V measured over the rolling
+        window. Positions whose symbol has no data are marked unmeasured.
+        """
+        if not positions:
+            return None
+        
+        fields = ('spread_bps', 'average_volume', 'window_volume', 'bar_volatility', 'last_price', 'bars')
+        table = np.full((len(positions), len(fields)), np.nan)
+        for i, position in enumerate(positions):
+            stats = self.stats(position.get('symbol'))
+            if stats is not None:
+                table[i] = [stats[field] if stats[field] is not None else np.nan for field in fields]
+        spread_bps, average_volume, window_volume, bar_volatility, last_price, bars = table.T
+        
+        notional = np.abs(np.array([pos.get('notionalValue', 0) or 0 for pos in positions], dtype=np.float64))
+        size = np.abs(np.array([pos.get('size', pos.get('quantity')) for pos in positions], dtype=np.float64))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            quantity = np.where(np.isfinite(size), size, notional / last_price)
+            # Positions sent as size alone are valued at the last traded price
+            notional = np.where(notional > 0, notional, quantity * last_price)
+            window_volatility = bar_volatility * np.sqrt(bars)
+            impact = self.impact_coefficient * window_volatility * np.sqrt(quantity / window_volume)
+            spread_cost = np.nan_to_num(spread_bps) / 2 / 1e4
+            cost_fraction = spread_cost + impact
+            participation = quantity / average_volume
+            bars_to_exit = quantity / (self.participation_rate * average_volume)
+        
+        measured = np.isfinite(cost_fraction) & (window_volume > 0)
+        return {
+            'measured': measured,
+            'cost': np.where(measured, notional * cost_fraction, np.nan),
+            'cost_bps': cost_fraction * 1e4,
+            'spread_bps': spread_bps,
+            'impact_bps': impact * 1e4,
+            'participation': participation,
+            'bars_to_exit': bars_to_exit
+        }
+    
+    def analyze(self, data):
+        symbols = data.get('symbols') or ([data['symbol']] if data.get('symbol') else sorted(self.symbols))
+        stats = {symbol: self.stats(symbol) for symbol in symbols}
+        
+        analysis = {
+            'symbols': {
+                symbol: {key: round_finite(value, 6) if isinstance(value, (float, np.floating)) else value
+                         for key, value in values.items()} if values else None
+                for symbol, values in stats.items()
+            },
+            'timestamp': datetime.now().isoformat()
+        }
+        
+        positions = data.get('positions', [])
+        if positions:
+            costs = self.liquidation_costs(positions)
+            analysis['liquidation'] = [
+                {
+                    'symbol': position.get('symbol'),
+                    'measured': bool(costs['measured'][i]),
+                    'estimated_cost': round_finite(costs['cost'][i], 2) if costs['measured'][i] else None,
+                    'cost_bps': round_finite(costs['cost_bps'][i], 2) if costs['measured'][i] else None,
+                    'bars_to_exit': round_finite(costs['bars_to_exit'][i], 1) if costs['measured'][i] else None
+                }
+                for i, position in enumerate(positions)
+            ]
+            analysis['total_liquidation_cost'] = round(float(np.nansum(costs['cost'])), 2)
+        
+        return analysis
+
+class RegimeEngine:
+    """Gaussian hidden Markov model of market regimes per symbol.
+    
+    Observations are (log return, log EWMA volatility) pairs. Parameters are
+    fitted with Baum-Welch over a symbol's MarketHistory and cached; after
+    that each new bar costs one O(k^2) forward-filter step, so analyzers can
+    condition on the live regime without refitting.
+    """
+    
+    STATE_VERSION = 1
+    PARAMETERS = ('means', 'variances', 'transition', 'start', 'alpha')
+    
+    def __init__(self, history, n_states=3, ewma_lambda=0.94, min_fit_bars=200,
+                 max_fit_bars=2000, max_iter=50, tol=1e-4):
+        self.history = history
+        self.n_states = n_states
+        self.ewma_lambda = ewma_lambda
+        self.min_fit_bars = min_fit_bars
+        self.max_fit_bars = max_fit_bars
+        self.max_iter = max_iter
+        self.tol = tol
+        self.models = {}
+    
+    def get_state(self):
+        symbols = sorted(self.models)
+        arrays = {}
+        models = {}
+        for i, symbol in enumerate(symbols):
+            model = self.models[symbol]
+            for name in self.PARAMETERS:
+                arrays[f'{i}__{name}'] = model[name]
+            models[symbol] = {key: value for key, value in model.items() if key not in self.PARAMETERS}
+        return arrays, {'symbols': symbols, 'models': models}
+    
+    def set_state(self, arrays, meta):
+        models = {}
+        for i, symbol in enumerate(meta['symbols']):
+            model = dict(meta['models'][symbol])
+            for name in self.PARAMETERS:
+                model[name] = arrays[f'{i}__{name}']
+            k = len(model['start'])
+            if model['transition'].shape != (k, k) or model['means'].shape != (k, 2):
+                raise ValueError(f'Inconsistent regime model for {symbol}')
+            models[symbol] = model
+        self.models = models
+    
+    def features(self, prices, prev_price=None, prev_variance=None):
+        """Return (observations, last EWMA variance) for consecutive prices."""
+        prices = np.asarray(prices, dtype=np.float64)
+        if prev_price is not None:
+            prices = np.concatenate([[prev_price], prices])
+        returns = np.diff(np.log(prices))
+        if len(returns) == 0:
+            return np.empty((0, 2)), prev_variance
+        
+        if prev_variance is None:
+            prev_variance = float(np.var(returns[:20])) or 1e-8
+        # EWMA variance seeded from the previous state, vectorized via pandas
+        squared = np.concatenate([[prev_variance], returns ** 2])
+        variance = load_pandas().Series(squared).ewm(alpha=1 - self.ewma_lambda, adjust=False).mean().values[1:]
+        
+        observations = np.column_stack([returns, 0.5 * np.log(np.maximum(variance, 1e-16))])
+        return observations, float(variance[-1])
+    
+    def log_emissions(self, X, means, variances):
+        diff = X[:, None, :] - means[None, :, :]
+        return -0.5 * (np.sum(diff * diff / variances[None, :, :], axis=2)
+                       + np.sum(np.log(2 * np.pi * variances), axis=1)[None, :])
+    
+    def forward(self, B, transition, alpha=None, start=None):
+        """Scaled forward recursion over emission likelihood rows B.
+        
+        Continues from a filtered distribution alpha, or starts from the
+        initial distribution start when alpha is None.
+        """
+        alphas = np.empty_like(B)
+        scales = np.empty(len(B))
+        for t in range(len(B)):
+            prior = start if alpha is None else alpha @ transition
+            step = prior * B[t]
+            scales[t] = step.sum() or 1e-300
+            alpha = step / scales[t]
+            alphas[t] = alpha
+        return alphas, scales
+    
+    def baum_welch(self, X, k):
+        T = len(X)
+        
+        # Initialize states from volatility quantiles
+        order = np.argsort(X[:, 1], kind='stable')
+        groups = np.array_split(order, k)
+        means = np.array([X[g].mean(axis=0) for g in groups])
+        floor = 1e-3 * X.var(axis=0) + 1e-12
+        variances = np.array([X[g].var(axis=0) for g in groups]) + floor
+        transition = np.full((k, k), 0.1 / (k - 1)) + np.eye(k) * (0.9 - 0.1 / (k - 1))
+        start = np.full(k, 1.0 / k)
+        
+        log_likelihood = -np.inf
+        for iteration in range(1, self.max_iter + 1):
+            log_b = self.log_emissions(X, means, variances)
+            offsets = log_b.max(axis=1, keepdims=True)
+            B = np.exp(log_b - offsets)
+            
+            alphas, scales = self.forward(B, transition, start=start)
+            betas = np.empty_like(B)
+            betas[-1] = 1.0
+            for t in range(T - 2, -1, -1):
+                betas[t] = transition @ (B[t + 1] * betas[t + 1]) / scales[t + 1]
+            
+            gamma = alphas * betas
+            gamma /= gamma.sum(axis=1, keepdims=True)
+            xi = transition * np.einsum('ti,tj->ij', alphas[:-1], B[1:] * betas[1:] / scales[1:, None])
+            
+            start = gamma[0]
+            transition = xi / xi.sum(axis=1, keepdims=True)
+            weights = gamma.sum(axis=0)[:, None]
+            means = gamma.T @ X / weights
+            variances = np.maximum(gamma.T @ (X * X) / weights - means ** 2, floor)
+            
+            previous = log_likelihood
+            log_likelihood = float(np.sum(np.log(scales)) + np.sum(offsets))
+            if abs(log_likelihood - previous) < self.tol * abs(log_likelihood):
+                break
+        
+        return means, variances, transition, start, log_likelihood, iteration
+    
+    def label_states(self, means, variances):
+        k = len(means)
+        labels = ['ranging'] * k
+        by_volatility = np.argsort(means[:, 1])
+        labels[by_volatility[-1]] = 'volatile'
+        calmer = by_volatility[:-1]
+        if len(calmer):
+            drift = np.abs(means[calmer, 0]) / np.sqrt(variances[calmer, 0])
+            labels[calmer[np.argmax(drift)]] = 'trending' if len(calmer) > 1 else 'ranging'
+        return labels
+    
+    def fit(self, symbol, n_states=None):
+        """Fit a symbol's model; refits keep its state count unless one is given."""
+        window = self.history.get(symbol)
+        if window is None:
+            return None
+        if n_states is None:
+            model = self.models.get(symbol)
+            n_states = len(model['start']) if model is not None else self.n_states
+        prices = window['price'][-(self.max_fit_bars + 1):]
+        prices = prices[np.isfinite(prices) & (prices > 0)]
+        if len(prices) < self.min_fit_bars:
+            return None
+        
+        X, variance = self.features(prices)
+        means, variances, transition, start, log_likelihood, iterations = self.baum_welch(X, n_states)
+        
+        B = np.exp(self.log_emissions(X, means, variances))
+        alphas, _ = self.forward(B, transition, start=start)
+        
+        self.models[symbol] = {
+            'means': means,
+            'variances': variances,
+            'transition': transition,
+            'start': start,
+            'alpha': alphas[-1],
+            'labels': self.label_states(means, variances),
+            'last_price': float(prices[-1]),
+            'last_variance': variance,
+            'cursor': self.history.totals.get(symbol, len(window['price'])),
+            'fit_bars': len(X),
+            'iterations': iterations,
+            'log_likelihood': log_likelihood,
+            'fitted_at': datetime.now().isoformat()
+        }
+        return self.models[symbol]
+    
+    def rewind(self, symbol):
+        """Filter a symbol's replaced history from its first bar on the next update."""
+        model = self.models.get(symbol)
+        window = self.history.get(symbol)
+        if model is None or window is None:
+            return
+        model['cursor'] = self.history.totals.get(symbol, len(window['price'])) - len(window['price'])
+        model['alpha'] = model['start']
+        model['last_price'] = model['last_variance'] = None
+    
+    def update(self, symbol):
+        """Forward-filter bars recorded since the last update."""
+        model = self.models.get(symbol)
+        window = self.history.get(symbol)
+        if model is None or window is None:
+            return model
+        
+        total = self.history.totals.get(symbol, len(window['price']))
+        new_bars = total - model['cursor']
+        if new_bars <= 0:
+            return model
+        if new_bars > len(window['price']):
+            # History was replaced or trimmed past the cursor
+            return self.fit(symbol)
+        
+        prices = window['price'][-new_bars:]
+        prices = prices[np.isfinite(prices) & (prices > 0)]
+        if len(prices):
+            X, model['last_variance'] = self.features(prices, model['last_price'], model['last_variance'])
+            if len(X):
+                B = np.exp(self.log_emissions(X, model['means'], model['variances']))
+                alphas, _ = self.forward(B, model['transition'], model['alpha'])
+                model['alpha'] = alphas[-1]
+            model['last_price'] = float(prices[-1])
+        model['cursor'] = total
+        return model
+    
+    def current(self, symbol, refit=False, n_states=None):
+        """Summary of the live regime for a symbol, fitting on first use."""
+        if not symbol:
+            return None
+        model = None if refit else self.update(symbol)
+        if model is None:
+            model = self.fit(symbol, n_states)
+        if model is None:
+            return None
+        
+        alpha = model['alpha']
+        labels = model['labels']
+        probabilities = {}
+        for label, probability in zip(labels, alpha):
+            probabilities[label] = probabilities.get(label, 0.0) + float(probability)
+        
+        # Next-bar volatility implied by the one-step-ahead state distribution
+        next_state = alpha @ model['transition']
+        state_volatility = np.exp(model['means'][:, 1])
+        next_volatility = float(next_state @ state_volatility)
+        state = int(np.argmax(alpha))
+        window = self.history.get(symbol)
+        periods_per_year = (bars_per_year(window['timestamp']) if window is not None else None) or 252
+        
+        return {
+            'label': labels[state],
+            'state': state,
+            'probabilities': {label: round(p, 4) for label, p in probabilities.items()},
+            'state_probabilities': np.round(alpha, 4),
+            'next_bar_volatility': next_volatility,
+            'expected_volatility': round(next_volatility * np.sqrt(periods_per_year) * 100, 2),
+            'periods_per_year': round(float(periods_per_year), 1),
+            'direction': 'bullish' if model['means'][state, 0] > 0 else 'bearish',
+            'fitted_at': model['fitted_at']
+        }
+    
+    def describe(self, symbol):
+        model = self.models.get(symbol)
+        if model is None:
+            return None
+        stay = np.clip(np.diag(model['transition']), 0, 1 - 1e-9)
+        return {
+            'labels': model['labels'],
+            'mean_return': model['means'][:, 0],
+            'volatility': np.exp(model['means'][:, 1]),
+            'transition_matrix': np.round(model['transition'], 4),
+            'expected_duration_bars': np.round(1 / (1 - stay), 1),
+            'fit_bars': model['fit_bars'],
+            'iterations': model['iterations'],
+            'log_likelihood': round(model['log_likelihood'], 2)
+        }
+    
+    def analyze(self, data):
+        symbol = data.get('symbol')
+        if not symbol:
+            return {'error': 'Regime analysis requires a symbol'}
+        
+        # A requested state count applies to this symbol's model only
+        n_states = max(2, int(data['n_states'])) if data.get('n_states') else None
+        model = self.models.get(symbol)
+        refit = bool(data.get('refit')) or (
+            n_states is not None and model is not None and len(model['start']) != n_states
+        )
+        
+        regime = self.current(symbol, refit=refit, n_states=n_states)
+        if regime is None:
+            window = self.history.get(symbol)
+            bars = len(window['price']) if window is not None else 0
+            return {'error': f'Need at least {self.min_fit_bars} bars of {symbol} history to fit regimes (have {bars})'}
+        
+        return {
+            'regime': regime,
+            'model': self.describe(symbol),
+            'timestamp': datetime.now().isoformat()
+        }
+
+class EquitySimulator:
+    """Monte Carlo equity paths bootstrapped from a return or P&L series.
+    
+    Paths are resampled IID or in circular blocks (block_size > 1 keeps
+    autocorrelation such as loss streaks), generated in chunks of at most
+    max_cells draws so memory stays bounded for any path count. Per-path
+    drawdown, time under water and ruin are reduced inside each chunk.
+    """
+    
+    PERCENTILES = (5, 25, 50, 75, 95)
+    
+    def __init__(self, n_paths=10000, max_paths=100000, max_cells=2_000_000, ruin_threshold=0.5,
+                 initial_capital=100000.0):
+        self.n_paths = n_paths
+        self.max_paths = max_paths
+        self.max_cells = max_cells
+        self.ruin_threshold = ruin_threshold
+        self.initial_capital = initial_capital
+    
+    def sample_indices(self, rng, n, paths, horizon, block_size):
+        if block_size <= 1:
+            return rng.integers(0, n, size=(paths, horizon))
+        blocks = -(-horizon // block_size)
+        starts = rng.integers(0, n, size=(paths, blocks, 1))
+        return ((starts + np.arange(block_size)) % n).reshape(paths, -1)[:, :horizon]
+    
+    def simulate(self, series, compounding=True, n_paths=None, horizon=None, block_size=1,
+                 seed=None, ruin_threshold=None, initial_capital=None, periods_per_year=252):
+        """Simulate equity paths and return per-path outcome arrays.
+        
+        With compounding, series holds fractional returns per period;
+        otherwise it holds currency P&L per trade added to initial_capital.
+        """
+        series = np.asarray(series, dtype=np.float64)
+        series = series[np.isfinite(series)]
+        if len(series) < 2:
+            return None
+        
+        n_paths = int(min(max(n_paths or self.n_paths, 1), self.max_paths))
+        horizon = int(horizon or len(series))
+        block_size = int(min(max(block_size or 1, 1), len(series)))
+        capital = float(initial_capital or self.initial_capital)
+        ruin_level = 1.0 - (self.ruin_threshold if ruin_threshold is None else ruin_threshold)
+        if compounding:
+            steps = np.log1p(np.maximum(series, -0.999999))
+        else:
+            steps = series / capital
+        
+        rng = np.random.default_rng(seed)
+        chunk = max(1, self.max_cells // horizon)
+        outcome = {name: np.empty(n_paths) for name in
+                   ('final_return', 'max_drawdown', 'longest_underwater', 'underwater_fraction', 'sharpe')}
+        outcome['ruined'] = np.empty(n_paths, dtype=bool)
+        positions = np.arange(1, horizon + 1)
+        
+        for start in range(0, n_paths, chunk):
+            stop = min(start + chunk, n_paths)
+            draws = steps[self.sample_indices(rng, len(steps), stop - start, horizon, block_size)]
+            # Log equity when compounding, equity / capital - 1 otherwise;
+            # both start at 0 so the opening balance counts as a peak
+            levels = np.cumsum(draws, axis=1)
+            peak = np.maximum.accumulate(np.maximum(levels, 0.0), axis=1)
+            gap = peak - levels
+            underwater = gap > 1e-12
+            # Index of the latest bar at a peak; run length is the distance to it
+            last_peak = np.maximum.accumulate(np.where(underwater, 0, positions), axis=1)
+            
+            if compounding:
+                outcome['final_return'][start:stop] = np.expm1(levels[:, -1])
+                outcome['max_drawdown'][start:stop] = -np.expm1(-gap.max(axis=1))
+                outcome['ruined'][start:stop] = levels.min(axis=1) <= np.log(max(ruin_level, 1e-12))
+            else:
+                outcome['final_return'][start:stop] = levels[:, -1]
+                outcome['max_drawdown'][start:stop] = (gap / (1.0 + peak)).max(axis=1)
+                outcome['ruined'][start:stop] = levels.min(axis=1) <= ruin_level - 1.0
+            outcome['longest_underwater'][start:stop] = (positions - last_peak).max(axis=1)
+            outcome['underwater_fraction'][start:stop] = underwater.mean(axis=1)
+            
+            mean = levels[:, -1] / horizon
+            std = np.sqrt(np.maximum(np.einsum('ij,ij->i', draws, draws) / horizon - mean ** 2, 0.0))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                outcome['sharpe'][start:stop] = np.where(std > 0, mean / std * np.sqrt(periods_per_year), 0.0)
+        
+        outcome.update(paths=n_paths, horizon=horizon, block_size=block_size)
+        return outcome
+    
+    def distribution(self, values, scale=1.0, digits=2):
+        return dict(zip((f'p{p}' for p in self.PERCENTILES),
+                        np.round(np.percentile(values, self.PERCENTILES) * scale, digits).tolist()))
+    
+    def summarize(self, outcome):
+        return {
+            'paths': outcome['paths'],
+            'horizon': outcome['horizon'],
+            'block_size': outcome['block_size'],
+            'final_return_pct': self.distribution(outcome['final_return'], 100),
+            'max_drawdown_pct': self.distribution(outcome['max_drawdown'], 100),
+            'longest_underwater_periods': self.distribution(outcome['longest_underwater'], digits=0),
+            'underwater_fraction': self.distribution(outcome['underwater_fraction'], digits=3),
+            'sharpe_ratio': self.distribution(outcome['sharpe'], digits=3),
+            'probability_of_loss': round(float(np.mean(outcome['final_return'] < 0)), 4),
+            'risk_of_ruin': round(float(np.mean(outcome['ruined'])), 4)
+        }
+    
+    def analyze(self, data):
+        """Simulate each strategy's returns (compounded) or pnl (additive)."""
+        strategies = data.get('strategies') or [data]
+        options = {
+            'n_paths': data.get('n_paths'),
+            'horizon': data.get('horizon'),
+            'block_size': data.get('block_size', 1),
+            'ruin_threshold': data.get('ruin_threshold'),
+            'initial_capital': data.get('initial_capital'),
+            'periods_per_year': data.get('periods_per_year', 252)
+        }
+        seed = data.get('seed')
+        
+        results = []
+        for i, strategy in enumerate(strategies):
+            compounding = strategy.get('returns') is not None
+            series = strategy.get('returns') if compounding else strategy.get('pnl', strategy.get('trades'))
+            # Each strategy gets its own stream so adding one does not reshuffle the rest
+            outcome = self.simulate(series if series is not None else [], compounding,
+                                    seed=None if seed is None else [int(seed), i], **options)
+            results.append(dict(
+                {'name': strategy.get('name', f'strategy_{i + 1}'), 'mode': 'returns' if compounding else 'pnl'},
+                **(self.summarize(outcome) if outcome else {'error': 'Need at least 2 observations'})
+            ))
+        
+        return {
+            'simulations': results,
+            'ruin_threshold_pct': round((self.ruin_threshold if options['ruin_threshold'] is None
+                                         else options['ruin_threshold']) * 100, 2),
+            'seed': seed,
+            'timestamp': datetime.now().isoformat()
+        }
+
+class JournalAnalyzer:
+    """Trade journal statistics kept per journal and updated on append.
+    
+    Closed trades are stored as columns ordered by timestamp. Totals,
+    group-by aggregates and the equity curve are cached; appending trades
+    newer than the journal's last trade only reduces the new batch into the
+    cache, while older (backfilled) trades trigger a full rebuild.
+    """
+    
+    STATE_VERSION = 1
+    NUMERIC_FIELDS = ('timestamp', 'pnl', 'r_multiple', 'mae', 'mfe', 'duration')
+    LABEL_FIELDS = ('id', 'setup', 'playbook', 'symbol')
+    GROUPINGS = ('setup', 'playbook', 'symbol', 'hour', 'weekday')
+    STATS = ('trades', 'wins', 'losses', 'pnl', 'gross_win', 'gross_loss', 'r_sum', 'r_count')
+    WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+    R_EDGES = np.arange(-3.0, 5.5, 0.5)
+    
+    def __init__(self, simulator=None):
+        self.simulator = simulator
+        self.journals = {}
+    
+    def get_state(self):
+        names = sorted(self.journals)
+        arrays = {}
+        for i, name in enumerate(names):
+            for field in self.NUMERIC_FIELDS + self.LABEL_FIELDS:
+                arrays[f'{i}__{field}'] = self.journals[name]['columns'][field]
+        offsets = {name: self.journals[name]['utc_offset_minutes'] for name in names}
+        return arrays, {'journals': names, 'utc_offsets': offsets}
+    
+    def set_state(self, arrays, meta):
+        journals = {}
+        for i, name in enumerate(meta['journals']):
+            columns = {field: arrays[f'{i}__{field}'] for field in self.NUMERIC_FIELDS + self.LABEL_FIELDS}
+            if len({len(values) for values in columns.values()}) != 1:
+                raise ValueError(f'Inconsistent journal columns for {name}')
+            journals[name] = self.build_journal(columns, meta['utc_offsets'][name])
+        self.journals = journals
+    
+    def to_columns(self, trades):
+        """Convert trades to typed columns of closed trades, oldest first.
+        
+        Accepts TradeContext-style dicts or a dict of per-field arrays. R is
+        taken from rMultiple, else pnl / risk; playbook falls back to the
+        strategy name. Trades without an id get one derived from their
+        timestamp, symbol and pnl so resent journals still deduplicate.
+        """
+        if isinstance(trades, dict):
+            count = len(trades.get('pnl', []))
+            raw = {key: np.asarray(values).tolist() for key, values in trades.items()}
+        else:
+            count = len(trades)
+            keys = ('id', 'timestamp', 'pnl', 'rMultiple', 'risk', 'mae', 'mfe', 'duration',
+                    'setup', 'playbook', 'strategy', 'symbol', 'status')
+            raw = {key: [trade.get(key) for trade in trades] for key in keys}
+        
+        def numeric(key):
+            values = raw.get(key) or [None] * count
+            return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+        
+        def labels(*keys):
+            values = [None] * count
+            for key in keys:
+                found = raw.get(key) or [None] * count
+                values = [value if value not in (None, '') else other for value, other in zip(values, found)]
+            return np.array(['' if value is None else str(value) for value in values], dtype=np.str_)
+        
+        timestamps = MarketHistory.parse_timestamps(raw.get('timestamp') or [])
+        columns = {
+            'timestamp': timestamps if timestamps is not None else np.full(count, np.nan),
+            'pnl': numeric('pnl'),
+            'mae': np.abs(numeric('mae')),
+            'mfe': np.abs(numeric('mfe')),
+            'duration': numeric('duration')
+        }
+        with np.errstate(invalid='ignore', divide='ignore'):
+            risk_r = columns['pnl'] / np.abs(numeric('risk'))
+        r_multiple = numeric('rMultiple')
+        columns['r_multiple'] = np.where(np.isfinite(r_multiple), r_multiple,
+                                         np.where(np.isfinite(risk_r), risk_r, np.nan))
+        columns['setup'] = labels('setup')
+        columns['playbook'] = labels('playbook', 'strategy')
+        columns['symbol'] = labels('symbol')
+        
+        ids = labels('id')
+        missing = ids == ''
+        if missing.any():
+            derived = np.char.add(np.char.add(columns['timestamp'].astype(np.str_), ':'),
+                                  np.char.add(np.char.add(columns['symbol'], ':'), columns['pnl'].astype(np.str_)))
+            ids = np.where(missing, derived, ids)
+        columns['id'] = ids
+        
+        status = labels('status')
+        closed = np.isfinite(columns['pnl']) & np.isfinite(columns['timestamp']) & (status != 'OPEN')
+        order = np.flatnonzero(closed)
+        order = order[np.argsort(columns['timestamp'][order], kind='stable')]
+        return {field: values[order] for field, values in columns.items()}
+    
+    def stat_rows(self, pnl, r_multiple):
+        """Per-trade contributions to each STATS column."""
+        return np.column_stack([
+            np.ones(len(pnl)),
+            pnl > 0,
+            pnl < 0,
+            pnl,
+            np.maximum(pnl, 0),
+            -np.minimum(pnl, 0),
+            np.nan_to_num(r_multiple),
+            np.isfinite(r_multiple)
+        ])
+    
+    def group_keys(self, columns, utc_offset_minutes):
+        local_seconds = columns['timestamp'] // 1000 + utc_offset_minutes * 60
+        return {
+            'setup': columns['setup'],
+            'playbook': columns['playbook'],
+            'symbol': columns['symbol'],
+            'hour': ((local_seconds // 3600) % 24).astype(np.int64),
+            # 1970-01-01 was a Thursday; shift so Monday is 0
+            'weekday': ((local_seconds // 86400 + 3) % 7).astype(np.int64)
+        }
+    
+    def reduce_groups(self, keys, rows):
+        """Sort-and-reduce rows by key: one argsort plus np.add.reduceat."""
+        order = np.argsort(keys, kind='stable')
+        ordered = keys[order]
+        starts = np.concatenate([[0], np.flatnonzero(ordered[1:] != ordered[:-1]) + 1])
+        return ordered[starts], np.add.reduceat(rows[order], starts, axis=0)
+    
+    def fold(self, journal, columns):
+        """Reduce a batch of trades (all newer than the journal) into the cache."""
+        if not len(columns['pnl']):
+            return
+        rows = self.stat_rows(columns['pnl'], columns['r_multiple'])
+        journal['totals'] += rows.sum(axis=0)
+        
+        for grouping, keys in self.group_keys(columns, journal['utc_offset_minutes']).items():
+            groups = journal['groups'][grouping]
+            for key, sums in zip(*self.reduce_groups(keys, rows)):
+                key = key.item()
+                groups[key] = groups[key] + sums if key in groups else sums
+        
+        start = journal['equity'][-1] if len(journal['equity']) else 0.0
+        peak = journal['peak'][-1] if len(journal['peak']) else 0.0
+        equity = start + np.cumsum(columns['pnl'])
+        journal['equity'] = np.concatenate([journal['equity'], equity])
+        journal['peak'] = np.concatenate([journal['peak'], np.maximum.accumulate(np.maximum(equity, peak))])
+    
+    def build_journal(self, columns, utc_offset_minutes):
+        journal = {
+            'columns': {field: values[:0] for field, values in columns.items()},
+            'ids': set(),
+            'utc_offset_minutes': utc_offset_minutes,
+            'totals': np.zeros(len(self.STATS)),
+            'groups': {grouping: {} for grouping in self.GROUPINGS},
+            'equity': np.zeros(0),
+            'peak': np.zeros(0)
+        }
+        self.append(journal, columns)
+        return journal
+    
+    def append(self, journal, columns):
+        stored = journal['columns']
+        fresh = np.fromiter((trade_id not in journal['ids'] for trade_id in columns['id']),
+                            dtype=bool, count=len(columns['id']))
+        # Keep the first copy of ids repeated within the batch itself
+        fresh &= np.isin(np.arange(len(fresh)), np.unique(columns['id'], return_index=True)[1])
+        batch = {field: values[fresh] for field, values in columns.items()}
+        added = len(batch['id'])
+        if not added:
+            return 0
+        
+        journal['ids'].update(batch['id'].tolist())
+        in_order = not len(stored['timestamp']) or batch['timestamp'][0] >= stored['timestamp'][-1]
+        merged = {field: np.concatenate([stored[field], batch[field]]) for field in stored}
+        if in_order:
+            journal['columns'] = merged
+            self.fold(journal, batch)
+        else:
+            order = np.argsort(merged['timestamp'], kind='stable')
+            rebuilt = self.build_journal({field: values[order] for field, values in merged.items()},
+                                         journal['utc_offset_minutes'])
+            journal.update(rebuilt)
+        return added
+    
+    def summarize(self, sums):
+        stats = dict(zip(self.STATS, sums.tolist()))
+        trades = stats['trades']
+        return {
+            'trades': int(trades),
+            'wins': int(stats['wins']),
+            'losses': int(stats['losses']),
+            'win_rate': round(stats['wins'] / trades * 100, 2) if trades else 0,
+            'net_pnl': round(float(stats['pnl']), 2),
+            'expectancy': round(stats['pnl'] / trades, 2) if trades else 0,
+            'profit_factor': round(stats['gross_win'] / stats['gross_loss'], 3) if stats['gross_loss'] else None,
+            'average_win': round(stats['gross_win'] / stats['wins'], 2) if stats['wins'] else 0,
+            'average_loss': round(-stats['gross_loss'] / stats['losses'], 2) if stats['losses'] else 0,
+            'average_r': round(stats['r_sum'] / stats['r_count'], 3) if stats['r_count'] else None
+        }
+    
+    def longest_run(self, mask):
+        edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+        lengths = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+        return int(lengths.max()) if len(lengths) else 0
+    
+    def downsample(self, values, max_points):
+        step = max(1, int(np.ceil(len(values) / max_points)))
+        index = np.arange(len(values) - 1, -1, -step)[::-1]
+        return index, values[index]
+    
+    def rolling(self, columns, window, max_points):
+        pnl = columns['pnl']
+        if len(pnl) < window:
+            return None
+        wins = np.concatenate([[0], np.cumsum(pnl > 0)])
+        total = np.concatenate([[0.0], np.cumsum(pnl)])
+        index, win_rate = self.downsample((wins[window:] - wins[:-window]) / window * 100, max_points)
+        expectancy = ((total[window:] - total[:-window]) / window)[index]
+        return {
+            'window': window,
+            'trade_index': (index + window - 1).tolist(),
+            'timestamp': columns['timestamp'][index + window - 1].tolist(),
+            'win_rate': np.round(win_rate, 2).tolist(),
+            'expectancy': np.round(expectancy, 2).tolist()
+        }
+    
+    def drawdown(self, journal, columns, max_points):
+        equity, peak = journal['equity'], journal['peak']
+        drawdown = equity - peak
+        # Trades spent below the prior peak; the curve starts at a zero peak
+        at_peak = np.concatenate([[-1], np.flatnonzero(drawdown >= 0), [len(equity)]])
+        index, series = self.downsample(drawdown, max_points)
+        return {
+            'max_drawdown': round(float(drawdown.min()), 2),
+            'current_drawdown': round(float(drawdown[-1]), 2),
+            'longest_drawdown_trades': int(np.diff(at_peak).max() - 1),
+            'current_drawdown_trades': int(len(equity) - 1 - at_peak[-2]),
+            'series': {
+                'timestamp': columns['timestamp'][index].tolist(),
+                'equity': np.round(equity[index], 2).tolist(),
+                'drawdown': np.round(series, 2).tolist()
+            }
+        }
+    
+    def r_distribution(self, r_multiple):
+        r_multiple = r_multiple[np.isfinite(r_multiple)]
+        if not len(r_multiple):
+            return None
+        # Outliers fall into the end bins rather than being dropped
+        clipped = np.clip(r_multiple, self.R_EDGES[0], self.R_EDGES[-1] - 1e-9)
+        counts, _ = np.histogram(clipped, bins=self.R_EDGES)
+        return {
+            'count': len(r_multiple),
+            'mean': round(float(r_multiple.mean()), 3),
+            'median': round(float(np.median(r_multiple)), 3),
+            'edges': self.R_EDGES.tolist(),
+            'counts': counts.tolist()
+        }
+    
+    def excursions(self, columns):
+        """MAE/MFE percentiles, split by outcome, plus MFE capture on winners."""
+        pnl = columns['pnl']
+        percentiles = (10, 25, 50, 75, 90)
+        
+        def describe(values):
+            values = values[np.isfinite(values)]
+            if not len(values):
+                return None
+            return dict(zip((f'p{p}' for p in percentiles), np.round(np.percentile(values, percentiles), 2).tolist()))
+        
+        mae, mfe = columns['mae'], columns['mfe']
+        if not (np.isfinite(mae).any() or np.isfinite(mfe).any()):
+            return None
+        
+        winners = (pnl > 0) & np.isfinite(mfe) & (mfe > 0)
+        return {
+            'mae': {'all': describe(mae), 'winners': describe(mae[pnl > 0]), 'losers': describe(mae[pnl <= 0])},
+            'mfe': {'all': describe(mfe), 'winners': describe(mfe[pnl > 0]), 'losers': describe(mfe[pnl <= 0])},
+            'mfe_capture': round(float(np.median(pnl[winners] / mfe[winners])), 3) if winners.any() else None
+        }
+    
+    def group_tables(self, journal):
+        tables = {}
+        for grouping, groups in journal['groups'].items():
+            rows = []
+            for key, sums in groups.items():
+                label = self.WEEKDAYS[key] if grouping == 'weekday' else key
+                rows.append(dict(self.summarize(sums), key=label if label != '' else 'unassigned'))
+            tables[grouping] = sorted(rows, key=lambda row: row['net_pnl'], reverse=True)
+        return tables
+    
+    def analyze(self, data):
+        journal_id = str(data.get('journal_id') or 'default')
+        offset = int(data.get('utc_offset_minutes', 0))
+        trades = self.to_columns(data.get('trades', []))
+        
+        journal = self.journals.get(journal_id)
+        if journal is None or data.get('reset') or journal['utc_offset_minutes'] != offset:
+            existing = journal['columns'] if journal is not None and not data.get('reset') else None
+            if existing is not None:
+                trades = {field: np.concatenate([existing[field], trades[field]]) for field in trades}
+                order = np.argsort(trades['timestamp'], kind='stable')
+                trades = {field: values[order] for field, values in trades.items()}
+            journal = self.journals[journal_id] = self.build_journal(trades, offset)
+            added = len(journal['columns']['id'])
+        else:
+            added = self.append(journal, trades)
+        
+        columns = journal['columns']
+        if not len(columns['pnl']):
+            return {'error': 'Journal has no closed trades with P&L'}
+        
+        window = max(1, int(data.get('window', 20)))
+        max_points = max(2, int(data.get('max_points', 500)))
+        summary = self.summarize(journal['totals'])
+        summary.update({
+            'largest_win': round(float(columns['pnl'].max()), 2),
+            'largest_loss': round(float(columns['pnl'].min()), 2),
+            'max_consecutive_wins': self.longest_run(columns['pnl'] > 0),
+            'max_consecutive_losses': self.longest_run(columns['pnl'] < 0)
+        })
+        
+        analysis = {
+            'journal_id': journal_id,
+            'trades_added': int(added),
+            'summary': summary,
+            'rolling': self.rolling(columns, window, max_points),
+            'r_multiples': self.r_distribution(columns['r_multiple']),
+            'excursions': self.excursions(columns),
+            'drawdown': self.drawdown(journal, columns, max_points),
+            'groups': self.group_tables(journal),
+            'timestamp': datetime.now().isoformat()
+        }
+        
+        if data.get('simulate') and self.simulator is not None:
+            playbooks = np.unique(columns['playbook'])
+            request = {key: data[key] for key in ('n_paths', 'block_size', 'seed', 'ruin_threshold', 'initial_capital')
+                       if key in data}
+            request['strategies'] = [{'name': name or 'unassigned', 'pnl': columns['pnl'][columns['playbook'] == name]}
+                                     for name in playbooks.tolist()]
+            analysis['simulations'] = self.simulator.analyze(request)['simulations']
+        
+        return analysis
+
+def round_finite(value, digits):
+    """Round a metric for output, or None when it is NaN or infinite."""
+    value = float(value)
+    return round(value, digits) if np.isfinite(value) else None
+
+def bars_per_year(timestamps):
+    """Bar density of epoch-ms timestamps, counting session gaps, or None."""
+    timestamps = timestamps[np.isfinite(timestamps)]
+    if len(timestamps) < 2 or timestamps[-1] <= timestamps[0]:
+        return None
+    return (len(timestamps) - 1) / ((timestamps[-1] - timestamps[0]) / (365.25 * 86400 * 1000))
+
+def finite_json(obj):
+    """Copy of obj with NumPy values unwrapped and non-finite floats as None."""
+    if isinstance(obj, dict):
+        return {key: finite_json(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [finite_json(value) for value in obj]
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return finite_json(obj.tolist())
+    if isinstance(obj, float) and not np.isfinite(obj):
+        return None
+    return obj
+
+def json_default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+def encode_json(obj):
+    """Serialize a result to compact JSON text, emitting NumPy values directly."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=json_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+    try:
+        return json.dumps(obj, default=json_default, separators=(',', ':'), allow_nan=False)
+    except ValueError:
+        # NaN/Infinity are not JSON; map them to null as orjson does
+        return json.dumps(finite_json(obj), default=json_default, separators=(',', ':'), allow_nan=False)
+
+def project_fields(result, fields):
+    """Keep only the requested sections of a result.
+    
+    Fields are top-level keys or dotted paths into nested dicts, e.g.
+    ['trend_analysis', 'volatility_analysis.level']. Error results are
+    returned untouched so callers always see why an analysis failed.
+    """
+    if not fields or not isinstance(result, dict) or 'error' in result:
+        return result
+    
+    projected = {}
+    for field in fields:
+        source = result
+        target = projected
+        parts = field.split('.')
+        for depth, part in enumerate(parts):
+            if not isinstance(source, dict) or part not in source:
+                break
+            if depth == len(parts) - 1:
+                target[part] = source[part]
+            else:
+                source = source[part]
+                target = target.setdefault(part, {})
+    return projected
+
+def format_response(request_id, analysis_type, result, received=None):
+    # Header and serialized result are separated by a tab, which never occurs
+    # unescaped in compact JSON. Node parses only the header and forwards the
+    # result text verbatim to HTTP and WebSocket clients.
+    body = encode_json(result)
+    header = {
+        'id': request_id,
+        'type': analysis_type,
+        'timestamp': datetime.now().isoformat()
+    }
+    if received is not None:
+        # Service time from the request's first byte to its encoded result,
+        # the figure captures record, so replays can compare like for like
+        header['service_ms'] = round((time.perf_counter() - received) * 1000, 3)
+    return json.dumps(header) + '\t' + body
+
+def relay_wait_ms(request, arrival):
+    """Milliseconds between the relay sending a request and the brain reading it."""
+    try:
+        sent = datetime.fromisoformat(str(request.get('timestamp')).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return 0.0
+    return max(0.0, (arrival - sent) * 1000)
+
+class RequestError(ValueError):
+    """A request line that could not be read, tagged with its id when known."""
+    
+    def __init__(self, message, request_id=None, analysis_type=None):
+        super().__init__(message)
+        self.request_id = request_id
+        self.analysis_type = analysis_type
+
+class PayloadTooLarge(RequestError):
+    """A request whose market_data would exceed the per-request memory budget."""
+
+class MarketColumns(dict):
+    """Typed per-field arrays standing in for a market_data row list.
+    
+    Only the numeric MARKET_FIELDS are kept; timestamps are epoch
+    milliseconds in float64 and NaN where a row has none. pandas builds a
+    DataFrame from it directly; `rows` is the row count.
+    """
+    
+    def __init__(self, columns, rows):
+        super().__init__(columns)
+        self.rows = rows
+    
+    def take(self, indices):
+        return MarketColumns({field: values[indices] for field, values in self.items()}, len(indices))
+
+MARKET_FIELDS = ('timestamp', 'price', 'open', 'high', 'low', 'close', 'volume', 'bid', 'ask',
+                 'spread', 'bidSize', 'askSize', 'bidVolume', 'askVolume')
+
+class MarketColumnBuilder:
+    """Writes batches of market_data rows into preallocated typed columns.
+    
+    With expected_rows the columns are allocated once at that length;
+    otherwise capacity doubles. Every allocation is checked against
+    budget_bytes first and raises PayloadTooLarge instead of growing past it.
+    """
+    
+    def __init__(self, dtype=np.float64, expected_rows=None, budget_bytes=None, initial_capacity=4096):
+        self.dtype = np.dtype(dtype)
+        self.budget_bytes = budget_bytes
+        self.capacity = int(expected_rows) if expected_rows else initial_capacity
+        self.count = 0
+        self.columns = {}
+    
+    def itemsize(self, field):
+        # Epoch milliseconds need float64 precision regardless of dtype
+        return 8 if field == 'timestamp' else self.dtype.itemsize
+    
+    def reserve(self, capacity, fields):
+        needed = sum(self.itemsize(field) for field in fields) * capacity
+        if self.budget_bytes is not None and needed > self.budget_bytes:
+            raise PayloadTooLarge(
+                f'market_data needs {needed / 2**20:.1f}MB for {capacity} rows x {len(fields)} fields, '
+                f'over the {self.budget_bytes / 2**20:.1f}MB request budget'
+            )
+        for field in fields:
+            dtype = np.float64 if field == 'timestamp' else self.dtype
+            column = np.full(capacity, np.nan, dtype=dtype)
+            if field in self.columns:
+                column[:self.count] = self.columns[field][:self.count]
+            self.columns[field] = column
+        self.capacity = capacity
+    
+    def add(self, rows):
+        if not rows:
+            return
+        if not all(isinstance(row, dict) for row in rows):
+            raise ValueError('market_data rows must be objects')
+        present = set().union(*rows).intersection(MARKET_FIELDS)
+        fields = sorted(set(self.columns) | present, key=MARKET_FIELDS.index)
+        end = self.count + len(rows)
+        if end > self.capacity:
+            capacity = self.capacity
+            while capacity < end:
+                capacity *= 2
+            self.reserve(capacity, fields)
+        elif present - set(self.columns):
+            self.reserve(self.capacity, fields)
+        
+        for field in present:
+            values = [row.get(field) for row in rows]
+            if field == 'timestamp':
+                parsed = MarketHistory.parse_timestamps(values)
+                if parsed is not None:
+                    self.columns[field][self.count:end] = parsed
+            else:
+                self.columns[field][self.count:end] = np.array(values, dtype=np.float64)
+        self.count = end
+    
+    def finish(self):
+        return MarketColumns({field: values[:self.count] for field, values in self.columns.items()}, self.count)
+
+def market_columns(market_data, dtype=None):
+    """Columnar view of market_data given as rows, a field -> list dict, or columns."""
+    if isinstance(market_data, MarketColumns):
+        return market_data
+    builder = MarketColumnBuilder(dtype or np.float64, expected_rows=None)
+    if isinstance(market_data, dict):
+        count = len(next(iter(market_data.values()), []))
+        builder.reserve(max(count, 1), [field for field in MARKET_FIELDS if field in market_data])
+        for field in builder.columns:
+            values = list(market_data[field])
+            if field == 'timestamp':
+                values = MarketHistory.parse_timestamps(values)
+                if values is None:
+                    continue
+            builder.columns[field][:count] = np.asarray(values, dtype=np.float64)
+        builder.count = count
+    else:
+        builder.add(market_data)
+    return builder.finish()
+
+class RequestReader:
+    """Reads newline-delimited requests, streaming market_data into columns.
+    
+    Lines without a top-level data.market_data array are decoded with
+    json.loads as before. Otherwise only the JSON around the array is kept
+    as text; rows are decoded in batches straight into a MarketColumnBuilder,
+    so a large payload never exists as one string or as a list of dicts.
+    Node puts an 'ingest' hint ({rows, dtype, budget_mb}) ahead of 'data',
+    which lets oversized payloads be rejected before any column is allocated.
+    """
+    
+    MARKET_DATA = re.compile(r'"market_data"\s*:\s*\[')
+    TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"\s*:|"(?:[^"\\]|\\.)*"|[\[\]{}]')
+    INGEST = re.compile(r'"ingest"\s*:\s*(\{[^{}]*\})')
+    REQUEST_ID = re.compile(r'"id"\s*:\s*("(?:[^"\\]|\\.)*"|-?[\d.]+)')
+    REQUEST_TYPE = re.compile(r'"type"\s*:\s*("(?:[^"\\]|\\.)*")')
+    BATCH_ROWS = 4096
+    
+    def __init__(self, stream, budget_bytes, chunk_size=1 << 16, keep_raw=False):
+        self.stream = stream
+        self.budget_bytes = budget_bytes
+        self.chunk_size = chunk_size
+        # Streamed lines are only kept verbatim when something (capture) needs them
+        self.keep_raw = keep_raw
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.raw = []
+        self.eof = False
+        # (epoch seconds, perf_counter) when the current request's first
+        # bytes were available, so streamed parsing counts as service time
+        self.arrival = None
+    
+    def fill(self):
+        if self.eof:
+            return False
+        chunk = self.stream.read1(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            self.buffer += self.decoder.decode(b'', final=True)
+            return False
+        self.buffer += self.decoder.decode(chunk)
+        if self.arrival is None:
+            self.arrival = (time.time(), time.perf_counter())
+        return True
+    
+    def consume(self, pos):
+        if self.keep_raw:
+            self.raw.append(self.buffer[:pos])
+        self.buffer = self.buffer[pos:]
+    
+    def take_line(self, end):
+        """Pop buffer[:end] (plus the newline) and return the whole line's text."""
+        text = self.buffer[:end]
+        self.buffer = self.buffer[end + 1:]
+        if self.raw:
+            text = ''.join(self.raw) + text
+            self.raw = []
+        return text
+    
+    def skip_line(self):
+        self.raw = []
+        while True:
+            newline = self.buffer.find('\n')
+            if newline >= 0:
+                self.buffer = self.buffer[newline + 1:]
+                return
+            self.buffer = ''
+            if not self.fill():
+                return
+    
+    def is_data_array(self, prefix):
+        """True when prefix ends inside the top-level object's 'data' object."""
+        stack = []
+        for token in self.TOKEN.finditer(prefix):
+            text = token.group()
+            if text[0] == '"':
+                if text[-1] == ':' and stack:
+                    stack[-1][1] = json.loads(text[:-1].rstrip())
+            elif text in '{[':
+                stack.append([text, None])
+            elif stack:
+                stack.pop()
+        return len(stack) == 2 and stack[0] == ['{', 'data'] and stack[1][0] == '{'
+    
+    def read(self):
+        """Next request as (request, line); None at EOF.
+        
+        line is the raw text when available (always for ordinary lines,
+        for streamed ones only with keep_raw). Raises RequestError on
+        malformed input and PayloadTooLarge on budget violations, in both
+        cases after discarding the offending line and with the request's id
+        when it could be found.
+        """
+        # A request already buffered behind the previous one arrives now
+        self.arrival = (time.time(), time.perf_counter()) if self.buffer and not self.buffer.isspace() else None
+        scanned = 0
+        while True:
+            newline = self.buffer.find('\n', scanned)
+            limit = newline if newline >= 0 else len(self.buffer)
+            match = self.MARKET_DATA.search(self.buffer, max(0, scanned - 32), limit)
+            while match is not None and not self.is_data_array(self.buffer[:match.start()]):
+                match = self.MARKET_DATA.search(self.buffer, match.end(), limit)
+            
+            if match is not None:
+                return self.read_streamed(match)
+            if newline >= 0:
+                line = self.take_line(newline)
+                scanned = 0
+                if not line.strip():
+                    continue
+                return self.decode_line(line), line
+            if len(self.buffer) > self.budget_bytes:
+                request_id = self.REQUEST_ID.search(self.buffer, 0, 4096)
+                analysis_type = self.REQUEST_TYPE.search(self.buffer, 0, 4096)
+                self.skip_line()
+                raise PayloadTooLarge(
+                    f'Request exceeds the {self.budget_bytes / 2**20:.1f}MB request budget',
+                    self.match_value(request_id),
+                    self.match_value(analysis_type)
+                )
+            
+            scanned = len(self.buffer)
+            if not self.fill():
+                if self.buffer.strip():
+                    line = self.take_line(len(self.buffer))
+                    return self.decode_line(line), line
+                return None
+    
+    def decode_line(self, line):
+        try:
+            return json.loads(line)
+        except ValueError as e:
+            request_id = self.REQUEST_ID.search(line, 0, 4096)
+            analysis_type = self.REQUEST_TYPE.search(line, 0, 4096)
+            raise RequestError(
+                f'Malformed request: {e}',
+                self.match_value(request_id),
+                self.match_value(analysis_type)
+            ) from e
+    
+    @staticmethod
+    def match_value(match):
+        try:
+            return json.loads(match.group(1)) if match else None
+        except ValueError:
+            return None
+    
+    def read_streamed(self, match):
+        head = self.buffer[:match.end()]
+        request_id = self.match_value(self.REQUEST_ID.search(head))
+        analysis_type = self.match_value(self.REQUEST_TYPE.search(head))
+        line_done = False
+        try:
+            hint = self.INGEST.search(head)
+            hint = json.loads(hint.group(1)) if hint else {}
+            
+            budget = self.budget_bytes
+            if hint.get('budget_mb'):
+                budget = min(budget, int(float(hint['budget_mb']) * 2**20))
+            builder = MarketColumnBuilder(
+                np.float32 if hint.get('dtype') == 'float32' else np.float64,
+                expected_rows=hint.get('rows'),
+                budget_bytes=budget
+            )
+            
+            self.consume(match.end())
+            batch = []
+            pos = 0
+            while True:
+                while pos < len(self.buffer) and self.buffer[pos] in ' \t\r,':
+                    pos += 1
+                if pos >= len(self.buffer):
+                    self.consume(pos)
+                    pos = 0
+                    if not self.fill():
+                        raise ValueError('Request ended inside market_data')
+                    continue
+                if self.buffer[pos] == ']':
+                    pos += 1
+                    break
+                # Decode every complete row in the buffer with one json.loads;
+                # a cut that lands inside a string or nested object fails to
+                # parse and falls through to row-at-a-time decoding.
+                cut = self.buffer.rfind('},', pos)
+                if cut > pos:
+                    try:
+                        rows = json.loads('[' + self.buffer[pos:cut + 1] + ']')
+                    except json.JSONDecodeError:
+                        rows = None
+                    if rows is not None and all(isinstance(row, dict) for row in rows):
+                        batch.extend(rows)
+                        pos = cut + 2
+                        if len(batch) >= self.BATCH_ROWS:
+                            builder.add(batch)
+                            batch = []
+                            self.consume(pos)
+                            pos = 0
+                        continue
+                try:
+                    row, pos = self.json_decoder.raw_decode(self.buffer, pos)
+                except json.JSONDecodeError:
+                    # Usually a row cut off at the chunk boundary
+                    if self.eof or '\n' in self.buffer[pos:]:
+                        raise ValueError('Malformed market_data row')
+                    self.consume(pos)
+                    pos = 0
+                    self.fill()
+                    continue
+                batch.append(row)
+                if len(batch) >= self.BATCH_ROWS:
+                    builder.add(batch)
+                    batch = []
+                    self.consume(pos)
+                    pos = 0
+            builder.add(batch)
+            
+            self.consume(pos)
+            newline = self.buffer.find('\n')
+            while newline < 0:
+                if len(self.buffer) > budget:
+                    raise PayloadTooLarge(f'Request exceeds the {budget / 2**20:.1f}MB request budget')
+                scanned = len(self.buffer)
+                if not self.fill():
+                    newline = len(self.buffer)
+                    break
+                newline = self.buffer.find('\n', scanned)
+            tail = self.buffer[:newline]
+            line = self.take_line(newline) if self.keep_raw else None
+            if not self.keep_raw:
+                self.buffer = self.buffer[newline + 1:]
+            line_done = True
+            
+            request = json.loads(head + ']' + tail)
+            request['data']['market_data'] = builder.finish()
+        except Exception as e:
+            # Whatever failed (bad row types, non-numeric fields, a broken
+            # tail), the rest of the line must not be read as a new request
+            # and the caller must still be able to answer this one
+            if not line_done:
+                self.skip_line()
+            if isinstance(e, RequestError):
+                e.request_id, e.analysis_type = request_id, analysis_type
+                raise
+            raise RequestError(f'Malformed market_data: {e}', request_id, analysis_type) from e
+        return request, line
+
+class MarketHistory:
+    """Bounded per-symbol price/volume windows kept across requests."""
+    
+    STATE_VERSION = 1
+    
+    def __init__(self, capacity=5000):
+        self.capacity = capacity
+        self.windows = {}
+        # Bars ever recorded per symbol; gives stable absolute bar indices
+        # once old bars have been trimmed from the window.
+        self.totals = {}
+    
+    def record(self, symbol, market_data):
+        """Merge market_data into the symbol's window.
+        
+        Returns (new_rows, replaced): indices of the rows that were appended,
+        and whether the payload replaced the window instead of extending it.
+        """
+        count = market_data.rows
+        prices = np.asarray(market_data.get('price', np.full(count, np.nan)), dtype=np.float64)
+        volumes = np.nan_to_num(np.asarray(market_data.get('volume', np.zeros(count)), dtype=np.float64))
+        timestamps = market_data.get('timestamp')
+        if timestamps is not None and np.isnan(timestamps).any():
+            timestamps = None
+        
+        window = self.windows.get(symbol)
+        if (window is not None and timestamps is not None and len(window['timestamp'])
+                and not np.isnan(window['timestamp'][-1])):
+            # Only bars newer than the stored tail are appended; callers
+            # usually resend an overlapping window on every request.
+            fresh = timestamps > window['timestamp'][-1]
+            new_rows, replaced = np.flatnonzero(fresh), False
+            prices = np.concatenate([window['price'], prices[fresh]])
+            volumes = np.concatenate([window['volume'], volumes[fresh]])
+            timestamps = np.concatenate([window['timestamp'], timestamps[fresh]])
+            self.totals[symbol] = self.totals.get(symbol, 0) + int(np.count_nonzero(fresh))
+        else:
+            # Without timestamps the payload replaces the window outright;
+            # its bars still count as new so absolute indices only grow
+            if timestamps is None:
+                timestamps = np.full(len(prices), np.nan)
+            new_rows, replaced = np.arange(len(prices)), True
+            self.totals[symbol] = self.totals.get(symbol, 0) + len(prices)
+        
+        self.windows[symbol] = {
+            'price': prices[-self.capacity:],
+            'volume': volumes[-self.capacity:],
+            'timestamp': timestamps[-self.capacity:]
+        }
+        return new_rows, replaced
+    
+    def append(self, symbol, market_data):
+        """Append every row to the symbol's window.
+        
+        For sequenced feeds such as the tick feed's own history, where rows
+        never overlap and several may share a millisecond timestamp.
+        """
+        count = market_data.rows
+        missing = np.full(count, np.nan)
+        rows = {
+            'price': np.asarray(market_data.get('price', missing), dtype=np.float64),
+            'volume': np.nan_to_num(np.asarray(market_data.get('volume', missing), dtype=np.float64)),
+            'timestamp': np.asarray(market_data.get('timestamp', missing), dtype=np.float64)
+        }
+        window = self.windows.get(symbol)
+        if window is not None:
+            rows = {field: np.concatenate([window[field], values]) for field, values in rows.items()}
+        self.windows[symbol] = {field: values[-self.capacity:] for field, values in rows.items()}
+        self.totals[symbol] = self.totals.get(symbol, 0) + count
+    
+    @staticmethod
+    def parse_timestamps(raw):
+        """Epoch milliseconds from numeric or ISO-8601 timestamps, or None."""
+        if not len(raw) or any(ts is None for ts in raw):
+            return None
+        try:
+            if isinstance(raw[0], (int, float)):
+                return np.array(raw, dtype=np.float64)
+            stamps = np.array([str(ts).rstrip('Z') for ts in raw], dtype='datetime64[ms]')
+            return stamps.astype(np.int64).astype(np.float64)
+        except (TypeError, ValueError):
+            return None
+    
+    def get(self, symbol):
+        return self.windows.get(symbol)
+    
+    def get_state(self):
+        symbols = sorted(self.windows)
+        arrays = {}
+        for i, symbol in enumerate(symbols):
+            for field, values in self.windows[symbol].items():
+                arrays[f'{i}__{field}'] = values
+        totals = {symbol: self.totals.get(symbol, len(self.windows[symbol]['price'])) for symbol in symbols}
+        return arrays, {'symbols': symbols, 'capacity': self.capacity, 'totals': totals}
+    
+    def set_state(self, arrays, meta):
+        windows = {}
+        for i, symbol in enumerate(meta['symbols']):
+            window = {field: arrays[f'{i}__{field}'] for field in ('price', 'volume', 'timestamp')}
+            if len({len(values) for values in window.values()}) != 1:
+                raise ValueError(f'Inconsistent history lengths for {symbol}')
+            windows[symbol] = window
+        self.capacity = meta.get('capacity', self.capacity)
+        self.windows = windows
+        self.totals = {symbol: meta.get('totals', {}).get(symbol, len(window['price']))
+                       for symbol, window in windows.items()}
+
+class BrainStateStore:
+    """Checkpoints component state to an .npz archive plus a JSON manifest.
+    
+    Components expose get_state() -> (arrays, meta) and set_state(arrays, meta)
+    along with a STATE_VERSION; a manifest whose format version, component
+    versions or checksum do not match is ignored and the brain starts cold.
+    """
+    
+    FORMAT_VERSION = 1
+    MANIFEST_NAME = 'manifest.json'
+    
+    def __init__(self, components, directory=None, interval=None, lock=None):
+        self.components = components
+        # Components may be updated from another thread (the tick feed)
+        self.lock = lock or threading.RLock()
+        self.directory = directory or os.environ.get(
+            'NEXUS_BRAIN_STATE_DIR',
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'state')
+        )
+        self.interval = interval if interval is not None else float(
+            os.environ.get('NEXUS_BRAIN_CHECKPOINT_SECONDS', 60)
+        )
+        self.enabled = True
+        self.dirty = False
+        self.generation = 0
+        self.last_saved = time.monotonic()
+        # Not reentrant, unlike lock, so a signal handler can tell that it
+        # interrupted a write on its own thread
+        self.writing = threading.Lock()
+    
+    def mark_dirty(self):
+        self.dirty = True
+    
+    def maybe_save(self):
+        if self.dirty and time.monotonic() - self.last_saved >= self.interval:
+            self.save()
+    
+    def save(self):
+        with self.lock, self.writing:
+            return self.write_checkpoint()
+    
+    def try_save(self):
+        """Save unless this thread is already mid-write; returns whether it saved.
+        
+        For signal handlers, which run on the main thread and may interrupt
+        a checkpoint that thread is writing.
+        """
+        with self.lock:
+            # Other threads only write while holding lock, so a held
+            # writing lock here means the write belongs to this thread
+            if not self.writing.acquire(blocking=False):
+                return False
+            try:
+                self.write_checkpoint()
+            finally:
+                self.writing.release()
+            return True
+    
+    def write_checkpoint(self):
+        if not self.enabled:
+            return None
+        
+        started = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+        
+        arrays = {}
+        components = {}
+        for name, component in self.components.items():
+            component_arrays, meta = component.get_state()
+            components[name] = {
+                'version': component.STATE_VERSION,
+                'meta': meta,
+                'arrays': {
+                    key: {'shape': list(values.shape), 'dtype': str(values.dtype)}
+                    for key, values in component_arrays.items()
+                }
+            }
+            for key, values in component_arrays.items():
+                arrays[f'{name}.{key}'] = values
+        
+        self.generation += 1
+        arrays_name = f'brain_state.{os.getpid()}.{self.generation}.npz'
+        arrays_path = os.path.join(self.directory, arrays_name)
+        np.savez(arrays_path, **arrays)
+        
+        manifest = {
+            'format_version': self.FORMAT_VERSION,
+            'created_at': datetime.now().isoformat(),
+            'arrays_file': arrays_name,
+            'sha256': self.file_digest(arrays_path),
+            'components': components
+        }
+        manifest_path = os.path.join(self.directory, self.MANIFEST_NAME)
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+        
+        # The manifest now points at the new archive; older ones are garbage.
+        for name in os.listdir(self.directory):
+            if name.startswith('brain_state.') and name != arrays_name:
+                os.remove(os.path.join(self.directory, name))
+        
+        self.dirty = False
+        self.last_saved = time.monotonic()
+        return (time.perf_counter() - started) * 1000
+    
+    def restore(self):
+        with self.lock:
+            return self.load_checkpoint()
+    
+    def load_checkpoint(self):
+        manifest_path = os.path.join(self.directory, self.MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            return None
+        
+        started = time.perf_counter()
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        
+        if manifest.get('format_version') != self.FORMAT_VERSION:
+            raise ValueError(f"Unsupported state format {manifest.get('format_version')}")
+        
+        arrays_path = os.path.join(self.directory, manifest['arrays_file'])
+        if self.file_digest(arrays_path) != manifest['sha256']:
+            raise ValueError('State archive checksum mismatch')
+        
+        # Every array is validated before any component changes
+        staged = {}
+        with np.load(arrays_path, allow_pickle=False) as archive:
+            for name, component in self.components.items():
+                entry = manifest['components'].get(name)
+                if entry is None or entry['version'] != component.STATE_VERSION:
+                    continue
+                
+                component_arrays = {}
+                for key, spec in entry['arrays'].items():
+                    values = archive[f'{name}.{key}']
+                    if list(values.shape) != spec['shape'] or str(values.dtype) != spec['dtype']:
+                        raise ValueError(f'State array {name}.{key} does not match manifest')
+                    component_arrays[key] = values
+                staged[name] = (component_arrays, entry['meta'])
+        
+        # set_state can still reject a component; earlier ones are rolled
+        # back so a failed restore leaves the brain as it was
+        previous = {name: self.components[name].get_state() for name in staged}
+        applied = []
+        try:
+            for name, (component_arrays, meta) in staged.items():
+                applied.append(name)
+                self.components[name].set_state(component_arrays, meta)
+        except Exception:
+            for name in applied:
+                self.components[name].set_state(*previous[name])
+            raise
+        
+        self.dirty = False
+        return (time.perf_counter() - started) * 1000
+    
+    def file_digest(self, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+class RequestCapture:
+    """Append-only log of the request lines the brain receives.
+    
+    Each record is a compact JSON header (arrival epoch seconds, queue wait
+    and service time in ms, response bytes, source) and the request line
+    exactly as received, separated by a tab. Paths ending in .gz are
+    gzip-compressed. brain_replay.py feeds captures back into the brain.
+    """
+    
+    def __init__(self, path, flush_seconds=1.0):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.file = None
+        self.last_flush = time.monotonic()
+    
+    def record(self, line, arrival, wait_ms, service_ms, response_bytes, source='stdin'):
+        if self.file is None:
+            # Opened on first use so an idle standby never touches the log
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            if self.path.endswith('.gz'):
+                import gzip
+                self.file = gzip.open(self.path, 'at', compresslevel=6)
+            else:
+                self.file = open(self.path, 'a', buffering=1 << 16)
+        
+        header = json.dumps({
+            't': round(arrival, 6),
+            'wait': round(wait_ms, 3),
+            'ms': round(service_ms, 3),
+            'out': response_bytes,
+            'src': source
+        }, separators=(',', ':'))
+        self.file.write(header + '\t' + line.rstrip('\n') + '\n')
+        
+        if time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.file.flush()
+            self.last_flush = time.monotonic()
+    
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+# Relay keep-alives are not part of the workload a capture should replay
+UNCAPTURED_TYPES = ('heartbeat',)
+
+def open_capture():
+    path = os.environ.get('NEXUS_BRAIN_CAPTURE')
+    return RequestCapture(path) if path else None
+
+class TickRing:
+    """Reader for the shared-memory tick ring written by the NT8 bridge.
+    
+    The ring is a memory-mapped file of fixed 64-byte records (layout in
+    server/tick-ring.cjs) viewed as a NumPy structured array. Record n sits
+    in slot n % capacity with seq n + 1, and the header's write sequence
+    only advances once the records below it are complete. read() copies
+    everything between the cursor and the write sequence in one batch, then
+    re-reads each copied slot's seq and drops records the writer has since
+    reached, counting them as lost. That catches a lapping writer in
+    practice, but with no memory fences between the two processes it is a
+    best-effort check rather than a guarantee against torn records. The
+    cursor is checkpointed so a restarted brain resumes where its last
+    checkpoint left off.
+    """
+    
+    STATE_VERSION = 1
+    MAGIC = b'NXTICK01'
+    VERSION = 1
+    HEADER = np.dtype([
+        ('magic', 'S8'), ('version', '<u4'), ('record_size', '<u4'), ('capacity', '<u8'),
+        ('symbol_slots', '<u4'), ('symbol_bytes', '<u4'), ('symbol_count', '<u4'), ('reserved', '<u4'),
+        ('created_ms', '<f8'), ('data_offset', '<u8'), ('padding', 'S8'), ('write_seq', '<u8')
+    ])
+    RECORD = np.dtype([
+        ('seq', '<u8'), ('timestamp', '<f8'), ('price', '<f8'), ('volume', '<f8'), ('bid', '<f8'),
+        ('ask', '<f8'), ('bidSize', '<f4'), ('askSize', '<f4'), ('symbol', '<u4'), ('flags', '<u4')
+    ])
+    HEADER_BYTES = 4096
+    RECHECK_SECONDS = 1.0
+    
+    def __init__(self, path, max_batch=1 << 18):
+        self.path = path
+        self.max_batch = max_batch
+        self.mapping = None
+        self.header = None
+        self.records = None
+        self.inode = None
+        self.capacity = 0
+        self.cursor = None
+        self.created_ms = None
+        self.names = []
+        self.last_check = 0.0
+        self.received = 0
+        self.lost = 0
+    
+    def get_state(self):
+        return {}, {'path': self.path, 'cursor': self.cursor, 'created_ms': self.created_ms}
+    
+    def set_state(self, arrays, meta):
+        # A cursor is only meaningful for the ring generation it came from
+        if meta.get('path') == self.path:
+            self.cursor, self.created_ms = meta.get('cursor'), meta.get('created_ms')
+            if self.header is not None:
+                self.sync_cursor()
+    
+    def open(self):
+        try:
+            with open(self.path, 'rb') as f:
+                inode = os.fstat(f.fileno()).st_ino
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            # Missing, or still empty while the bridge creates it
+            return False
+        
+        header = np.ndarray((), dtype=self.HEADER, buffer=mapping)
+        if bytes(header['magic']) != self.MAGIC or int(header['version']) != self.VERSION:
+            raise ValueError(f'{self.path} is not a version {self.VERSION} tick ring')
+        if int(header['record_size']) != self.RECORD.itemsize:
+            raise ValueError(f"Tick ring records are {int(header['record_size'])} bytes, "
+                             f'expected {self.RECORD.itemsize}')
+        
+        self.mapping = mapping
+        self.header = header
+        self.capacity = int(header['capacity'])
+        self.records = np.ndarray((self.capacity,), dtype=self.RECORD, buffer=mapping,
+                                  offset=int(header['data_offset']))
+        # A ring that replaces one this reader had mapped is read from its
+        # first record, since the bridge may already have published to it
+        recreated = self.inode is not None and inode != self.inode
+        self.inode = inode
+        self.names = []
+        self.sync_cursor(recreated)
+        return True
+    
+    def sync_cursor(self, recreated=False):
+        created_ms = float(self.header['created_ms'])
+        published = int(self.header['write_seq'])
+        if recreated and created_ms != self.created_ms:
+            self.cursor = 0
+            self.created_ms = created_ms
+        elif self.cursor is None or created_ms != self.created_ms or self.cursor > published:
+            # Cold start (no checkpoint for this ring): only ticks published
+            # from now on
+            self.cursor = published
+            self.created_ms = created_ms
+    
+    def replaced(self):
+        """Whether the bridge has recreated the ring file since it was mapped."""
+        now = time.monotonic()
+        if now - self.last_check < self.RECHECK_SECONDS:
+            return False
+        self.last_check = now
+        try:
+            return os.stat(self.path).st_ino != self.inode
+        except FileNotFoundError:
+            return False
+    
+    def read(self):
+        """Every record published since the cursor, as a structured array copy."""
+        if self.header is None and not self.open():
+            return None
+        
+        published = int(self.header['write_seq'])
+        start = max(self.cursor, published - self.capacity)
+        count = min(published - start, self.max_batch)
+        if count <= 0:
+            if self.replaced():
+                self.mapping = self.header = self.records = None
+            return None
+        
+        slot = start % self.capacity
+        first = min(count, self.capacity - slot)
+        batch = np.concatenate([self.records[slot:slot + first], self.records[:count - first]])
+        
+        # Slots the writer reached while we were copying may be torn. The
+        # writer fills a batch before publishing it, so the write sequence
+        # alone misses slots overwritten by a batch that is not yet
+        # published; re-reading each slot's seq catches those too.
+        overwritten = int(self.header['write_seq']) - self.capacity
+        current = np.concatenate([self.records['seq'][slot:slot + first], self.records['seq'][:count - first]])
+        sequence = np.arange(start + 1, start + count + 1, dtype=np.uint64)
+        valid = (batch['seq'] == sequence) & (current == sequence) & (sequence > overwritten)
+        
+        self.lost += start - self.cursor + count - int(np.count_nonzero(valid))
+        self.cursor = start + count
+        if not valid.all():
+            batch = batch[valid]
+        self.received += len(batch)
+        return batch
+    
+    def symbol_names(self, ids):
+        if len(ids) and int(ids.max()) >= len(self.names):
+            # The bridge publishes a name before any record that uses it
+            slots, width = int(self.header['symbol_slots']), int(self.header['symbol_bytes'])
+            table = np.ndarray((slots,), dtype=f'S{width}', buffer=self.mapping, offset=self.HEADER_BYTES)
+            self.names = [name.decode('utf-8', 'replace') for name in table[:int(self.header['symbol_count'])]]
+        return [self.names[i] if i < len(self.names) else f'symbol_{i}' for i in ids.tolist()]
+
+class TickFeed:
+    """Moves ticks from a TickRing into a tick MarketHistory and LiquidityEngine.
+    
+    Ticks get their own history and liquidity windows rather than sharing
+    the per-symbol bar windows that requests fill, so neither frequency
+    trims or replaces the other and bar models never fit on mixed data.
+    A daemon thread polls the ring, sleeping only when it is empty, and each
+    analysis drains it first. Batches are grouped by symbol and ingested as
+    MarketColumns, so the per-tick cost is a few vectorized NumPy passes.
+    """
+    
+    FIELDS = ('timestamp', 'price', 'volume', 'bid', 'ask', 'bidSize', 'askSize')
+    
+    def __init__(self, brain, ring, poll_interval=0.002):
+        self.brain = brain
+        self.ring = ring
+        self.poll_interval = poll_interval
+        self.history = MarketHistory()
+        self.liquidity = LiquidityEngine()
+        self.active = False
+        self.thread = None
+        self.last_error = None
+        self.last_lost = 0
+    
+    def start(self):
+        if self.thread is None:
+            self.active = True
+            self.thread = threading.Thread(target=self.run, name='tick-feed', daemon=True)
+            self.thread.start()
+            print(f"📈 Tick feed reading {self.ring.path}", flush=True)
+    
+    def run(self):
+        while self.brain.running:
+            with self.brain.lock:
+                ingested = self.drain(max_batches=1)
+                self.brain.state_store.maybe_save()
+            if not ingested:
+                time.sleep(self.poll_interval)
+    
+    def drain(self, max_batches=None):
+        """Ingest up to max_batches batches (all pending by default); returns ticks ingested."""
+        ingested = 0
+        batches = 0
+        try:
+            while max_batches is None or batches < max_batches:
+                batch = self.ring.read()
+                if batch is None or not len(batch):
+                    break
+                self.ingest(batch)
+                ingested += len(batch)
+                batches += 1
+        except (OSError, ValueError) as e:
+            if str(e) != self.last_error:
+                print(f"📈 Tick ring unavailable: {e}", flush=True)
+                self.last_error = str(e)
+            return ingested
+        
+        if self.ring.lost != self.last_lost:
+            print(f"📈 Tick feed fell behind the ring; {self.ring.lost - self.last_lost} ticks lost", flush=True)
+            self.last_lost = self.ring.lost
+        if ingested:
+            self.brain.state_store.mark_dirty()
+        return ingested
+    
+    def ingest(self, batch):
+        order = np.argsort(batch['symbol'], kind='stable')
+        ids = batch['symbol'][order]
+        starts = np.flatnonzero(np.concatenate([[True], ids[1:] != ids[:-1]]))
+        names = self.ring.symbol_names(ids[starts])
+        
+        columns = {field: batch[field][order].astype(np.float64) for field in self.FIELDS}
+        # Quote-only ticks are priced at the mid
+        quoted = np.isnan(columns['price'])
+        columns['price'][quoted] = (columns['bid'][quoted] + columns['ask'][quoted]) / 2
+        
+        bounds = np.append(starts, len(order))
+        for name, start, end in zip(names, bounds[:-1], bounds[1:]):
+            rows = MarketColumns({field: values[start:end] for field, values in columns.items()}, int(end - start))
+            priced = np.flatnonzero(np.isfinite(rows['price']))
+            self.history.append(name, rows.take(priced) if len(priced) < rows.rows else rows)
+            self.liquidity.ingest(name, rows)
+
+def open_tick_feed(brain):
+    path = os.environ.get('NEXUS_TICK_RING')
+    if not path:
+        return None
+    ring = TickRing(path)
+    poll_ms = float(os.environ.get('NEXUS_BRAIN_TICK_POLL_MS', 2))
+    feed = brain.tick_feed = TickFeed(brain, ring, poll_ms / 1000)
+    # The cursor is only consistent with the tick windows saved alongside it
+    brain.state_store.components.update({
+        'tick_ring': ring,
+        'tick_history': feed.history,
+        'tick_liquidity': feed.liquidity
+    })
+    return feed
+
+class BrainSocketServer:
+    """Optional asyncio front end for direct WebSocket clients.
+    
+    Enabled by NEXUS_BRAIN_WS_PORT. Node keeps using stdin/stdout while
+    local dashboard panels talk to the brain directly with the same message
+    shapes as the Node relay ('analyze' -> 'analysis_result', 'subscribe' ->
+    'analysis_complete' pushes). Every analysis runs on one worker thread, so
+    analyzers never see concurrent calls and the event loop only does I/O.
+    """
+    
+    def __init__(self, brain, port, host='127.0.0.1', max_in_flight=4, capture=None):
+        self.brain = brain
+        self.capture = capture
+        self.port = port
+        self.host = host
+        self.max_in_flight = max_in_flight
+        # Analysis type (or '*') -> connections subscribed to it
+        self.subscribers = {}
+        self.server = None
+        self.loop = None
+        self.executor = None
+        self.lines = None
+    
+    async def run(self, serve=True):
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        
+        self.loop = asyncio.get_running_loop()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='brain-analysis')
+        lines = self.lines = asyncio.Queue()
+        # A daemon reader thread never holds up shutdown the way a blocked
+        # readline in the loop's default executor would.
+        threading.Thread(target=self.pump_stdin, args=(lines,), daemon=True).start()
+        
+        try:
+            if serve:
+                await self.start()
+            while self.brain.running:
+                item = await lines.get()
+                if item is None:
+                    break
+                await self.handle_stdin_line(*item)
+        finally:
+            if self.server is not None:
+                self.server.close()
+                await self.server.wait_closed()
+            self.executor.shutdown(wait=True)
+    
+    def stop(self):
+        """Make run() return once the current stdin request is answered.
+        
+        Safe from a signal handler: the wake-up is queued like the reader
+        thread's end-of-input marker.
+        """
+        if self.loop is not None and self.lines is not None:
+            self.loop.call_soon_threadsafe(self.lines.put_nowait, None)
+    
+    def pump_stdin(self, lines):
+        reader = open_request_reader(keep_raw=self.capture is not None)
+        while True:
+            try:
+                item = reader.read()
+            except ValueError as e:
+                # Malformed or over-budget; the reader already skipped the line
+                item = (e, None)
+            if item is None:
+                break
+            arrival = reader.arrival or (time.time(), time.perf_counter())
+            self.loop.call_soon_threadsafe(lines.put_nowait, (*item, *arrival))
+        self.loop.call_soon_threadsafe(lines.put_nowait, None)
+    
+    async def start(self):
+        if self.server is None:
+            self.server = await websockets.serve(self.handle_connection, self.host, self.port,
+                                                 max_size=None, compression=None)
+            print(f"🔌 Brain socket listening on ws://{self.host}:{self.port}", flush=True)
+    
+    def execute(self, analysis_type, data):
+        """Runs on the analysis thread; returns (start time, result)."""
+        started = time.perf_counter()
+        self.brain.busy = True
+        try:
+            result = self.brain.process_analysis(analysis_type, data)
+        finally:
+            self.brain.busy = False
+        self.brain.state_store.maybe_save()
+        return started, result
+    
+    def promote(self):
+        promote_brain(self.brain)
+    
+    async def handle_stdin_line(self, request, line, arrival, received):
+        started = received
+        if isinstance(request, Exception):
+            print(rejection_response(request), flush=True)
+            return
+        try:
+            analysis_type = request.get('type')
+            data = request.get('data') or {}
+            if analysis_type in UNCAPTURED_TYPES:
+                line = None
+            
+            if analysis_type == 'promote':
+                await self.loop.run_in_executor(self.executor, self.promote)
+                await self.start()
+                return
+            
+            started, result = await self.loop.run_in_executor(self.executor, self.execute, analysis_type, data)
+            fields = request.get('fields') or data.get('fields')
+            response = format_response(request.get('id'), analysis_type, project_fields(result, fields), started)
+            print(response, flush=True)
+            self.publish(analysis_type, result)
+        except Exception as e:
+            response = format_response(request.get('id', 'unknown'), 'error', {'error': str(e)}, started)
+            print(response, flush=True)
+        self.record(line, arrival, received, started, len(response), 'stdin', relay_wait_ms(request, arrival))
+    
+    def record(self, line, arrival, received, started, response_bytes, source, queued_ms=0.0):
+        if self.capture is not None and line is not None:
+            self.capture.record(line, arrival, queued_ms + (started - received) * 1000,
+                                (time.perf_counter() - started) * 1000, response_bytes, source)
+    
+    def envelope(self, message_type, analysis_type, body, **extra):
+        # The result is spliced in as already-encoded text
+        head = json.dumps(dict({'type': message_type, 'analysis_type': analysis_type}, **extra))
+        return f'{head[:-1]},"result":{body},"timestamp":{json.dumps(datetime.now().isoformat())}}}'
+    
+    def publish(self, analysis_type, result, body=None):
+        if not isinstance(result, dict) or 'error' in result:
+            return
+        targets = self.subscribers.get(analysis_type, set()) | self.subscribers.get('*', set())
+        if targets:
+            websockets.broadcast(targets, self.envelope('analysis_complete', analysis_type,
+                                                        body or encode_json(result)))
+    
+    async def handle_connection(self, websocket, path=None):
+        import asyncio
+        
+        slots = asyncio.Semaphore(self.max_in_flight)
+        tasks = set()
+        try:
+            await websocket.send(json.dumps({
+                'type': 'connection_status',
+                'pythonReady': True,
+                'maxInFlight': self.max_in_flight,
+                'timestamp': datetime.now().isoformat()
+            }))
+            async for message in websocket:
+                try:
+                    request = json.loads(message)
+                except ValueError:
+                    await websocket.send(json.dumps({'type': 'analysis_error', 'error': 'Invalid JSON message'}))
+                    continue
+                
+                kind = request.get('type')
+                if kind == 'analyze':
+                    arrival, received = time.time(), time.perf_counter()
+                    # At the limit this stops reading the socket, which pushes
+                    # back on the client instead of queueing without bound.
+                    await slots.acquire()
+                    task = asyncio.create_task(self.answer(websocket, request, slots, arrival, received))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                elif kind in ('subscribe', 'unsubscribe'):
+                    topics = request.get('analysisTypes') or request.get('dataTypes') or ['*']
+                    for topic in topics:
+                        subscribers = self.subscribers.setdefault(topic, set())
+                        if kind == 'subscribe':
+                            subscribers.add(websocket)
+                        else:
+                            subscribers.discard(websocket)
+                    await websocket.send(json.dumps({
+                        'type': 'subscription_confirmed' if kind == 'subscribe' else 'unsubscribed',
+                        'analysisTypes': topics,
+                        'timestamp': datetime.now().isoformat()
+                    }))
+                elif kind == 'ping':
+                    await websocket.send(json.dumps({'type': 'pong', 'timestamp': datetime.now().isoformat()}))
+                else:
+                    await websocket.send(json.dumps({'type': 'analysis_error', 'error': f'Unknown message type: {kind}'}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            for subscribers in self.subscribers.values():
+                subscribers.discard(websocket)
+            for task in tasks:
+                task.cancel()
+    
+    async def answer(self, websocket, request, slots, arrival, received):
+        started = received
+        try:
+            analysis_type = request.get('analysisType')
+            data = request.get('data') or {}
+            try:
+                started, result = await self.loop.run_in_executor(self.executor, self.execute, analysis_type, data)
+            except Exception as e:
+                result = {'error': str(e), 'type': 'analysis_error'}
+            
+            fields = request.get('fields') or data.get('fields')
+            body = encode_json(project_fields(result, fields))
+            message = self.envelope(
+                'analysis_result', analysis_type, body,
+                id=request.get('id'),
+                processing_time=round((time.perf_counter() - received) * 1000, 2)
+            )
+            if self.capture is not None:
+                # Recorded in the stdin request shape so replays need one format
+                line = json.dumps({'id': request.get('id'), 'type': analysis_type, 'data': data, 'fields': fields})
+                self.record(line, arrival, received, started, len(message), 'ws')
+            await websocket.send(message)
+            self.publish(analysis_type, result, None if fields else body)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            slots.release()
+
+def open_request_reader(keep_raw=False):
+    budget_mb = float(os.environ.get('NEXUS_BRAIN_REQUEST_BUDGET_MB', 256))
+    return RequestReader(sys.stdin.buffer, int(budget_mb * 2**20), keep_raw=keep_raw)
+
+def rejection_response(error):
+    if isinstance(error, RequestError):
+        kind = 'payload_too_large' if isinstance(error, PayloadTooLarge) else 'invalid_request'
+        return format_response(error.request_id or 'unknown', error.analysis_type or 'error',
+                               {'error': str(error), 'type': kind})
+    return format_response('unknown', 'error', {'error': str(error)})
+
+def restore_brain_state(brain):
+    try:
+        restore_ms = brain.state_store.restore()
+        if restore_ms is not None:
+            print(f"💾 Brain state restored in {restore_ms:.1f}ms", flush=True)
+    except Exception as e:
+        print(f"💾 Ignoring unusable brain state: {e}", flush=True)
+
+def promote_brain(brain):
+    brain.state_store.enabled = True
+    restore_brain_state(brain)
+    # Ticks resume from the restored checkpoint's cursor
+    if brain.tick_feed is not None:
+        brain.tick_feed.start()
+
 def main():
     brain = TradingBrain()
+    capture = open_capture()
+    tick_feed = open_tick_feed(brain)
+    
+    seed = os.environ.get('NEXUS_BRAIN_SEED')
+    if seed is not None:
+        # Replays pin the global RNG that several analyzers still draw from
+        np.random.seed(int(seed))
+    
+    if '--standby' in sys.argv[1:]:
+        # A standby must not overwrite the active brain's checkpoint; it
+        # loads the latest one when promoted.
+        brain.state_store.enabled = False
+        brain.warm_up()
+    else:
+        restore_brain_state(brain)
+        if os.environ.get('NEXUS_BRAIN_WARM_UP'):
+            # Replays time requests against a brain that has already paid
+            # its deferred imports, like a long-running production one
+            brain.warm_up()
+        if tick_feed is not None:
+            tick_feed.start()
+    
+    server = None
+    
+    def handle_sigterm(signum, frame):
+        brain.running = False
+        if server is not None:
+            # Wakes the socket server's loop, which checkpoints on its way out
+            server.stop()
+            return
+        if brain.busy or not brain.state_store.try_save():
+            # Let the in-flight request (or the checkpoint this signal
+            # interrupted) finish; the loop checkpoints on exit.
+            return
+        if capture is not None:
+            capture.close()
+        sys.exit(0)
+    
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    
+    startup_ms = (time.perf_counter() - _PROCESS_START) * 1000
+    print(f"🧠 Trading Brain ready for analysis ({startup_ms:.1f}ms)", flush=True)
     
-    print("🧠 Trading Brain ready for analysis", flush=True)
+    ws_port = os.environ.get('NEXUS_BRAIN_WS_PORT')
+    if ws_port:
+        if load_websockets() is not None:
+            import asyncio
+            server = BrainSocketServer(
+                brain,
+                int(ws_port),
+                host=os.environ.get('NEXUS_BRAIN_WS_HOST', '127.0.0.1'),
+                max_in_flight=int(os.environ.get('NEXUS_BRAIN_WS_MAX_IN_FLIGHT', 4)),
+                capture=capture
+            )
+            # A standby only binds the port once it is promoted
+            asyncio.run(server.run(serve='--standby' not in sys.argv[1:]))
+            brain.state_store.save()
+            if capture is not None:
+                capture.close()
+            return
+        print("🔌 websockets is not installed; serving stdin only", flush=True)
     
-    # Main processing loop
+    def respond(response, line, arrival, received, wait_ms=0.0):
+        print(response, flush=True)
+        if capture is not None and line is not None:
+            capture.record(line, arrival, wait_ms, (time.perf_counter() - received) * 1000, len(response))
+    
+    # Main processing loop; large market_data payloads are streamed into
+    # typed columns by the reader instead of being decoded in one piece
+    reader = open_request_reader(keep_raw=capture is not None)
     while brain.running:
+        request = {}
+        line, arrival, received = None, None, None
         try:
             # Read from stdin
-            line = sys.stdin.readline()
-            if not line:
+            item = reader.read()
+            if item is None:
                 break
+            request, line = item
+            arrival, received = reader.arrival or (time.time(), time.perf_counter())
             
-            request = json.loads(line.strip())
             analysis_type = request.get('type')
-            data = request.get('data', {})
+            data = request.get('data') or {}
             request_id = request.get('id')
+            if analysis_type in UNCAPTURED_TYPES:
+                line = None
+            
+            if analysis_type == 'promote':
+                promote_brain(brain)
+                continue
             
             # Process the analysis
+            brain.busy = True
             result = brain.process_analysis(analysis_type, data)
+            brain.busy = False
             
             # Send result back
-            response = {
-                'id': request_id,
-                'type': analysis_type,
-                'result': result,
-                'timestamp': datetime.now().isoformat()
-            }
+            fields = request.get('fields') or data.get('fields')
+            respond(format_response(request_id, analysis_type, project_fields(result, fields), received),
+                    line, arrival, received, relay_wait_ms(request, arrival))
             
-            print(json.dumps(response), flush=True)
+            brain.state_store.maybe_save()
             
+        except RequestError as e:
+            respond(rejection_response(e), None, None, None)
         except Exception as e:
-            error_response = {
-                'id': request.get('id', 'unknown'),
-                'type': 'error',
-                'result': {'error': str(e)},
-                'timestamp': datetime.now().isoformat()
-            }
-            print(json.dumps(error_response), flush=True)
+            brain.busy = False
+            respond(format_response(request.get('id', 'unknown'), 'error', {'error': str(e)}, received),
+                    line, arrival, received, relay_wait_ms(request, arrival) if arrival else 0.0)
+    
+    brain.state_store.save()
+    if capture is not None:
+        capture.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,219 @@
+const fs = require('fs');
+const path = require('path');
+
+// Shared-memory tick ring: a fixed-size file (keep it on tmpfs, e.g. under
+// /dev/shm) of 64-byte little-endian records that trading_brain.py maps as a
+// NumPy structured array. Layout must match TickRing in
+// server/python/trading_brain.py.
+//
+// Header (page 0):
+//   0  magic 'NXTICK01'       8  version u32      12 record size u32
+//   16 capacity u64           24 symbol slots u32 28 symbol slot bytes u32
+//   32 symbol count u32       40 created ms f64   48 data offset u64
+//   64 write sequence u64 (records published so far, own cache line)
+// Symbol table: slot i holds the NUL-padded UTF-8 name of symbol id i.
+// Record: seq u64, timestamp f64 (epoch ms), price, volume, bid, ask f64,
+//         bidSize, askSize f32, symbol u32, flags u32.
+// Record n (0-based) lives in slot n % capacity and carries seq n + 1; the
+// write sequence is only advanced after the records below it are written.
+
+const MAGIC = Buffer.from('NXTICK01');
+const VERSION = 1;
+const RECORD_SIZE = 64;
+const HEADER_SIZE = 4096;
+const WRITE_SEQ_OFFSET = 64;
+const SYMBOL_COUNT_OFFSET = 32;
+
+class TickRingWriter {
+    constructor(filePath, options = {}) {
+        this.filePath = filePath;
+        this.capacity = options.capacity || 1 << 20;
+        this.symbolSlots = options.symbolSlots || 1024;
+        this.symbolBytes = 32;
+        this.batchSize = options.batchSize || 8192;
+
+        if (this.capacity & (this.capacity - 1)) {
+            throw new Error('Tick ring capacity must be a power of two');
+        }
+
+        const tableBytes = this.symbolSlots * this.symbolBytes;
+        this.dataOffset = HEADER_SIZE + Math.ceil(tableBytes / HEADER_SIZE) * HEADER_SIZE;
+
+        this.symbols = new Map();
+        this.written = 0;
+        this.pending = Buffer.alloc(this.batchSize * RECORD_SIZE);
+        this.pendingCount = 0;
+        this.flushScheduled = false;
+        this.sequenceBuffer = Buffer.alloc(8);
+        this.stats = { published: 0, flushes: 0, dropped: 0 };
+
+        this.create();
+    }
+
+    create() {
+        // Built under a temporary name and renamed into place, so a reader
+        // never maps a half-initialised ring and can spot a recreated one by
+        // its inode.
+        fs.mkdirSync(path.dirname(this.filePath), { recursive: true });
+        const tmpPath = `${this.filePath}.${process.pid}.tmp`;
+        const fd = fs.openSync(tmpPath, 'w+');
+        fs.ftruncateSync(fd, this.dataOffset + this.capacity * RECORD_SIZE);
+
+        const header = Buffer.alloc(HEADER_SIZE);
+        MAGIC.copy(header, 0);
+        header.writeUInt32LE(VERSION, 8);
+        header.writeUInt32LE(RECORD_SIZE, 12);
+        header.writeBigUInt64LE(BigInt(this.capacity), 16);
+        header.writeUInt32LE(this.symbolSlots, 24);
+        header.writeUInt32LE(this.symbolBytes, 28);
+        header.writeDoubleLE(Date.now(), 40);
+        header.writeBigUInt64LE(BigInt(this.dataOffset), 48);
+        fs.writeSync(fd, header, 0, HEADER_SIZE, 0);
+
+        fs.renameSync(tmpPath, this.filePath);
+        this.fd = fd;
+    }
+
+    symbolId(symbol) {
+        // Ticks without a symbol cannot be attributed and are dropped
+        if (symbol === undefined || symbol === null || symbol === '') {
+            return -1;
+        }
+        const name = String(symbol);
+        let id = this.symbols.get(name);
+        if (id !== undefined) {
+            return id;
+        }
+        if (this.symbols.size >= this.symbolSlots) {
+            return -1;
+        }
+
+        id = this.symbols.size;
+        const slot = Buffer.alloc(this.symbolBytes);
+        slot.write(name, 0, this.symbolBytes - 1, 'utf8');
+        fs.writeSync(this.fd, slot, 0, this.symbolBytes, HEADER_SIZE + id * this.symbolBytes);
+
+        // Published before any record that refers to the new id
+        const count = Buffer.alloc(4);
+        count.writeUInt32LE(id + 1, 0);
+        fs.writeSync(this.fd, count, 0, 4, SYMBOL_COUNT_OFFSET);
+        this.symbols.set(name, id);
+        return id;
+    }
+
+    push(tick) {
+        const symbol = this.symbolId(tick.symbol);
+        if (symbol < 0) {
+            this.stats.dropped++;
+            return false;
+        }
+
+        const offset = this.pendingCount * RECORD_SIZE;
+        const buffer = this.pending;
+        const seq = this.written + this.pendingCount + 1;
+        // Two u32 halves avoid a BigInt allocation per tick
+        buffer.writeUInt32LE(seq % 0x100000000, offset);
+        buffer.writeUInt32LE(Math.floor(seq / 0x100000000), offset + 4);
+        buffer.writeDoubleLE(toMillis(tick.timestamp), offset + 8);
+        buffer.writeDoubleLE(toNumber(tick.price), offset + 16);
+        buffer.writeDoubleLE(toNumber(tick.volume), offset + 24);
+        buffer.writeDoubleLE(toNumber(tick.bid), offset + 32);
+        buffer.writeDoubleLE(toNumber(tick.ask), offset + 40);
+        buffer.writeFloatLE(toNumber(tick.bidSize), offset + 48);
+        buffer.writeFloatLE(toNumber(tick.askSize), offset + 52);
+        buffer.writeUInt32LE(symbol, offset + 56);
+        buffer.writeUInt32LE(0, offset + 60);
+        this.pendingCount++;
+
+        if (this.pendingCount === this.batchSize) {
+            this.flush();
+        } else if (!this.flushScheduled) {
+            // Ticks arriving in the same turn of the event loop share one
+            // write and one sequence update.
+            this.flushScheduled = true;
+            setImmediate(() => this.flush());
+        }
+        return true;
+    }
+
+    pushMany(ticks) {
+        let accepted = 0;
+        for (const tick of ticks) {
+            if (this.push(tick)) {
+                accepted++;
+            }
+        }
+        return accepted;
+    }
+
+    flush() {
+        this.flushScheduled = false;
+        if (this.pendingCount === 0 || this.fd === null) {
+            return;
+        }
+
+        // At most two writes: up to the end of the ring, then the wrap
+        const count = this.pendingCount;
+        const slot = this.written % this.capacity;
+        const first = Math.min(count, this.capacity - slot);
+        fs.writeSync(this.fd, this.pending, 0, first * RECORD_SIZE, this.dataOffset + slot * RECORD_SIZE);
+        if (first < count) {
+            fs.writeSync(this.fd, this.pending, first * RECORD_SIZE, (count - first) * RECORD_SIZE, this.dataOffset);
+        }
+
+        this.written += count;
+        this.pendingCount = 0;
+        this.sequenceBuffer.writeBigUInt64LE(BigInt(this.written), 0);
+        fs.writeSync(this.fd, this.sequenceBuffer, 0, 8, WRITE_SEQ_OFFSET);
+
+        this.stats.published = this.written;
+        this.stats.flushes++;
+    }
+
+    getStatus() {
+        return {
+            path: this.filePath,
+            capacity: this.capacity,
+            symbols: this.symbols.size,
+            ...this.stats
+        };
+    }
+
+    close() {
+        if (this.fd === null) {
+            return;
+        }
+        this.flush();
+        fs.closeSync(this.fd);
+        this.fd = null;
+    }
+}
+
+function toNumber(value) {
+    if (value === undefined || value === null || value === '') {
+        return NaN;
+    }
+    return Number(value);
+}
+
+function toMillis(timestamp) {
+    if (typeof timestamp === 'number') {
+        return timestamp;
+    }
+    const parsed = timestamp ? Date.parse(timestamp) : NaN;
+    return Number.isNaN(parsed) ? Date.now() : parsed;
+}
+
+// NEXUS_TICK_RING names the ring file; both the bridge and the brain read
+// it, so setting it once for `npm run dev` connects the two.
+function openTickRingWriter() {
+    const filePath = process.env.NEXUS_TICK_RING;
+    if (!filePath) {
+        return null;
+    }
+    return new TickRingWriter(filePath, {
+        capacity: parseInt(process.env.NEXUS_TICK_RING_CAPACITY, 10) || undefined
+    });
+}
+
+module.exports = { TickRingWriter, openTickRingWriter, RECORD_SIZE };
@@ -1,6 +1,7 @@
 export interface PythonAnalysisRequest {
-  type: 'market_analysis' | 'strategy_analysis' | 'risk_analysis' | 'portfolio_optimization' | 'price_prediction' | 'pattern_detection' | 'strategy_backtest';
+  type: 'market_analysis' | 'regime_analysis' | 'strategy_analysis' | 'strategy_ranking' | 'risk_analysis' | 'liquidity_analysis' | 'journal_analysis' | 'equity_simulation' | 'portfolio_optimization' | 'price_prediction' | 'pattern_detection' | 'pattern_scan' | 'strategy_backtest';
   data: any;
+  fields?: string[];
   priority?: 'low' | 'medium' | 'high';
   timeout?: number;
 }
@@ -19,8 +20,18 @@ export interface PythonBrainStatus {
   activeStreams: number;
   lastHeartbeat: number | null;
   analysisCache: number;
+  brainSocket?: string | null;
 }
 
+// Relay routes that do not follow the /api/analyze/<type> naming
+const ANALYSIS_ROUTES: Partial<Record<PythonAnalysisRequest['type'], string>> = {
+  portfolio_optimization: '/api/analyze/portfolio',
+  price_prediction: '/api/predict/price',
+  pattern_detection: '/api/detect/patterns',
+  pattern_scan: '/api/detect/patterns/scan',
+  strategy_backtest: '/api/backtest/strategy'
+};
+
 export class PythonBrainClient {
   private static instance: PythonBrainClient;
   private websocket: WebSocket | null = null;
@@ -297,6 +308,13 @@ export class PythonBrainClient {
     });
   }
 
+  public async analyzeRegime(symbol: string, marketData: any[], refit: boolean = false): Promise<PythonAnalysisResult> {
+    return this.requestAnalysis({
+      type: 'regime_analysis',
+      data: { symbol, market_data: marketData, refit }
+    });
+  }
+
   public async analyzeStrategy(strategies: any[], performance: any): Promise<PythonAnalysisResult> {
     return this.requestAnalysis({
       type: 'strategy_analysis',
@@ -304,6 +322,13 @@ export class PythonBrainClient {
     });
   }
 
+  public async rankStrategies(strategies: any[] | Record<string, any[]>, topK: number = 10): Promise<PythonAnalysisResult> {
+    return this.requestAnalysis({
+      type: 'strategy_ranking',
+      data: { strategies, top_k: topK }
+    });
+  }
+
   public async analyzeRisk(portfolio: any, positions: any[]): Promise<PythonAnalysisResult> {
     return this.requestAnalysis({
       type: 'risk_analysis',
@@ -311,6 +336,27 @@ export class PythonBrainClient {
     });
   }
 
+  public async analyzeLiquidity(symbols: string[], positions: any[] = [], source: 'bars' | 'ticks' = 'bars'): Promise<PythonAnalysisResult> {
+    return this.requestAnalysis({
+      type: 'liquidity_analysis',
+      data: { symbols, positions, source }
+    });
+  }
+
+  public async analyzeJournal(trades: any[] | Record<string, any[]>, journalId: string = 'default', reset: boolean = false): Promise<PythonAnalysisResult> {
+    return this.requestAnalysis({
+      type: 'journal_analysis',
+      data: { trades, journal_id: journalId, reset, utc_offset_minutes: -new Date().getTimezoneOffset() }
+    });
+  }
+
+  public async simulateEquity(strategies: { name?: string; returns?: number[]; pnl?: number[] }[], options: { n_paths?: number; horizon?: number; block_size?: number; seed?: number; ruin_threshold?: number; initial_capital?: number } = {}): Promise<PythonAnalysisResult> {
+    return this.requestAnalysis({
+      type: 'equity_simulation',
+      data: { strategies, ...options }
+    });
+  }
+
   public async optimizePortfolio(positions: any[], targetReturn: number, riskTolerance: string): Promise<PythonAnalysisResult> {
     return this.requestAnalysis({
       type: 'portfolio_optimization',
@@ -332,6 +378,13 @@ export class PythonBrainClient {
     });
   }
 
+  public async scanPatterns(symbol: string, marketData: any[], incremental: boolean = true, windowSizes?: number[]): Promise<PythonAnalysisResult> {
+    return this.requestAnalysis({
+      type: 'pattern_scan',
+      data: { symbol, market_data: marketData, incremental, window_sizes: windowSizes }
+    });
+  }
+
   public async backtestStrategy(strategy: any, marketData: any[]): Promise<PythonAnalysisResult> {
     return this.requestAnalysis({
       type: 'strategy_backtest',
@@ -352,12 +405,13 @@ export class PythonBrainClient {
       const controller = new AbortController();
       const timeoutId = setTimeout(() => controller.abort(), 30000);
 
-      const response = await fetch(`${this.baseUrl}/api/analyze/${request.type.replace('_analysis', '').replace('_', '/')}`, {
+      const route = ANALYSIS_ROUTES[request.type] ?? `/api/analyze/${request.type.replace('_analysis', '').replace('_', '/')}`;
+      const response = await fetch(`${this.baseUrl}${route}`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify(request.data),
+        body: JSON.stringify(request.fields ? { ...request.data, fields: request.fields } : request.data),
         signal: controller.signal
       });
 